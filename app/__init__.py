@@ -11,6 +11,17 @@ from app.badges import badges_bp
 from app.profile import profile_bp
 from app.ai import ai_bp
 from app.models import db
+from app.workers import process_pool
+from app.storage import storage
+from app.compression import compression
+from app.assets import assets, build_assets_command
+from app.game_versions import game_cache
+from app.carousel import carousel
+from app.mailer import mailer
+from app.ip_log import ip_log
+from app.utils import schedule_tutorial_games
+from app.deletions import resume_deletion_jobs
+from app.upload_gc import gc_uploads_command
 from .config import load_config
 from flask_wtf.csrf import CSRFProtect
 from datetime import timedelta
@@ -70,11 +81,23 @@ def create_app():
     app.config['VERIFICATIONS'] = app.config['main']['VERIFICATIONS']
     app.config['BADGE_IMAGE_DIR'] = app.config['main']['BADGE_IMAGE_DIR']
     app.config['CAROUSEL_IMAGES_DIR'] = app.config['main']['CAROUSEL_IMAGES_DIR']
+    app.config['DERIVATIVE_CACHE_DIR'] = app.config['main'].get('DERIVATIVE_CACHE_DIR', 'images/derivatives')
+    app.config['DELETION_CHUNK_SIZE'] = app.config['main'].get('DELETION_CHUNK_SIZE', 1000)
+    app.config['UPLOAD_TMP_DIR'] = app.config['main'].get('UPLOAD_TMP_DIR', os.path.join(app.instance_path, 'uploads'))
+    app.config['UPLOAD_CHUNK_SIZE'] = app.config['main'].get('UPLOAD_CHUNK_SIZE', 512 * 1024)
+    app.config['UPLOAD_MAX_BYTES'] = app.config['main'].get('UPLOAD_MAX_BYTES', 32 * 1024 * 1024)
+    app.config['UPLOAD_SESSION_TTL'] = app.config['main'].get('UPLOAD_SESSION_TTL', 24 * 3600)
+    app.config['OFFLINE_SUBMISSION_MAX_AGE'] = app.config['main'].get('OFFLINE_SUBMISSION_MAX_AGE', 7 * 24 * 3600)
     app.config['SQLALCHEMY_ECHO'] = app.config['main']['SQLALCHEMY_ECHO']
     app.config['SQLALCHEMY_DATABASE_URI'] = app.config['flask']['SQLALCHEMY_DATABASE_URI']
     app.config['DEBUG'] = app.config['flask']['DEBUG']
     app.config['TASKCSV'] = app.config['main']['TASKCSV']
     app.config['OPENAI_API_KEY'] = app.config['openai']['OPENAI_API_KEY']
+    app.config['OPENAI_BASE_URL'] = app.config['openai'].get('OPENAI_BASE_URL', '')
+    app.config['AI_MAX_JOBS_PER_USER'] = app.config['openai'].get('MAX_JOBS_PER_USER', 2)
+    app.config['AI_JOB_TIMEOUT'] = app.config['openai'].get('JOB_TIMEOUT', 600)
+    app.config['AI_BATCH_CONCURRENCY'] = app.config['openai'].get('BATCH_CONCURRENCY', 4)
+    app.config['AI_BATCH_MAX_ITEMS'] = app.config['openai'].get('BATCH_MAX_ITEMS', 100)
     app.config['SECRET_KEY'] = app.config['encryption']['SECRET_KEY']
     app.config['SESSION_COOKIE_SECURE'] = app.config['encryption']['SESSION_COOKIE_SECURE']
     app.config['SESSION_COOKIE_NAME'] = app.config['encryption']['SESSION_COOKIE_NAME']
@@ -108,12 +131,29 @@ def create_app():
     csrf.init_app(app)
     migrate.init_app(app, db)
     socketio.init_app(app, async_mode='gevent', logger=True, engineio_logger=True)
+    process_pool.init_app(app)
+    storage.init_app(app)
+    compression.init_app(app)
+    assets.init_app(app)
+    game_cache.init_app(app)
+    carousel.init_app(app)
+    mailer.init_app(app)
+    ip_log.init_app(app)
 
     # Create super admin
     with app.app_context():
         db.create_all()
         create_super_admin(app)
 
+    # Deliver anything left in the outbox by a previous run
+    mailer.ensure_worker()
+
+    # Keep this quarter's and next quarter's tutorial games provisioned
+    socketio.start_background_task(schedule_tutorial_games, app)
+
+    # Finish deletions interrupted by a restart
+    socketio.start_background_task(resume_deletion_jobs, app)
+
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(admin_bp, url_prefix='/admin')
@@ -124,6 +164,11 @@ def create_app():
     app.register_blueprint(profile_bp, url_prefix='/profile')
     app.register_blueprint(main_bp)
 
+    # flask --app wsgi gc-uploads
+    app.cli.add_command(gc_uploads_command)
+    # flask --app wsgi build-assets
+    app.cli.add_command(build_assets_command)
+
     # Setup login manager
     login_manager.login_view = 'auth.login'
 
@@ -1,9 +1,14 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
 from flask_login import login_required, current_user
-from app.models import db, User, Game, Sponsor, user_games, QuestSubmission, UserIP
+from app.models import db, User, Game, Sponsor, user_games, QuestSubmission, UserIP, Announcement, OutboxEmail, DeletionJob
 from app.forms import CarouselImportForm, SponsorForm
 from app.utils import save_sponsor_logo
+from app.workers import process_pool
+from app.mailer import mailer
+from app.deletions import start_deletion_job
 from functools import wraps
+from datetime import datetime
+from pytz import utc
 from werkzeug.utils import secure_filename
 
 import bleach
@@ -75,6 +80,11 @@ def require_super_admin(f):
     return decorated_function
 
 
+def administers(game):
+    """Game-scoped admin pages belong to the game's admin (or a super admin), not to every admin."""
+    return current_user.is_super_admin or game.admin_id == current_user.id
+
+
 def create_super_admin(app):
     with app.app_context():
 
@@ -129,6 +139,118 @@ def admin_dashboard():
                            selected_game_id=selected_game_id, selected_game=selected_game)
 
 
+@admin_bp.route('/process_pool', methods=['GET'])
+@login_required
+@require_super_admin
+def process_pool_metrics():
+    return jsonify(process_pool.metrics())
+
+
+@admin_bp.route('/email_outbox', methods=['GET'])
+@login_required
+@require_super_admin
+def email_outbox_metrics():
+    return jsonify(mailer.outbox_counts())
+
+
+@admin_bp.route('/announcements/<int:game_id>', methods=['GET', 'POST'])
+@login_required
+@require_admin
+def announcements(game_id):
+    from app import socketio
+
+    game = Game.query.get_or_404(game_id)
+    if not administers(game):
+        return render_template('403.html'), 403
+
+    if request.method == 'POST':
+        subject = sanitize_html(request.form.get('subject', '')).strip()
+        body = sanitize_html(request.form.get('body', '')).strip()
+        if not subject or not body:
+            flash('Subject and message are required.', 'error')
+            return redirect(url_for('admin.announcements', game_id=game_id))
+
+        announcement = Announcement(game_id=game_id, author_id=current_user.id, subject=subject, body=body)
+        db.session.add(announcement)
+        db.session.commit()
+
+        socketio.start_background_task(queue_announcement, current_app._get_current_object(), announcement.id)
+        flash('Announcement queued for delivery.', 'success')
+        return redirect(url_for('admin.announcements', game_id=game_id))
+
+    history = Announcement.query.filter_by(game_id=game_id).order_by(Announcement.created_at.desc()).limit(20).all()
+    participant_count = db.session.query(db.func.count(user_games.c.user_id)).filter(user_games.c.game_id == game_id).scalar()
+    return render_template('announcements.html', game=game, announcements=history, participant_count=participant_count)
+
+
+@admin_bp.route('/announcements/status/<int:announcement_id>', methods=['GET'])
+@login_required
+@require_admin
+def announcement_status(announcement_id):
+    announcement = Announcement.query.get_or_404(announcement_id)
+    if not administers(announcement.game):
+        return jsonify({'error': 'Access denied'}), 403
+    return jsonify({
+        'id': announcement.id,
+        'status': announcement.status,
+        'total_recipients': announcement.total_recipients,
+        'queued': announcement.queued_count,
+        'delivery': announcement.delivery_counts(),
+    })
+
+
+def queue_announcement(app, announcement_id):
+    """Render one email per participant in id-ordered chunks and add them to the outbox."""
+    from app import socketio
+
+    with app.app_context():
+        announcement = db.session.get(Announcement, announcement_id)
+        chunk_size = app.config['mail'].get('ANNOUNCEMENT_CHUNK_SIZE', 500)
+        participants = db.session.query(User.id, User.email, User.username, User.display_name).join(
+            user_games, user_games.c.user_id == User.id
+        ).filter(user_games.c.game_id == announcement.game_id, User.email.isnot(None))
+
+        # Rendered straight from the Jinja environment; there is no request (or user) here
+        template = app.jinja_env.get_template('announcement_email.html')
+
+        try:
+            announcement.status = 'rendering'
+            announcement.total_recipients = participants.count()
+            db.session.commit()
+
+            last_id = 0
+            while True:
+                chunk = participants.filter(User.id > last_id).order_by(User.id).limit(chunk_size).all()
+                if not chunk:
+                    break
+
+                db.session.add_all([
+                    OutboxEmail(
+                        recipient=participant.email,
+                        subject=announcement.subject,
+                        html=template.render(participant=participant, game=announcement.game, body=announcement.body),
+                        announcement_id=announcement.id
+                    )
+                    for participant in chunk
+                ])
+                announcement.queued_count += len(chunk)
+                db.session.commit()
+                db.session.expunge_all()
+                announcement = db.session.get(Announcement, announcement_id)
+
+                last_id = chunk[-1].id
+                mailer.wake()
+                socketio.sleep(0)
+
+            announcement.status = 'done'
+        except Exception as e:
+            logging.error(f"Failed to queue announcement {announcement_id}: {e}")
+            db.session.rollback()
+            announcement.status = 'failed'
+        announcement.finished_at = datetime.now(utc)
+        db.session.commit()
+
+
 @admin_bp.route('/user_management', methods=['GET'])
 @admin_bp.route('/user_management/game/<int:game_id>', methods=['GET'])
 @login_required
@@ -333,10 +455,13 @@ def delete_user(user_id):
         flash('User not found.', 'error')
         return redirect(url_for('admin.user_management'))
 
+    if Game.query.filter_by(admin_id=user.id).first():
+        flash('This user still administers games. Delete or reassign those games first.', 'error')
+        return redirect(url_for('admin.user_management'))
+
     try:
-        db.session.delete(user)
-        db.session.commit()
-        flash('User deleted successfully.', 'success')
+        start_deletion_job('user', user.id, target_name=user.username, requested_by=current_user.id)
+        flash('User deletion started. Their content is being removed in the background.', 'success')
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Error deleting user: {e}")
@@ -344,6 +469,21 @@ def delete_user(user_id):
     return redirect(url_for('admin.user_management'))
 
 
+@admin_bp.route('/deletion_jobs', methods=['GET'])
+@login_required
+@require_super_admin
+def deletion_jobs():
+    jobs = DeletionJob.query.order_by(DeletionJob.created_at.desc()).limit(50).all()
+    return jsonify([job.to_dict() for job in jobs])
+
+
+@admin_bp.route('/deletion_jobs/<int:job_id>', methods=['GET'])
+@login_required
+@require_super_admin
+def deletion_job_status(job_id):
+    return jsonify(DeletionJob.query.get_or_404(job_id).to_dict())
+
+
 @admin_bp.route('/update_carousel', methods=['POST'])
 @login_required
 @require_admin
@@ -1,15 +1,23 @@
-from flask import Blueprint, jsonify, render_template, request, current_app, url_for
-from flask_login import login_required
+from flask import Blueprint, jsonify, render_template, request, current_app, url_for, flash, redirect
+from flask_login import login_required, current_user
 from app.forms import QuestForm
 from app.utils import save_badge_image
-from .models import db, Quest, Badge
+from .models import db, Quest, Badge, Game, User, AIGenerationJob, QuestDraftBatch, QuestDraft
+from .storage import storage, badge_image_key
 from werkzeug.datastructures import MultiDict
 from openai import OpenAI
-from io import BytesIO
+from io import BytesIO, StringIO
 from PIL import Image
 from werkzeug.utils import secure_filename
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from pytz import utc
+
 import bleach
+import csv
+import hashlib
+import os
 import requests
 import string
 import re
@@ -50,9 +58,135 @@ ALLOWED_ATTRIBUTES = {
     'font': ['color', 'face', 'size']
 }
 
+INTERRUPTED_DRAFT_ERROR = 'Generation was interrupted; please generate this quest again.'
+
 def sanitize_html(html_content):
     return bleach.clean(html_content, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES)
 
+def openai_client():
+    # OPENAI_BASE_URL lets a local or proxy endpoint stand in for api.openai.com
+    return OpenAI(
+        api_key=current_app.config['OPENAI_API_KEY'],
+        base_url=current_app.config.get('OPENAI_BASE_URL') or None
+    )
+
+
+def normalize_prompt(text):
+    return ' '.join(text.lower().split())
+
+
+def prompt_cache_key(kind, text):
+    return hashlib.sha256(f"{kind}:{normalize_prompt(text)}".encode('utf-8')).hexdigest()
+
+
+def find_cached_job(kind, prompt_key):
+    cached = AIGenerationJob.query.filter_by(
+        kind=kind, prompt_key=prompt_key, status='done'
+    ).order_by(AIGenerationJob.finished_at.desc()).first()
+
+    if cached and kind == 'badge':
+        if not storage.exists(badge_image_key(cached.result['filename'])):
+            return None
+    return cached
+
+
+def active_job_count(user_id):
+    # Jobs orphaned by a restart never finish, so only recent ones count against the cap
+    cutoff = datetime.now(utc) - timedelta(seconds=current_app.config['AI_JOB_TIMEOUT'])
+    return AIGenerationJob.query.filter(
+        AIGenerationJob.user_id == user_id,
+        AIGenerationJob.status.in_(['queued', 'running']),
+        AIGenerationJob.created_at >= cutoff
+    ).count()
+
+
+def job_payload(job, game_id=None):
+    """
+    The job as the browser sees it. Finished jobs are shared through the
+    prompt cache, so a quest is rendered for the requesting game_id when
+    given, not for the game the job first ran for.
+    """
+    payload = job.to_dict()
+    payload['status_url'] = url_for('ai.job_status', job_id=job.id)
+    if job.status == 'done' and job.kind == 'quest':
+        payload['generated_quest_html'] = render_template(
+            'generated_quest.html', quest=job.result, game_id=game_id if game_id is not None else job.game_id
+        )
+    elif job.status == 'done' and job.kind == 'badge':
+        payload['filename'] = job.result['filename']
+    return payload
+
+
+def start_ai_job(kind, prompt, game_id=None, sid=None):
+    from app import socketio
+
+    prompt_key = prompt_cache_key(kind, prompt)
+    cached = find_cached_job(kind, prompt_key)
+    if cached:
+        return jsonify(job_payload(cached, game_id)), 200
+
+    # Locking the user's row makes parallel requests count and insert one at a time,
+    # so they cannot all pass the cap before any of their jobs exists
+    db.session.query(User.id).filter_by(id=current_user.id).with_for_update().one()
+    if active_job_count(current_user.id) >= current_app.config['AI_MAX_JOBS_PER_USER']:
+        db.session.rollback()
+        return jsonify({'error': 'You already have the maximum number of AI generations running. Please wait for one to finish.'}), 429
+
+    job = AIGenerationJob(kind=kind, user_id=current_user.id, game_id=game_id, prompt=prompt, prompt_key=prompt_key)
+    db.session.add(job)
+    db.session.commit()
+
+    socketio.start_background_task(run_ai_job, current_app._get_current_object(), job.id, sid)
+    return jsonify(job_payload(job)), 202
+
+
+def run_ai_job(app, job_id, sid):
+    from app import socketio
+
+    with app.app_context():
+        job = db.session.get(AIGenerationJob, job_id)
+
+        def report(status, progress):
+            job.progress = progress
+            db.session.commit()
+            if sid:
+                socketio.emit('loading_status', {'status': status, 'progress': progress}, room=sid)
+
+        try:
+            job.status = 'running'
+            if job.kind == 'quest':
+                report('Writing your quest...', 10)
+                quest_details, error_message = generate_quest_details(job.prompt)
+                if not quest_details:
+                    raise ValueError(error_message or "Failed to generate valid quest details")
+                job.result = quest_details
+            else:
+                report('Painting your badge...', 10)
+                job.result = {'filename': generate_badge_file(job.prompt, report)}
+            job.status = 'done'
+            job.progress = 100
+        except Exception as e:
+            print(f"AI job {job_id} failed: {e}")
+            db.session.rollback()
+            job.status = 'failed'
+            job.error = str(e)
+        job.finished_at = datetime.now(utc)
+        db.session.commit()
+
+        if sid:
+            with app.test_request_context():
+                socketio.emit('ai_job_update', job_payload(job), room=sid)
+
+
+@ai_bp.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    job = db.session.get(AIGenerationJob, job_id)
+    if not job or (job.user_id != current_user.id and not current_user.is_super_admin):
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_payload(job))
+
+
 @ai_bp.route('/generate_quest', methods=['POST'])
 @login_required
 def generate_quest():
@@ -65,13 +199,7 @@ def generate_quest():
         if not game_id:
             return jsonify({"error": "Game ID is required"}), 400
 
-        quest_details, error_message = generate_quest_details(description)
-
-        if quest_details:
-            generated_quest_html = render_template('generated_quest.html', quest=quest_details, game_id=game_id)
-            return jsonify({"generated_quest_html": generated_quest_html})
-        else:
-            return jsonify({"error": error_message or "Failed to generate valid quest details"}), 500
+        return start_ai_job('quest', description, game_id=int(game_id), sid=data.get('sid'))
 
     except ValueError as ve:
         print(f"Validation error: {ve}")
@@ -144,53 +272,255 @@ def create_quest():
 @ai_bp.route('/generate_badge_image', methods=['POST'])
 @login_required
 def generate_badge_image():
-    client = OpenAI(api_key=current_app.config['OPENAI_API_KEY'])
-
     try:
         data = request.get_json()
         badge_description = data.get('badge_description', '')
         if not badge_description:
             return jsonify({"error": "Badge description is required"}), 400
 
-        sanitized_badge_description = sanitize_html(badge_description)
-        badge_prompt = (
-            "Remove any textual inscription in the framing or otherwise and create one uber epic, symbolic, and timeless badge for a Bicycle Quest Quest web app that fits this description while keeping the background invisible (transparent): " + sanitized_badge_description
-        )
-        response = client.images.generate(
-            model="dall-e-3",
-            prompt=badge_prompt,
-            size="1024x1024",
-            quality="standard",
-            n=1
-        )
+        return start_ai_job('badge', sanitize_html(badge_description), sid=data.get('sid'))
 
-        # Fetch the generated image URL from the response
-        generated_image_url = response.data[0].url
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def generate_badge_file(badge_description, report=None):
+    client = openai_client()
+    badge_prompt = (
+        "Remove any textual inscription in the framing or otherwise and create one uber epic, symbolic, and timeless badge for a Bicycle Quest Quest web app that fits this description while keeping the background invisible (transparent): " + badge_description
+    )
+    response = client.images.generate(
+        model="dall-e-3",
+        prompt=badge_prompt,
+        size="1024x1024",
+        quality="standard",
+        n=1
+    )
+
+    # Fetch the generated image URL from the response
+    generated_image_url = response.data[0].url
+    if report:
+        report('Downloading your badge...', 70)
+
+    # Fetch the image from the generated URL
+    image_response = requests.get(generated_image_url, timeout=60)
+    if image_response.status_code != 200:
+        raise ValueError('Failed to fetch generated image')
+
+    # Convert the image to a format that can be saved
+    image = Image.open(BytesIO(image_response.content))
+    return save_badge_image(image)
+
+def administers(game_id):
+    """Batches belong to a game; only its admin (or a super admin) may see or import them."""
+    if current_user.is_super_admin:
+        return True
+    return current_user.is_admin and db.session.query(
+        Game.query.filter_by(id=game_id, admin_id=current_user.id).exists()
+    ).scalar()
+
+
+def expire_stale_batch(batch):
+    """
+    Fail the pending drafts of a batch whose worker died with the process.
+    Each round of AI_BATCH_CONCURRENCY drafts gets AI_JOB_TIMEOUT seconds;
+    a batch still queued or running after that will never finish on its own.
+    """
+    if batch.status not in ('queued', 'running'):
+        return False
+    rounds = -(-batch.total // current_app.config['AI_BATCH_CONCURRENCY'])
+    deadline = batch.created_at + timedelta(seconds=current_app.config['AI_JOB_TIMEOUT'] * max(rounds, 1))
+    if datetime.now(utc) < deadline:
+        return False
 
-        # Fetch the image from the generated URL
-        image_response = requests.get(generated_image_url)
-        if image_response.status_code != 200:
-            return jsonify({'error': 'Failed to fetch generated image'}), 500
+    finish_batch(batch)
+    db.session.commit()
+    return True
 
-        # Convert the image to a format that can be saved
-        image = Image.open(BytesIO(image_response.content))
-        filename = save_badge_image(image)
 
-        return jsonify({'filename': filename})
+def finish_batch(batch):
+    for draft in batch.drafts:
+        if draft.status == 'pending':
+            draft.status = 'failed'
+            draft.error = INTERRUPTED_DRAFT_ERROR
+            batch.failed += 1
+    batch.status = 'done'
+    batch.finished_at = datetime.now(utc)
 
-    except requests.exceptions.RequestException as e:
-        if e.response.status_code == 429:
-            return too_many_requests()
-        return jsonify({'error': str(e)}), 500
 
+def read_batch_descriptions():
+    descriptions = [line.strip() for line in request.form.get('themes', '').splitlines() if line.strip()]
+
+    csv_file = request.files.get('descriptions_csv')
+    if csv_file and csv_file.filename:
+        rows = list(csv.reader(StringIO(csv_file.read().decode('utf-8-sig'))))
+        column = 0
+        if rows and 'description' in [cell.strip().lower() for cell in rows[0]]:
+            column = [cell.strip().lower() for cell in rows[0]].index('description')
+            rows = rows[1:]
+        descriptions.extend(row[column].strip() for row in rows if len(row) > column and row[column].strip())
+
+    return [sanitize_html(description) for description in descriptions]
+
+
+@ai_bp.route('/batch/<int:game_id>', methods=['GET'])
+@login_required
+def batch_generate_page(game_id):
+    game = Game.query.get_or_404(game_id)
+    if not administers(game.id):
+        flash('Access denied: Only administrators of this game can generate quests.', 'danger')
+        return redirect(url_for('main.index', game_id=game_id))
+
+    batches = QuestDraftBatch.query.filter_by(game_id=game_id).order_by(QuestDraftBatch.created_at.desc()).limit(10).all()
+    for batch in batches:
+        expire_stale_batch(batch)
+    return render_template('batch_generate_quests.html', game=game, batches=batches,
+                           max_items=current_app.config['AI_BATCH_MAX_ITEMS'])
+
+
+@ai_bp.route('/batch/<int:game_id>', methods=['POST'])
+@login_required
+def batch_generate_quests(game_id):
+    from app import socketio
+
+    game = Game.query.get_or_404(game_id)
+    if not administers(game.id):
+        return jsonify({'error': 'Access denied'}), 403
+
+    try:
+        descriptions = read_batch_descriptions()
+    except (UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'error': f'Could not read CSV: {e}'}), 400
+
+    if not descriptions:
+        return jsonify({'error': 'Provide at least one theme or a CSV of descriptions'}), 400
+    max_items = current_app.config['AI_BATCH_MAX_ITEMS']
+    if len(descriptions) > max_items:
+        return jsonify({'error': f'A batch can contain at most {max_items} descriptions'}), 400
+
+    batch = QuestDraftBatch(game_id=game_id, user_id=current_user.id, total=len(descriptions))
+    batch.drafts = [QuestDraft(position=index, description=description) for index, description in enumerate(descriptions)]
+    db.session.add(batch)
+    db.session.commit()
+
+    socketio.start_background_task(run_quest_batch, current_app._get_current_object(), batch.id, request.form.get('sid'))
+    return jsonify({'batch_id': batch.id, 'status_url': url_for('ai.batch_status', batch_id=batch.id)}), 202
+
+
+def run_quest_batch(app, batch_id, sid):
+    from app import socketio
+
+    def generate(description):
+        with app.app_context():
+            return generate_quest_details(description)
+
+    with app.app_context():
+        batch = db.session.get(QuestDraftBatch, batch_id)
+        batch.status = 'running'
+        db.session.commit()
+
+        try:
+            pending = [(draft.id, draft.description) for draft in batch.drafts if draft.status == 'pending']
+            with ThreadPoolExecutor(max_workers=app.config['AI_BATCH_CONCURRENCY']) as executor:
+                futures = {executor.submit(generate, description): draft_id for draft_id, description in pending}
+                for future in as_completed(futures):
+                    draft = db.session.get(QuestDraft, futures[future])
+                    db.session.refresh(draft)
+                    if draft.status != 'pending':
+                        # The batch was expired as stale while this draft was generating
+                        continue
+                    try:
+                        quest_details, error_message = future.result()
+                    except Exception as e:
+                        quest_details, error_message = None, str(e)
+
+                    if quest_details:
+                        draft.status = 'ready'
+                        draft.details = quest_details
+                        batch.completed += 1
+                    else:
+                        draft.status = 'failed'
+                        draft.error = error_message or "Failed to generate valid quest details"
+                        batch.failed += 1
+                    db.session.commit()
+
+                    if sid:
+                        done = batch.completed + batch.failed
+                        socketio.emit('loading_status', {
+                            'status': f'Generated {done} of {batch.total} quests',
+                            'progress': int(done * 100 / batch.total)
+                        }, room=sid)
+        except Exception as e:
+            print(f"Quest batch {batch_id} failed: {e}")
+            db.session.rollback()
+
+        # Anything still pending here will not be generated by this worker
+        finish_batch(batch)
+        db.session.commit()
+        if sid:
+            socketio.emit('quest_batch_update', batch.to_dict(), room=sid)
+
+
+@ai_bp.route('/batches/<int:batch_id>', methods=['GET'])
+@login_required
+def batch_status(batch_id):
+    batch = QuestDraftBatch.query.get_or_404(batch_id)
+    if not administers(batch.game_id):
+        return jsonify({'error': 'Access denied'}), 403
+    expire_stale_batch(batch)
+    return jsonify(batch.to_dict())
+
+
+@ai_bp.route('/batches/<int:batch_id>/import', methods=['POST'])
+@login_required
+def import_quest_batch(batch_id):
+    batch = QuestDraftBatch.query.get_or_404(batch_id)
+    if not administers(batch.game_id):
+        return jsonify({'error': 'Access denied'}), 403
+
+    data = request.get_json(silent=True) or {}
+    selected = set(data.get('draft_ids') or [])
+    drafts = [draft for draft in batch.drafts if draft.status == 'ready' and (not selected or draft.id in selected)]
+
+    try:
+        badges = {}
+        for draft in drafts:
+            details = draft.details
+            badge_name = sanitize_html(details['Badge Name'])
+            badge = badges.get(badge_name) or Badge.query.filter_by(name=badge_name).first()
+            if not badge:
+                badge = Badge(name=badge_name, description=sanitize_html(details['Badge Description']))
+                db.session.add(badge)
+            badges[badge_name] = badge
+
+            frequency = details['Frequency'].lower()
+            verification_type = details['Verification Type'].lower()
+            quest = Quest(
+                title=sanitize_html(details['Title']),
+                description=sanitize_html(details['Description']),
+                tips=sanitize_html(details['Tips']),
+                points=details['Points'],
+                game_id=batch.game_id,
+                completion_limit=details['Completion Limit'],
+                frequency=frequency if frequency in ('daily', 'weekly') else 'monthly',
+                category=sanitize_html(details['Category']),
+                verification_type=verification_type if verification_type in ('photo', 'comment') else 'photo_comment',
+                badge=badge,
+            )
+            db.session.add(quest)
+            db.session.flush()
+            draft.status = 'imported'
+            draft.quest_id = quest.id
+        db.session.commit()
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'An error occurred: {e}'}), 500
+    return jsonify({'success': True, 'imported': len(drafts)})
 
 def too_many_requests(e=None):
     return render_template('429.html'), 429
 
 def generate_quest_details(description):
-    client = OpenAI(api_key=current_app.config['OPENAI_API_KEY'])
+    client = openai_client()
     try:
         quest_prompt = generate_quest_prompt(description)
 
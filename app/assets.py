@@ -0,0 +1,232 @@
+from flask import current_app, render_template, url_for
+from flask.cli import with_appcontext
+from app.storage import is_stored_key
+from app.compression import compression, precompress_static
+
+import click
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import re
+
+logger = logging.getLogger(__name__)
+
+HASH_LENGTH = 12
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+
+# Files browsers look up by a fixed URL, plus build outputs
+UNVERSIONED_FILES = {'manifest.json', 'sw.js', 'asset-manifest.json'}
+COMPRESSED_SUFFIXES = ('.gz', '.br')
+
+# Only these are precached; videos, CSVs and source maps are fetched on demand
+PRECACHE_EXTENSIONS = {'.css', '.js', '.woff2', '.png', '.webp', '.jpg', '.jpeg', '.svg', '.ico', '.html'}
+PRECACHE_MAX_BYTES = 512 * 1024
+
+# A fingerprinted name: the content hash sits right before the extension
+FINGERPRINTED_NAME = re.compile(r'^(?P<root>.+)\.[0-9a-f]{%d}(?P<ext>\.[^./]+)$' % HASH_LENGTH)
+STATIC_REFERENCE = re.compile(r"""url_for\(\s*['"]static['"]\s*,\s*filename\s*=\s*['"]([^'"]+)['"]""")
+CSS_REFERENCE = re.compile(r"""url\(\s*['"]?([^'")?#]+)""")
+
+
+def fingerprinted_name(path, digest):
+    root, ext = posixpath.splitext(path)
+    return f"{root}.{digest[:HASH_LENGTH]}{ext}"
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(64 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def asset_files(static_folder):
+    """Yield the static-relative path of every shipped asset (uploads and derivatives excluded)."""
+    for directory, subdirs, files in os.walk(static_folder):
+        relative_dir = os.path.relpath(directory, static_folder).replace(os.sep, '/')
+        relative_dir = '' if relative_dir == '.' else relative_dir
+        subdirs[:] = sorted(name for name in subdirs if not name.startswith('.'))
+        for name in sorted(files):
+            path = posixpath.join(relative_dir, name)
+            if name.startswith('.') or name.endswith(COMPRESSED_SUFFIXES) or path in UNVERSIONED_FILES:
+                continue
+            if is_stored_key(path):
+                continue
+            yield path
+
+
+def build_manifest(static_folder):
+    """Map every asset to its content-hashed name."""
+    return {
+        path: fingerprinted_name(path, file_digest(os.path.join(static_folder, path)))
+        for path in asset_files(static_folder)
+    }
+
+
+def referenced_assets(template_folder, static_folder):
+    """
+    Return (linked, imported): the static files the templates link to, and
+    the fonts and images those stylesheets pull in by relative url(). Only
+    literal url_for('static', ...) calls count; uploads are referenced
+    through variables and never match.
+    """
+    linked = {'offline.html'}
+    for directory, _, files in os.walk(template_folder):
+        for name in files:
+            with open(os.path.join(directory, name), encoding='utf-8') as handle:
+                linked.update(STATIC_REFERENCE.findall(handle.read()))
+
+    imported = set()
+    for stylesheet in [path for path in linked if path.endswith('.css')]:
+        css_path = os.path.join(static_folder, stylesheet)
+        if not os.path.isfile(css_path):
+            continue
+        with open(css_path, encoding='utf-8', errors='ignore') as handle:
+            for url in CSS_REFERENCE.findall(handle.read()):
+                if url.startswith(('data:', 'http:', 'https:', '/')):
+                    continue
+                imported.add(posixpath.normpath(posixpath.join(posixpath.dirname(stylesheet), url)))
+    return linked, imported
+
+
+def precache_names(template_folder, static_folder, manifest):
+    """
+    Static-relative names for the service worker to precache. Linked files
+    use their hashed names; files imported by stylesheets keep their plain
+    names, since that is what the stylesheets request.
+    """
+    linked, imported = referenced_assets(template_folder, static_folder)
+    names = []
+    for path in sorted(linked | imported):
+        full_path = os.path.join(static_folder, path)
+        if posixpath.splitext(path)[1].lower() not in PRECACHE_EXTENSIONS or not os.path.isfile(full_path):
+            continue
+        if os.path.getsize(full_path) <= PRECACHE_MAX_BYTES:
+            names.append(manifest.get(path, path) if path in linked else path)
+    return names
+
+
+class Assets:
+    """
+    Content-hashed URLs for the files shipped in app/static.
+
+    `flask build-assets` writes asset-manifest.json, mapping each file to a
+    name with its content hash ('css/main1.css' -> 'css/main1.3f2a9c1d0b7e.css').
+    url_for('static') then returns the hashed name, which the static route
+    maps back to the real file and serves with a one-year immutable
+    Cache-Control. Without a manifest the manifest is built at startup,
+    except in debug mode, where files are edited in place and plain URLs
+    are kept.
+    """
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.originals = {}
+        self.version = 'dev'
+        self.precache = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.manifest_path = app.config['main'].get(
+            'ASSET_MANIFEST', os.path.join(app.static_folder, 'asset-manifest.json'))
+        self.load(app)
+        app.extensions['assets'] = self
+        app.url_defaults(self._fingerprint)
+        self._serve_fingerprinted(app)
+
+    def load(self, app):
+        if os.path.isfile(self.manifest_path):
+            with open(self.manifest_path, encoding='utf-8') as handle:
+                data = json.load(handle)
+        elif app.debug:
+            return
+        else:
+            logger.info("No asset manifest found; hashing static files at startup")
+            with app.app_context():
+                data = self.build(app)
+        self.manifest = data['files']
+        self.originals = {hashed: path for path, hashed in self.manifest.items()}
+        self.version = data['version']
+        self.precache = data['precache']
+
+    def build(self, app):
+        manifest = build_manifest(app.static_folder)
+        precache = precache_names(os.path.join(app.root_path, app.template_folder), app.static_folder, manifest)
+        version = hashlib.sha256(json.dumps([manifest, precache], sort_keys=True).encode()).hexdigest()[:HASH_LENGTH]
+        return {'version': version, 'files': manifest, 'precache': precache}
+
+    def _fingerprint(self, endpoint, values):
+        if endpoint == 'static' and self.manifest:
+            filename = values.get('filename')
+            values['filename'] = self.manifest.get(filename, filename)
+
+    def _serve_fingerprinted(self, app):
+        static_view = app.view_functions['static']
+
+        def static_or_fingerprinted(filename):
+            original = self.originals.get(filename)
+            if original is None:
+                # A hash from an earlier build, as kept in old pages or
+                # database rows: serve the current file, without the
+                # immutable caching its name no longer guarantees
+                match = FINGERPRINTED_NAME.match(filename)
+                if match and match['root'] + match['ext'] in self.manifest:
+                    return static_view(filename=match['root'] + match['ext'])
+                return static_view(filename=filename)
+            response = static_view(filename=original)
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE
+            return response
+
+        app.view_functions['static'] = static_or_fingerprinted
+
+    def render_service_worker(self):
+        version, precache = self.version, self.precache
+        if not self.manifest:
+            # Debug mode: list the files as they are now, versioned by modification time
+            app = current_app._get_current_object()
+            precache = precache_names(os.path.join(app.root_path, app.template_folder), app.static_folder, {})
+            mtimes = [os.path.getmtime(os.path.join(app.static_folder, name)) for name in precache]
+            version = hashlib.sha256(json.dumps([precache, mtimes]).encode()).hexdigest()[:HASH_LENGTH]
+        return render_template(
+            'sw.js',
+            version=version,
+            precache=[f"{current_app.static_url_path}/{name}" for name in precache],
+            offline_url=f"{current_app.static_url_path}/{self.manifest.get('offline.html', 'offline.html')}",
+        )
+
+
+assets = Assets()
+
+
+def stored_static_url(filename):
+    """
+    The plain URL of a shipped static file, for values saved in the
+    database. Hashed names change with the file, so they are kept to pages.
+    """
+    url = url_for('static', filename=filename)
+    hashed = assets.manifest.get(filename)
+    if hashed and url.endswith(hashed):
+        url = url[:-len(hashed)] + filename
+    return url
+
+
+@click.command('build-assets')
+@click.option('--compress/--no-compress', default=True, help='Also write gzip and brotli variants of text assets.')
+@with_appcontext
+def build_assets_command(compress):
+    """Hash the static files and write the asset manifest used for versioned URLs."""
+    data = assets.build(current_app)
+    with open(assets.manifest_path, 'w', encoding='utf-8') as handle:
+        json.dump(data, handle, indent=2, sort_keys=True)
+    click.echo(f"Wrote {len(data['files'])} assets (version {data['version']}, "
+               f"{len(data['precache'])} precached) to {assets.manifest_path}")
+
+    if compress:
+        paths = list(data['files']) + sorted(UNVERSIONED_FILES - {'asset-manifest.json'})
+        paths = [path for path in paths if os.path.isfile(os.path.join(current_app.static_folder, path))]
+        stats = precompress_static(current_app.static_folder, paths, compression.min_bytes)
+        click.echo(f"Precompressed {stats['files']} files, saving {stats['saved'] / 1024:.0f} KB with gzip")
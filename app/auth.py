@@ -1,10 +1,11 @@
 from cryptography.fernet import Fernet
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify, make_response
 from flask_login import login_user, logout_user, login_required, current_user
-from app.models import db, User, Game
+from app.models import db, User, Game, user_games
 from app.forms import LoginForm, RegistrationForm, ForgotPasswordForm, ResetPasswordForm, UpdatePasswordForm
-from app.utils import send_email, generate_tutorial_game, log_user_ip
-from sqlalchemy import or_
+from app.utils import send_email, join_tutorial_game, log_user_ip
+from app.workers import PoolBusyError
+from sqlalchemy.exc import IntegrityError
 from pytz import utc
 from datetime import datetime
 from urllib.parse import urlparse
@@ -50,6 +51,32 @@ ALLOWED_ATTRIBUTES = {
 def sanitize_html(html_content):
     return bleach.clean(html_content, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES)
 
+# Leave room in User.username (64 chars) for a numeric suffix
+USERNAME_BASE_LENGTH = 54
+USERNAME_RETRIES = 3
+
+def next_free_username(base_username):
+    """Return base_username, or base_username followed by the next unused number, in one query."""
+    pattern = base_username.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    suffix = db.func.substr(User.username, len(base_username) + 1)
+    taken, max_suffix = db.session.query(
+        db.func.count().filter(User.username == base_username),
+        db.func.max(db.cast(suffix, db.Integer)).filter(suffix.op('~')('^[0-9]{1,9}$'))
+    ).filter(User.username.like(pattern, escape='\\')).one()
+
+    if not taken:
+        return base_username
+    return f"{base_username}{(max_suffix or 0) + 1}"
+
+@auth_bp.errorhandler(PoolBusyError)
+def server_busy(e=None):
+    # Password hashing runs in the process pool; when it is full, ask the client to come back
+    current_app.logger.warning(f'Password hashing rejected: {e}')
+    response = make_response(render_template('503.html'), 503)
+    response.headers['Retry-After'] = '1'
+    return response
+
+
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
     # Always create the login form instance
@@ -78,7 +105,6 @@ def login():
             if user and user.check_password(password):
                 login_user(user, remember=login_form.remember_me.data)
                 log_user_ip(current_user)
-                generate_tutorial_game()
 
                 # Automatically join the game if a game_id is provided
                 game_id = request.args.get('game_id')
@@ -90,11 +116,8 @@ def login():
                         flash(f'You have successfully joined the game: {game.title}', 'success')
 
                 # Check if the user has zero participated games and add to tutorial game if true
-                if len(user.participated_games) == 0:
-                    tutorial_game = Game.query.filter_by(is_tutorial=True).first()
-                    if tutorial_game:
-                        user.participated_games.append(tutorial_game)
-                        db.session.commit()
+                if len(user.participated_games) == 0 and join_tutorial_game(user):
+                    db.session.commit()
 
                 quest_id = request.args.get('quest_id')
                 next_page = request.args.get('next')
@@ -114,6 +137,8 @@ def login():
             else:
                 flash('Invalid email or password.')
 
+    except PoolBusyError as e:
+        return server_busy(e)
     except Exception as e:
         current_app.logger.error(f'Login error: {e}')
         flash('An unexpected error occurred during login. Please try again later.', 'error')
@@ -157,23 +182,18 @@ def register():
                 return render_template('register.html', form=register_form, game_id=request.args.get('game_id'), quest_id=request.args.get('quest_id'), next=request.args.get('next'))
 
             email = sanitize_html(register_form.email.data)
-            base_username = email.split('@')[0]
+            base_username = sanitize_html(email.split('@')[0])[:USERNAME_BASE_LENGTH]
             existing_user = User.query.filter_by(email=email).first()
             if existing_user:
                 flash('Email already registered. Please use a different email.', 'warning')
                 return redirect(url_for('auth.register', game_id=request.args.get('game_id'), quest_id=request.args.get('quest_id'), next=request.args.get('next')))
 
-            counter = 1
-            username = base_username
-            while User.query.filter(or_(User.username == username, User.email == email)).first():
-                username = f"{base_username}{counter}"
-                counter += 1
-
+            # Without a mail account configured, email verification is bypassed
+            requires_verification = bool(current_app.config.get('MAIL_USERNAME'))
             user = User(
-                username=sanitize_html(username),
                 email=email,
                 license_agreed=register_form.accept_license.data,
-                email_verified=False,  # Initially set to False
+                email_verified=not requires_verification,
                 is_admin=False,
                 created_at=datetime.now(utc),
                 score=0,
@@ -183,41 +203,43 @@ def register():
                 interests=None
             )
             user.set_password(register_form.password.data)
-            db.session.add(user)
             try:
-                db.session.commit()
+                # Another registration can take the same name between the lookup and the insert
+                for attempt in range(USERNAME_RETRIES):
+                    user.username = next_free_username(base_username)
+                    try:
+                        with db.session.begin_nested():
+                            db.session.add(user)
+                        break
+                    except IntegrityError:
+                        if User.query.filter_by(email=email).first():
+                            flash('Email already registered. Please use a different email.', 'warning')
+                            return redirect(url_for('auth.register', game_id=request.args.get('game_id'), quest_id=request.args.get('quest_id'), next=request.args.get('next')))
+                else:
+                    raise RuntimeError(f'Could not allocate a username for {base_username}')
 
-                # Check if email verification is required
-                if current_app.config.get('MAIL_USERNAME'):
+                if requires_verification:
                     token = user.generate_verification_token()
                     verify_url = url_for('auth.verify_email', token=token, _external=True, quest_id=request.args.get('quest_id'), next=request.args.get('next'))
                     html = render_template('verify_email.html', verify_url=verify_url)
                     subject = "QuestByCycle verify email"
-                    send_email(user.email, subject, html)
+                    send_email(user.email, subject, html, commit=False)
+                    db.session.commit()
                     flash('A verification email has been sent to you. Please check your inbox.', 'info')
                 else:
-                    user.email_verified = True  # Automatically verify email
+                    # Automatically join the game if a game_id is provided, otherwise the tutorial game
+                    game_id = request.args.get('game_id')
+                    game = Game.query.get(game_id) if game_id else None
+                    if game:
+                        db.session.execute(user_games.insert().values(user_id=user.id, game_id=game.id))
+                    else:
+                        join_tutorial_game(user)
+
+                    # User, verification and game memberships land in a single commit
                     db.session.commit()
                     login_user(user)  # Log in the user automatically if email verification is bypassed
-
-                    # Automatically join the game if a game_id is provided
-                    game_id = request.args.get('game_id')
-                    if game_id:
-                        game = Game.query.get(game_id)
-                        if game and game not in user.participated_games:
-                            user.participated_games.append(game)
-                            db.session.commit()
-                            flash(f'You have successfully joined the game: {game.title}', 'success')
-
-                    # Ensure the tutorial game exists
-                    generate_tutorial_game()
-
-                    # Check if the user has zero participated games and add to tutorial game if true
-                    if len(user.participated_games) == 0:
-                        tutorial_game = Game.query.filter_by(is_tutorial=True).order_by(Game.start_date.desc()).first()
-                        if tutorial_game:
-                            user.participated_games.append(tutorial_game)
-                            db.session.commit()
+                    if game:
+                        flash(f'You have successfully joined the game: {game.title}', 'success')
 
                 next_page = request.args.get('next')
                 quest_id = request.args.get('quest_id')
@@ -239,6 +261,8 @@ def register():
                 current_app.logger.error(f'Failed to register user or send verification email: {e}')
                 return render_template('register.html', title='Register', form=register_form, game_id=request.args.get('game_id'), quest_id=request.args.get('quest_id'), next=request.args.get('next'))
 
+    except PoolBusyError as e:
+        return server_busy(e)
     except Exception as e:
         current_app.logger.error(f'Registration error: {e}')
         flash('An unexpected error occurred during registration. Please try again later.', 'error')
@@ -298,15 +322,9 @@ def verify_email(token):
     db.session.commit()
     login_user(user)  # Log in the user
 
-    # Ensure the tutorial game exists
-    generate_tutorial_game()
-
     # Check if the user has zero participated games and add to tutorial game if true
-    if len(user.participated_games) == 0:
-        tutorial_game = Game.query.filter_by(is_tutorial=True).first()
-        if tutorial_game:
-            user.participated_games.append(tutorial_game)
-            db.session.commit()
+    if len(user.participated_games) == 0 and join_tutorial_game(user):
+        db.session.commit()
 
     # Automatically join the game if a game_id is provided
     game_id = request.args.get('game_id')
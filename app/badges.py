@@ -3,6 +3,8 @@ from flask_login import login_required, current_user
 from .forms import BadgeForm
 from .utils import save_badge_image, allowed_file
 from .models import db, Quest, Badge, UserQuest, Game
+from .storage import storage, badge_image_key
+from .game_versions import game_cache, version_etag, conditional_response
 from werkzeug.utils import secure_filename
 
 import bleach
@@ -58,14 +60,9 @@ def create_badge():
     return render_template('create_badge.html', form=form)
 
 
-@badges_bp.route('/badges', methods=['GET'])
-def get_badges():
-    game_id = request.args.get('game_id', type=int)
+def badge_rows(game_id=None):
+    """Badges with their awarding quest, as served by get_badges before per-user counts."""
     if game_id:
-        game = Game.query.get(game_id)
-        if not game:
-            return jsonify(error="Game not found"), 404
-
         # Filter badges by joining with Quest and filtering by game_id.
         badges = Badge.query.join(Quest).filter(
             Quest.game_id == game_id,
@@ -73,24 +70,13 @@ def get_badges():
         ).distinct().all()
     else:
         badges = Badge.query.all()
-    
+
     badges_data = []
     for badge in badges:
         awarding_quest = (
             next((quest for quest in badge.quests if quest.game_id == game_id), None)
             if game_id else (badge.quests[0] if badge.quests else None)
         )
-        
-        # Calculate the user's completions for the awarding quest.
-        if awarding_quest and current_user.is_authenticated:
-            user_quest = UserQuest.query.filter_by(
-                user_id=current_user.id,
-                quest_id=awarding_quest.id
-            ).first()
-            user_completions_value = user_quest.completions if user_quest else 0
-        else:
-            user_completions_value = 0
-
         badges_data.append({
             'id': badge.id,
             'name': badge.name,
@@ -100,11 +86,41 @@ def get_badges():
             'task_name': awarding_quest.title if awarding_quest else None,
             'task_id': awarding_quest.id if awarding_quest else None,
             'badge_awarded_count': awarding_quest.badge_awarded if awarding_quest else 1,
-            'user_completions': user_completions_value
         })
+    return badges_data
 
-    return jsonify(badges=badges_data)
 
+def with_user_completions(badges_data):
+    """Copies of badges_data with the current user's completions of each awarding quest."""
+    completions = {}
+    task_ids = [badge['task_id'] for badge in badges_data if badge['task_id']]
+    if task_ids and current_user.is_authenticated:
+        completions = dict(db.session.query(UserQuest.quest_id, UserQuest.completions).filter(
+            UserQuest.user_id == current_user.id,
+            UserQuest.quest_id.in_(task_ids)
+        ).all())
+    return [dict(badge, user_completions=completions.get(badge['task_id'], 0)) for badge in badges_data]
+
+
+@badges_bp.route('/badges', methods=['GET'])
+def get_badges():
+    game_id = request.args.get('game_id', type=int)
+    if not game_id:
+        return jsonify(badges=with_user_completions(badge_rows()))
+
+    game = Game.query.get(game_id)
+    if not game:
+        return jsonify(error="Game not found"), 404
+
+    # The badges are shared; only the completions differ between users
+    user_key = current_user.id if current_user.is_authenticated else 0
+    return conditional_response(
+        version_etag('badges', game_id, user_key),
+        lambda: current_app.json.dumps({'badges': with_user_completions(
+            game_cache.get_or_build('badges', game_id, lambda: badge_rows(game_id))
+        )}),
+        private=True,
+    )
 
 
 @badges_bp.route('/badges/manage_badges', methods=['GET', 'POST'])
@@ -233,17 +249,12 @@ def upload_images():
         return jsonify({'success': False, 'message': 'Unauthorized access'}), 403
 
     uploaded_files = request.files.getlist('file')
-    images_folder = os.path.join(current_app.root_path, 'static', 'images', 'badge_images')
-
-    if not os.path.exists(images_folder):
-        os.makedirs(images_folder)
 
     for uploaded_file in uploaded_files:
         if uploaded_file and allowed_file(uploaded_file.filename):
             # Extract filename and remove any directory path included by the browser
             filename = secure_filename(uploaded_file.filename.split('/')[-1])
-            file_path = os.path.join(images_folder, filename)
-            uploaded_file.save(file_path)
+            storage.save(uploaded_file.stream, badge_image_key(filename), uploaded_file.mimetype)
 
             # Convert filename to badge name
             badge_name = ' '.join(word.capitalize() for word in filename.rsplit('.', 1)[0].replace('_', ' ').split())
@@ -288,8 +299,7 @@ def bulk_upload():
     for image_file in image_files:
         if allowed_file(image_file.filename):
             filename = secure_filename(image_file.filename)
-            image_path = os.path.join(current_app.root_path, 'static', 'images', 'badge_images', filename)
-            image_file.save(image_path)
+            image_path = storage.save(image_file.stream, badge_image_key(filename), image_file.mimetype)
             image_dict[filename] = filename
             print(f"Saved image: {filename} to {image_path}")
 
@@ -0,0 +1,95 @@
+from flask import url_for
+from app.models import db, Quest, QuestSubmission
+from app.storage import storage, storage_key
+from app.assets import stored_static_url
+
+import threading
+import time
+
+# Widths offered in the srcset; the carousel is at most 400 CSS pixels wide,
+# so 768 covers it on 2x screens. All are DERIVATIVE_WIDTHS breakpoints.
+CAROUSEL_WIDTHS = (320, 480, 768)
+CAROUSEL_SIZES = '(max-width: 600px) 80vw, 400px'
+
+
+class Carousel:
+    """
+    Picks the photos shown in a game's carousel.
+
+    The newest photo submissions are read with at most PER_QUEST from each
+    quest, so one popular quest cannot fill the carousel. Each quest's
+    photos come from the (quest_id, timestamp, id) index through a LATERAL
+    subquery, so the query reads at most PER_QUEST rows per quest however
+    many submissions the game has. The result is kept per game for TTL
+    seconds; new photos show up after that.
+    """
+
+    def __init__(self, app=None):
+        self.size = 12
+        self.per_quest = 3
+        self.ttl = 300
+        self._entries = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        settings = app.config.get('main', {})
+        self.size = int(settings.get('CAROUSEL_SIZE', self.size))
+        self.per_quest = int(settings.get('CAROUSEL_PER_QUEST', self.per_quest))
+        self.ttl = int(settings.get('CAROUSEL_TTL', self.ttl))
+        app.extensions['carousel'] = self
+
+    def images(self, game_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(game_id)
+            if entry and entry[0] > now:
+                return entry[1]
+        images = [self._image(row) for row in self._recent_photos(game_id)]
+        with self._lock:
+            # Expired games are dropped on the next write, so the dict stays at the active games
+            self._entries = {key: value for key, value in self._entries.items() if value[0] > now}
+            self._entries[game_id] = (now + self.ttl, images)
+        return images
+
+    def _recent_photos(self, game_id):
+        quests = db.select(Quest.id, Quest.title).where(
+            Quest.game_id == game_id, Quest.enabled.is_(True)
+        ).subquery()
+        photos = db.select(
+            QuestSubmission.id, QuestSubmission.image_url, QuestSubmission.comment, QuestSubmission.timestamp
+        ).where(
+            QuestSubmission.quest_id == quests.c.id,
+            QuestSubmission.image_url.isnot(None),
+            QuestSubmission.image_url != '',
+            # Comment-only submissions store the placeholder image; they are not photos
+            QuestSubmission.image_url != stored_static_url('images/commentPlaceholder.png'),
+        ).order_by(
+            QuestSubmission.timestamp.desc(), QuestSubmission.id.desc()
+        ).limit(self.per_quest).lateral()
+
+        statement = db.select(photos, quests.c.title).select_from(
+            quests.join(photos, db.true())
+        ).order_by(photos.c.timestamp.desc(), photos.c.id.desc()).limit(self.size)
+        return db.session.execute(statement).all()
+
+    def _image(self, row):
+        key = storage_key(row.image_url)
+        return {
+            'id': row.id,
+            'src': storage.upload_url(key),
+            'srcset': ', '.join(
+                f"{url_for('main.resize_image', path=key, width=width)} {width}w" for width in CAROUSEL_WIDTHS
+            ),
+            'sizes': CAROUSEL_SIZES,
+            'quest_title': row.title,
+            'comment': row.comment,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+carousel = Carousel()
@@ -0,0 +1,196 @@
+from flask import current_app
+from datetime import datetime, timedelta
+from pytz import utc
+from app.models import db, UploadSession
+from app.storage import storage, new_upload_key
+
+import hashlib
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Upload kinds that may arrive in chunks, and where the finished file is stored
+CHUNKED_UPLOAD_DIRS = {
+    'verification': 'images/verifications',
+}
+
+READ_BLOCK = 64 * 1024
+
+
+class UploadOffsetError(ValueError):
+    """Raised when a chunk does not start where the previous one ended."""
+
+    def __init__(self, received):
+        super().__init__(f"Expected offset {received}")
+        self.received = received
+
+
+class ChecksumMismatchError(ValueError):
+    """Raised when a chunk or the assembled file does not match its checksum."""
+
+
+def partial_path(upload):
+    return os.path.join(current_app.config['UPLOAD_TMP_DIR'], f"{upload.id}.part")
+
+
+def create_upload_session(user_id, kind, filename, content_type, size, checksum):
+    if kind not in CHUNKED_UPLOAD_DIRS:
+        raise ValueError('Unknown upload kind')
+    if not 0 < size <= current_app.config['UPLOAD_MAX_BYTES']:
+        raise ValueError('File is empty or too large')
+    if len(checksum or '') != 64:
+        raise ValueError('A sha256 checksum of the file is required')
+
+    expire_stale_uploads()
+
+    upload = UploadSession(
+        user_id=user_id,
+        kind=kind,
+        filename=filename[:255],
+        content_type=content_type[:100],
+        size=size,
+        checksum=checksum.lower(),
+        expires_at=datetime.now(utc) + timedelta(seconds=current_app.config['UPLOAD_SESSION_TTL']),
+    )
+    db.session.add(upload)
+    db.session.flush()
+
+    os.makedirs(current_app.config['UPLOAD_TMP_DIR'], exist_ok=True)
+    open(partial_path(upload), 'wb').close()
+    db.session.commit()
+    return upload
+
+
+def write_chunk(upload, offset, stream, chunk_checksum=None):
+    """
+    Append one chunk read from stream at offset.
+
+    The caller holds a row lock on upload. A chunk that was cut off mid-way
+    leaves bytes past upload.received; they are truncated away when the
+    client retries from the last acknowledged offset.
+    """
+    if upload.status != 'uploading':
+        raise ValueError('Upload is already complete')
+    if offset != upload.received:
+        raise UploadOffsetError(upload.received)
+
+    limit = min(current_app.config['UPLOAD_CHUNK_SIZE'], upload.size - offset)
+    digest = hashlib.sha256()
+    written = 0
+    with open(partial_path(upload), 'r+b') as part:
+        part.truncate(offset)
+        part.seek(offset)
+        while True:
+            block = stream.read(READ_BLOCK)
+            if not block:
+                break
+            written += len(block)
+            if written > limit:
+                part.truncate(offset)
+                raise ValueError('Chunk is larger than allowed')
+            digest.update(block)
+            part.write(block)
+
+        if chunk_checksum and digest.hexdigest() != chunk_checksum.lower():
+            part.truncate(offset)
+            raise ChecksumMismatchError('Chunk checksum mismatch')
+
+    upload.received = offset + written
+    # Active uploads stay alive; only abandoned ones expire
+    upload.expires_at = datetime.now(utc) + timedelta(seconds=current_app.config['UPLOAD_SESSION_TTL'])
+    if upload.received == upload.size:
+        finish_upload(upload)
+    db.session.commit()
+    return upload
+
+
+def finish_upload(upload):
+    path = partial_path(upload)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as part:
+        for block in iter(lambda: part.read(READ_BLOCK), b''):
+            digest.update(block)
+
+    if digest.hexdigest() != upload.checksum:
+        # Start over rather than keep a corrupt file
+        open(path, 'wb').close()
+        upload.received = 0
+        db.session.commit()
+        raise ChecksumMismatchError('File checksum mismatch')
+
+    key = new_upload_key(CHUNKED_UPLOAD_DIRS[upload.kind], upload.filename)
+    with open(path, 'rb') as part:
+        storage.save(part, key, upload.content_type)
+    os.remove(path)
+    upload.storage_key = key
+    upload.status = 'complete'
+
+
+def issue_direct_upload(user_id, kind, filename, content_type, max_bytes):
+    """
+    Record a key handed out for a presigned POST, so only the user it was
+    issued to can attach the uploaded object to a submission. Returns the
+    session; its storage_key is where the browser uploads.
+    """
+    if kind not in CHUNKED_UPLOAD_DIRS:
+        raise ValueError('Unknown upload kind')
+
+    expire_stale_uploads()
+
+    upload = UploadSession(
+        user_id=user_id,
+        kind=kind,
+        filename=filename[:255],
+        content_type=content_type[:100],
+        # The upload goes straight to the bucket, so only the policy's limit is known
+        size=max_bytes,
+        checksum='',
+        status='presigned',
+        storage_key=new_upload_key(CHUNKED_UPLOAD_DIRS[kind], filename),
+        expires_at=datetime.now(utc) + timedelta(seconds=current_app.config['UPLOAD_SESSION_TTL']),
+    )
+    db.session.add(upload)
+    db.session.commit()
+    return upload
+
+
+def direct_upload(key, user_id, kind):
+    """Return the caller's presigned upload for key if the object arrived, or None."""
+    if not key:
+        return None
+    upload = UploadSession.query.filter_by(
+        storage_key=key, user_id=user_id, kind=kind, status='presigned'
+    ).first()
+    if not upload or not storage.exists(key):
+        return None
+    return upload
+
+
+def completed_upload(upload_id, user_id, kind):
+    """Return the caller's finished upload for upload_id, or None."""
+    if not upload_id:
+        return None
+    upload = db.session.get(UploadSession, upload_id)
+    if not upload or upload.user_id != user_id or upload.kind != kind or upload.status != 'complete':
+        return None
+    return upload
+
+
+def expire_stale_uploads(limit=100):
+    """Drop abandoned sessions with their partial files and never-used results."""
+    stale = UploadSession.query.filter(
+        UploadSession.expires_at < datetime.now(utc)
+    ).limit(limit).with_for_update(skip_locked=True).all()
+
+    for upload in stale:
+        try:
+            if upload.status == 'uploading' and os.path.exists(partial_path(upload)):
+                os.remove(partial_path(upload))
+            elif upload.status in ('complete', 'presigned'):
+                storage.delete(upload.storage_key)
+        except Exception as e:
+            logger.warning(f"Could not clean up upload {upload.id}: {e}")
+        db.session.delete(upload)
+    db.session.commit()
+    return len(stale)
@@ -0,0 +1,237 @@
+from flask import request, send_from_directory
+from werkzeug.security import safe_join
+from app.storage import is_stored_key
+from app.workers import process_pool, compress_bytes, PoolBusyError
+
+import logging
+import mimetypes
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+# Text formats worth compressing; images, fonts in woff2 and videos already are
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript', 'text/xml',
+    'application/javascript', 'application/json', 'application/manifest+json', 'application/xml',
+    'image/svg+xml', 'image/x-icon', 'image/vnd.microsoft.icon', 'font/ttf', 'application/vnd.ms-fontobject',
+}
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.html', '.json', '.map', '.svg', '.ico', '.ttf', '.eot', '.csv', '.txt', '.xml'}
+
+# Build-time variants can use the slowest, smallest settings
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+# Keep a variant only if it saves at least this fraction of the file
+MIN_SAVING = 0.05
+
+
+def available_encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def is_compressible_file(path):
+    return os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def precompress_file(path, min_bytes):
+    """
+    Write path.gz and path.br next to path.
+
+    Variants that would not be noticeably smaller are removed instead, so
+    the static route falls back to the plain file. Returns the bytes saved
+    by the gzip variant, or 0.
+    """
+    with open(path, 'rb') as handle:
+        data = handle.read()
+
+    saved = 0
+    for encoding in ('gzip', 'br'):
+        variant = path + SUFFIXES[encoding]
+        if encoding == 'br' and brotli is None:
+            continue
+        if len(data) < min_bytes:
+            compressed = None
+        else:
+            level = STATIC_BROTLI_QUALITY if encoding == 'br' else STATIC_GZIP_LEVEL
+            compressed = compress_bytes(data, encoding, level)
+            if len(compressed) > len(data) * (1 - MIN_SAVING):
+                compressed = None
+
+        if compressed is None:
+            if os.path.exists(variant):
+                os.remove(variant)
+            continue
+
+        tmp_path = f"{variant}.tmp"
+        with open(tmp_path, 'wb') as out:
+            out.write(compressed)
+        os.replace(tmp_path, variant)
+        if encoding == 'gzip':
+            saved = len(data) - len(compressed)
+    return saved
+
+
+def precompress_static(static_folder, paths, min_bytes):
+    """Precompress the compressible files among paths (relative to static_folder)."""
+    stats = {'files': 0, 'saved': 0}
+    for path in paths:
+        if not is_compressible_file(path):
+            continue
+        stats['files'] += 1
+        stats['saved'] += precompress_file(os.path.join(static_folder, path), min_bytes)
+    return stats
+
+
+def compress_stream(chunks, encoding, level):
+    """
+    Compress a streamed body chunk by chunk. Each chunk is flushed, so the
+    browser can render what has arrived instead of waiting for the end.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+class Compression:
+    """
+    Compresses what the app sends to browsers.
+
+    Static files are served from the .br or .gz variant written by
+    `flask build-assets` when the browser accepts it and the variant is
+    at least as new as the file. HTML and JSON responses larger than
+    MIN_BYTES are compressed on the fly at a cheap level. Bodies up to
+    INLINE_BYTES are compressed in the request, larger ones in the process
+    pool so the gevent hub is not blocked, and anything over MAX_BYTES, or
+    any body arriving while the pool is busy, is sent uncompressed.
+    Streamed pages are compressed as they are sent. Brotli needs the
+    brotli package; without it only gzip is offered.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.min_bytes = 1024
+        self.inline_bytes = 256 * 1024
+        self.max_bytes = 8 * 1024 * 1024
+        self.gzip_level = 6
+        self.brotli_quality = 4
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        settings = app.config.get('compression', {})
+        self.enabled = bool(settings.get('ENABLED', self.enabled))
+        self.min_bytes = int(settings.get('MIN_BYTES', self.min_bytes))
+        self.inline_bytes = int(settings.get('INLINE_BYTES', self.inline_bytes))
+        self.max_bytes = int(settings.get('MAX_BYTES', self.max_bytes))
+        self.gzip_level = int(settings.get('GZIP_LEVEL', self.gzip_level))
+        self.brotli_quality = int(settings.get('BROTLI_QUALITY', self.brotli_quality))
+        app.extensions['compression'] = self
+        if self.enabled:
+            self._serve_precompressed(app)
+            app.after_request(self.compress_response)
+
+    def negotiate(self, encodings):
+        """Pick the encoding the browser prefers among encodings, or None."""
+        accepted = [encoding for encoding in encodings if request.accept_encodings[encoding] > 0]
+        if not accepted:
+            return None
+        return max(accepted, key=lambda encoding: request.accept_encodings[encoding])
+
+    def _serve_precompressed(self, app):
+        static_view = app.view_functions['static']
+
+        def static_or_precompressed(filename):
+            if not is_compressible_file(filename) or is_stored_key(filename):
+                return static_view(filename=filename)
+
+            path = safe_join(app.static_folder, filename)
+            try:
+                mtime = os.stat(path).st_mtime
+                fresh = [
+                    encoding for encoding in available_encodings()
+                    if os.stat(path + SUFFIXES[encoding]).st_mtime >= mtime
+                ]
+            except (TypeError, OSError):
+                fresh = []
+            encoding = self.negotiate(fresh) if fresh else None
+            if encoding is None:
+                response = static_view(filename=filename)
+            else:
+                response = send_from_directory(
+                    app.static_folder, filename + SUFFIXES[encoding],
+                    mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                    max_age=app.get_send_file_max_age(filename),
+                )
+                response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+            return response
+
+        app.view_functions['static'] = static_or_precompressed
+
+    def compress_response(self, response):
+        if (response.direct_passthrough or response.status_code != 200
+                or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES
+                or 'no-transform' in response.headers.get('Cache-Control', '')):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if response.is_streamed:
+            return self._compress_stream(response)
+
+        body = response.get_data()
+        if not self.min_bytes <= len(body) <= self.max_bytes:
+            return response
+        encoding = self.negotiate(available_encodings())
+        if encoding is None:
+            return response
+
+        level = self.brotli_quality if encoding == 'br' else self.gzip_level
+        try:
+            if len(body) <= self.inline_bytes:
+                compressed = compress_bytes(body, encoding, level)
+            else:
+                compressed = process_pool.run(compress_bytes, body, encoding, level)
+        except PoolBusyError:
+            return response
+        except Exception as e:
+            logger.warning(f"Could not compress response: {e}")
+            return response
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            # Each encoding is a different representation
+            response.set_etag(f"{etag}-{encoding}", weak=weak)
+        return response
+
+    def _compress_stream(self, response):
+        encoding = self.negotiate(available_encodings())
+        if encoding is None:
+            return response
+        level = self.brotli_quality if encoding == 'br' else self.gzip_level
+        response.response = compress_stream(response.iter_encoded(), encoding, level)
+        response.headers['Content-Encoding'] = encoding
+        response.headers.pop('Content-Length', None)
+        return response
+
+
+compression = Compression()
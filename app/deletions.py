@@ -0,0 +1,208 @@
+from flask import current_app
+from datetime import datetime
+from pytz import utc
+from app.models import (
+    db, User, Game, Quest, UserQuest, QuestLike, QuestSubmission, ShoutBoardMessage, ShoutBoardLike,
+    ProfileWallMessage, PlayerMessageBoardMessage, UserIP, Sponsor, Announcement, OutboxEmail,
+    DeletionJob, user_games, user_badges, game_participants
+)
+from app.storage import storage, upload_key
+from app.game_versions import bump_game_versions
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+DELETION_LOCK_KEY = 0x64656c
+
+# Like tables, with the column naming what was liked and the model keeping its like_count
+LIKE_COUNTERS = {
+    QuestLike.__table__: (QuestLike.quest_id, Quest),
+    ShoutBoardLike.__table__: (ShoutBoardLike.message_id, ShoutBoardMessage),
+}
+
+
+def remove_files(job, stored_values):
+    for stored_value in stored_values:
+        key = upload_key(stored_value)
+        if key:
+            try:
+                if storage.delete(key):
+                    job.deleted_files += 1
+            except Exception as e:
+                logger.warning(f"Deletion job {job.id} could not remove {key}: {e}")
+
+
+def uncount_likes(model, liked_ids):
+    """Lower model.like_count by the number of times each id appears in liked_ids."""
+    by_count = {}
+    for liked_id in set(liked_ids):
+        by_count.setdefault(liked_ids.count(liked_id), []).append(liked_id)
+    for count, ids in by_count.items():
+        db.session.execute(
+            db.update(model).where(model.id.in_(ids)).values(like_count=model.like_count - count)
+        )
+
+
+def delete_in_chunks(job, table, condition, file_column=None):
+    """
+    Delete matching rows chunk by chunk, committing after each chunk so locks
+    are short-lived and a restarted job picks up where it stopped. Files are
+    removed only after the rows referencing them are committed away. Deleted
+    likes are taken off their targets' like_count in the same transaction.
+    """
+    from app import socketio
+
+    chunk_size = current_app.config['DELETION_CHUNK_SIZE']
+    ctid = db.literal_column('ctid')
+    while True:
+        chunk = db.select(ctid).select_from(table).where(condition).limit(chunk_size).scalar_subquery()
+        statement = table.delete().where(ctid.in_(chunk))
+        counter = LIKE_COUNTERS.get(table)
+        returning = [column for column in (file_column, counter and counter[0]) if column is not None]
+        if returning:
+            statement = statement.returning(*returning)
+        result = db.session.execute(statement)
+        rows = result.all() if returning else []
+        stored_values = [row[0] for row in rows] if file_column is not None else []
+        if counter is not None:
+            uncount_likes(counter[1], [row[-1] for row in rows])
+        deleted = result.rowcount
+
+        job.deleted_rows += deleted
+        db.session.commit()
+        remove_files(job, stored_values)
+        if deleted < chunk_size:
+            break
+        # Let requests run between chunks
+        socketio.sleep(0)
+
+
+def user_steps(user_id):
+    return [
+        ('submissions', QuestSubmission.__table__, QuestSubmission.user_id == user_id, QuestSubmission.image_url),
+        ('completed quests', UserQuest.__table__, UserQuest.user_id == user_id, None),
+        ('quest likes', QuestLike.__table__, QuestLike.user_id == user_id, None),
+        ('shout board likes', ShoutBoardLike.__table__, ShoutBoardLike.user_id == user_id, None),
+        ('shout board likes', ShoutBoardLike.__table__, ShoutBoardLike.message_id.in_(
+            db.select(ShoutBoardMessage.id).where(ShoutBoardMessage.user_id == user_id)), None),
+        ('shout board messages', ShoutBoardMessage.__table__, ShoutBoardMessage.user_id == user_id, None),
+        ('profile wall messages', ProfileWallMessage.__table__,
+            db.or_(ProfileWallMessage.user_id == user_id, ProfileWallMessage.author_id == user_id), None),
+        ('player messages', PlayerMessageBoardMessage.__table__,
+            db.or_(PlayerMessageBoardMessage.user_id == user_id, PlayerMessageBoardMessage.author_id == user_id), None),
+        ('ip addresses', UserIP.__table__, UserIP.user_id == user_id, None),
+        ('badges', user_badges, user_badges.c.user_id == user_id, None),
+        ('game memberships', user_games, user_games.c.user_id == user_id, None),
+        ('game memberships', game_participants, game_participants.c.user_id == user_id, None),
+    ]
+
+
+def game_steps(game_id):
+    game_quests = db.select(Quest.id).where(Quest.game_id == game_id)
+    return [
+        ('submissions', QuestSubmission.__table__, QuestSubmission.quest_id.in_(game_quests), QuestSubmission.image_url),
+        ('completed quests', UserQuest.__table__, UserQuest.quest_id.in_(game_quests), None),
+        ('quest likes', QuestLike.__table__, QuestLike.quest_id.in_(game_quests), None),
+        ('shout board likes', ShoutBoardLike.__table__, ShoutBoardLike.message_id.in_(
+            db.select(ShoutBoardMessage.id).where(ShoutBoardMessage.game_id == game_id)), None),
+        ('shout board messages', ShoutBoardMessage.__table__, ShoutBoardMessage.game_id == game_id, None),
+        ('announcement emails', OutboxEmail.__table__, OutboxEmail.announcement_id.in_(
+            db.select(Announcement.id).where(Announcement.game_id == game_id)), None),
+        ('announcements', Announcement.__table__, Announcement.game_id == game_id, None),
+        ('game memberships', user_games, user_games.c.game_id == game_id, None),
+        ('game memberships', game_participants, game_participants.c.game_id == game_id, None),
+        ('sponsors', Sponsor.__table__, Sponsor.game_id == game_id, Sponsor.logo),
+        ('quests', Quest.__table__, Quest.game_id == game_id, None),
+    ]
+
+
+def run_deletion_job(job):
+    job.status = 'running'
+    db.session.commit()
+
+    touched_game_ids, touched_quest_ids = [], []
+    if job.kind == 'user':
+        steps = user_steps(job.target_id)
+        # Games whose submission counts change; the bulk deletes bypass the ORM's version bumps
+        touched_quest_ids = db.session.scalars(
+            db.select(QuestSubmission.quest_id).where(QuestSubmission.user_id == job.target_id).distinct()
+        ).all()
+        owner = User.__table__
+        owner_files = (User.profile_picture, User.bike_picture)
+        # Rows that only point at the user are kept and detached
+        db.session.execute(db.update(Quest).where(Quest.user_id == job.target_id).values(user_id=None))
+    else:
+        steps = game_steps(job.target_id)
+        touched_game_ids = [job.target_id]
+        owner = Game.__table__
+        owner_files = (Game.leaderboard_image,)
+        # Hide the game so nobody joins or plays it while it is being emptied
+        db.session.execute(db.update(Game).where(Game.id == job.target_id).values(is_public=False, allow_joins=False))
+        db.session.execute(db.update(User).where(User.selected_game_id == job.target_id).values(selected_game_id=None))
+    db.session.commit()
+
+    for name, table, condition, file_column in steps:
+        job.step = name
+        db.session.commit()
+        delete_in_chunks(job, table, condition, file_column)
+
+    bump_game_versions(game_ids=touched_game_ids, quest_ids=touched_quest_ids)
+    job.step = job.kind
+    result = db.session.execute(owner.delete().where(owner.c.id == job.target_id).returning(*owner_files))
+    stored_values = [value for row in result for value in row]
+    job.deleted_rows += result.rowcount
+    job.status = 'done'
+    job.finished_at = datetime.now(utc)
+    db.session.commit()
+    remove_files(job, stored_values)
+    db.session.commit()
+
+
+def process_deletion_job(app, job_id):
+    with app.app_context():
+        # A job restarted after a crash may be picked up by several processes; only one runs it
+        with db.engine.connect() as lock_conn:
+            locked = lock_conn.execute(db.text('SELECT pg_try_advisory_lock(:a, :b)'), {'a': DELETION_LOCK_KEY, 'b': job_id}).scalar()
+            if not locked:
+                return
+            try:
+                job = db.session.get(DeletionJob, job_id)
+                if job and job.status in ('queued', 'running'):
+                    run_deletion_job(job)
+            except Exception as e:
+                logger.error(f"Deletion job {job_id} failed: {e}")
+                db.session.rollback()
+                job = db.session.get(DeletionJob, job_id)
+                job.status = 'failed'
+                job.error = str(e)
+                db.session.commit()
+            finally:
+                lock_conn.execute(db.text('SELECT pg_advisory_unlock(:a, :b)'), {'a': DELETION_LOCK_KEY, 'b': job_id})
+                db.session.remove()
+
+
+def start_deletion_job(kind, target_id, target_name=None, requested_by=None):
+    from app import socketio
+
+    job = DeletionJob.query.filter(
+        DeletionJob.kind == kind, DeletionJob.target_id == target_id, DeletionJob.status.in_(['queued', 'running'])
+    ).first()
+    if not job:
+        job = DeletionJob(kind=kind, target_id=target_id, target_name=target_name, requested_by=requested_by)
+        db.session.add(job)
+        db.session.commit()
+
+    socketio.start_background_task(process_deletion_job, current_app._get_current_object(), job.id)
+    return job
+
+
+def resume_deletion_jobs(app):
+    """Restart jobs interrupted by a crash or deploy; every step is safe to run twice."""
+    with app.app_context():
+        job_ids = [job_id for (job_id,) in db.session.query(DeletionJob.id).filter(
+            DeletionJob.status.in_(['queued', 'running'])
+        ).all()]
+        db.session.remove()
+    for job_id in job_ids:
+        process_deletion_job(app, job_id)
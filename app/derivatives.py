@@ -0,0 +1,115 @@
+from flask import current_app, send_file, redirect
+from app.storage import storage
+from app.workers import process_pool, resize_to_webp, blend_smog_levels, render_qr_png
+from io import BytesIO
+
+import hashlib
+import os
+import uuid
+
+# Breakpoints for generated variants; smog requests are snapped up to one of
+# these so the cache does not fill up with one file per pixel. The last entry
+# is also the largest width resize_image will produce.
+DERIVATIVE_WIDTHS = (160, 320, 480, 768, 1200, 1600)
+
+# Smog levels are quantized to 5% steps (21 variants per image and width)
+SMOG_STEPS = 20
+SMOG_PREWARM_WIDTH = 768
+
+
+def snap_width(width):
+    for candidate in DERIVATIVE_WIDTHS:
+        if width <= candidate:
+            return candidate
+    return DERIVATIVE_WIDTHS[-1]
+
+
+def snap_smog_level(percent):
+    """Map a 0-100 smog percentage onto the nearest cached step (0.0 - 1.0)."""
+    percent = min(max(percent, 0), 100)
+    return round(percent / 100.0 * SMOG_STEPS) / SMOG_STEPS
+
+
+def derivative_dir():
+    return os.path.join(current_app.static_folder, current_app.config['DERIVATIVE_CACHE_DIR'])
+
+
+def derivative_key(source_key, variant):
+    # Keyed on the source's mtime and size so a replaced upload never serves a stale derivative
+    source_stat = storage.source_stat(source_key)
+    if source_stat is None:
+        raise FileNotFoundError(source_key)
+    size, mtime = source_stat
+    key = f"{source_key}:{mtime}:{size}:{variant}"
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return f"{current_app.config['DERIVATIVE_CACHE_DIR']}/{digest[:2]}/{digest}.webp"
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as tmp_file:
+        tmp_file.write(data)
+    os.replace(tmp_path, path)
+
+
+def _store(key, data):
+    storage.save(BytesIO(data), key, content_type='image/webp')
+
+
+def get_resized(source_key, width):
+    """Return the storage key of source_key resized to the breakpoint at or above width, rendering it on first use."""
+    width = snap_width(width)
+    key = derivative_key(source_key, f"w{width}")
+    if not storage.exists(key):
+        with storage.source_file(source_key) as source_path:
+            _store(key, process_pool.run(resize_to_webp, source_path, width))
+    return key
+
+
+def get_smog_variant(source_key, percent, width):
+    level = snap_smog_level(percent)
+    width = snap_width(width)
+    key = derivative_key(source_key, f"smog{level:.2f}:w{width}")
+    if not storage.exists(key):
+        with storage.source_file(source_key) as source_path:
+            data = process_pool.run(blend_smog_levels, source_path, [level], width)[0]
+        _store(key, data)
+    return key
+
+
+def prewarm_smog_variants(source_key, width=SMOG_PREWARM_WIDTH):
+    """Render every smog step at one width from a single decode of the source image."""
+    width = snap_width(width)
+    levels = [step / SMOG_STEPS for step in range(SMOG_STEPS + 1)]
+    with storage.source_file(source_key) as source_path:
+        rendered = process_pool.run(blend_smog_levels, source_path, levels, width)
+    keys = []
+    for level, data in zip(levels, rendered):
+        key = derivative_key(source_key, f"smog{level:.2f}:w{width}")
+        _store(key, data)
+        keys.append(key)
+    return keys
+
+
+def send_derivative(key, max_age=604800):
+    """Serve a stored derivative from local disk, or redirect to it in a remote store."""
+    if storage.is_local:
+        return send_file(storage.path(key), mimetype='image/webp', max_age=max_age)
+    response = redirect(storage.url(key))
+    response.headers['Cache-Control'] = f'public, max-age={max_age}'
+    return response
+
+
+def get_qr_code(data):
+    """
+    Render the QR code for data once; the file name is derived from the encoded URL.
+
+    QR codes are cheap to regenerate and the QR sheet needs them as files, so
+    they stay in each node's local cache rather than the upload store.
+    """
+    digest = hashlib.sha1(data.encode('utf-8')).hexdigest()
+    path = os.path.join(derivative_dir(), 'qr', f"{digest}.png")
+    if not os.path.exists(path):
+        _write_atomic(path, process_pool.run(render_qr_png, data))
+    return path
@@ -5,9 +5,16 @@ from wtforms.validators import DataRequired, NumberRange, EqualTo, Optional, Ema
 from wtforms.fields import DateField
 from flask_wtf.file import FileField, FileAllowed
 from app.models import Badge
+from app.storage import storage, badge_image_key
 
 import os
 
+
+def badge_image_filenames():
+    prefix = badge_image_key('').rstrip('/')
+    return sorted(key.rsplit('/', 1)[-1] for key, _, _ in storage.list(prefix))
+
+
 class CSRFProtectForm(FlaskForm):
     # Used only for CSRF protection
     pass
@@ -121,10 +128,7 @@ class QuestForm(FlaskForm):
     def __init__(self, *args, **kwargs):
         super(QuestForm, self).__init__(*args, **kwargs)
         self.badge_id.choices = [(0, 'None')] + [(badge.id, badge.name) for badge in Badge.query.all()]
-        badge_image_directory = os.path.join(current_app.root_path, 'static/images/badge_images')
-        if not os.path.exists(badge_image_directory):
-            os.makedirs(badge_image_directory)  # Create the directory if it does not exist
-        self.default_badge_image.choices = [('','None')] + [(filename, filename) for filename in os.listdir(badge_image_directory)]
+        self.default_badge_image.choices = [('','None')] + [(filename, filename) for filename in badge_image_filenames()]
     def validate_completion_limit(form, field):
         valid_completion_limits = {1, 2, 3, 4, 5, 6, 7, 8, 9, 10}
         if field.data not in valid_completion_limits:
@@ -156,14 +160,40 @@ class QuestImportForm(FlaskForm):
     def __init__(self, *args, **kwargs):
         super(QuestForm, self).__init__(*args, **kwargs)
         self.badge_id.choices = [(0, 'None')] + [(b.id, b.name) for b in Badge.query.order_by('name')]
-        badge_image_directory = os.path.join(current_app.root_path, 'static/images/badge_images')
-        self.default_badge_image.choices = [('','None')] + [(filename, filename) for filename in os.listdir(badge_image_directory)]
+        self.default_badge_image.choices = [('','None')] + [(filename, filename) for filename in badge_image_filenames()]
 
 
 
 class RidingPreferenceForm(FlaskForm):
     preference = BooleanField(label='')  # Placeholder for the label; it will be set dynamically
 
+RIDING_PREFERENCES_CHOICES = [
+    ('new_novice', 'New and novice rider'),
+    ('elementary_school', 'In elementary school or younger'),
+    ('middle_school', 'In Middle school'),
+    ('high_school', 'In High school'),
+    ('college', 'College student'),
+    ('families', 'Families who ride with their children'),
+    ('grandparents', 'Grandparents who ride with their grandchildren'),
+    ('seasoned', 'Seasoned riders who ride all over town for their transportation'),
+    ('adaptive', 'Adaptive bike users'),
+    ('occasional', 'Occasional rider'),
+    ('ebike', 'E-bike rider'),
+    ('long_distance', 'Long distance rider'),
+    ('no_car', 'Don’t own a car'),
+    ('commute', 'Commute by bike'),
+    ('seasonal', 'Seasonal riders: I don’t like riding in inclement weather'),
+    ('environmentally_conscious', 'Environmentally Conscious Riders'),
+    ('social', 'Social Riders'),
+    ('fitness_focused', 'Fitness-Focused Riders'),
+    ('tech_savvy', 'Tech-Savvy Riders'),
+    ('local_history', 'Local History or Culture Enthusiasts'),
+    ('advocacy_minded', 'Advocacy-Minded Riders'),
+    ('bike_collectors', 'Bike Collectors or Bike Equipment Geek'),
+    ('freakbike', 'Freakbike rider/maker')
+]
+
+
 class ProfileForm(FlaskForm):
     display_name = StringField('Player/Team Name', validators=[Optional()])
     profile_picture = FileField('Profile Picture', validators=[Optional(), FileAllowed(['jpg', 'jpeg', 'png'], 'Images only!')])
@@ -175,31 +205,7 @@ class ProfileForm(FlaskForm):
 
     # Add riding preferences as a FieldList
     # Use FieldList and SelectMultipleField for multiple choices
-    riding_preferences = SelectMultipleField('Riding Preferences', choices=[
-        ('new_novice', 'New and novice rider'),
-        ('elementary_school', 'In elementary school or younger'),
-        ('middle_school', 'In Middle school'),
-        ('high_school', 'In High school'),
-        ('college', 'College student'),
-        ('families', 'Families who ride with their children'),
-        ('grandparents', 'Grandparents who ride with their grandchildren'),
-        ('seasoned', 'Seasoned riders who ride all over town for their transportation'),
-        ('adaptive', 'Adaptive bike users'),
-        ('occasional', 'Occasional rider'),
-        ('ebike', 'E-bike rider'),
-        ('long_distance', 'Long distance rider'),
-        ('no_car', 'Don’t own a car'),
-        ('commute', 'Commute by bike'),
-        ('seasonal', 'Seasonal riders: I don’t like riding in inclement weather'),
-        ('environmentally_conscious', 'Environmentally Conscious Riders'),
-        ('social', 'Social Riders'),
-        ('fitness_focused', 'Fitness-Focused Riders'),
-        ('tech_savvy', 'Tech-Savvy Riders'),
-        ('local_history', 'Local History or Culture Enthusiasts'),
-        ('advocacy_minded', 'Advocacy-Minded Riders'),
-        ('bike_collectors', 'Bike Collectors or Bike Equipment Geek'),
-        ('freakbike', 'Freakbike rider/maker')
-    ], validators=[Optional()])
+    riding_preferences = SelectMultipleField('Riding Preferences', choices=RIDING_PREFERENCES_CHOICES, validators=[Optional()])
 
     submit = SubmitField('Update Profile')
 
@@ -0,0 +1,114 @@
+from flask import Response, render_template, stream_template, get_flashed_messages
+from flask_wtf.csrf import generate_csrf
+from markupsafe import Markup
+from sqlalchemy import func
+from app.models import db, Quest, QuestSubmission, UserQuest, user_badges
+from app.game_versions import game_cache
+from app.utils import get_game_badges, enhance_badges_with_task_info
+
+# Flush the streamed page in pieces of about this size rather than per template chunk
+STREAM_BUFFER_BYTES = 4 * 1024
+
+SPONSOR_TIERS = ['Gold', 'Silver', 'Bronze', 'Other']
+
+
+def quest_rows(game_id):
+    """Enabled quests of a game with their submission counts, in one query."""
+    rows = db.session.query(Quest, func.count(QuestSubmission.id)).outerjoin(
+        QuestSubmission, QuestSubmission.quest_id == Quest.id
+    ).filter(
+        Quest.game_id == game_id, Quest.enabled.is_(True)
+    ).group_by(Quest.id).all()
+
+    quests = []
+    for quest, total in rows:
+        quest.total_completions = total
+        quests.append(quest)
+    quests.sort(key=lambda quest: (-quest.is_sponsored, -quest.total_completions))
+    return quests
+
+
+class PageFragments:
+    """
+    The parts of a game page that are the same for every player, rendered
+    once per game version and shared through game_cache. Templates call
+    these while the page streams, so a cache miss is paid for after the
+    top of the page has already gone out.
+    """
+
+    def __init__(self, game):
+        self.game = game
+
+    def _cached(self, name, build):
+        return Markup(game_cache.get_or_build(name, self.game.id, build))
+
+    def quest_table(self):
+        def build():
+            quests = quest_rows(self.game.id)
+            categories = sorted({quest.category for quest in quests if quest.category})
+            return render_template('fragments/quest_table.html', quests=quests, categories=categories)
+        return self._cached('quest_table', build)
+
+    def badge_bar(self):
+        def build():
+            badges = enhance_badges_with_task_info(get_game_badges(self.game.id), self.game.id)
+            return render_template('fragments/badge_bar.html', badges=badges) if badges else ''
+        return self._cached('badge_bar', build)
+
+    def sponsors(self):
+        def build():
+            return render_template('fragments/sponsors.html', game=self.game, tiers=SPONSOR_TIERS)
+        return self._cached('sponsors', build)
+
+
+def player_page_data(user_id, game_id):
+    """
+    What the shared fragments leave out for one player: their posts per
+    quest, their badges and their completions of each badge's quest. The
+    page embeds this as JSON and fills it into the fragments.
+    """
+    posts = db.session.query(QuestSubmission.quest_id, func.count(QuestSubmission.id)).join(
+        Quest, Quest.id == QuestSubmission.quest_id
+    ).filter(
+        QuestSubmission.user_id == user_id, Quest.game_id == game_id
+    ).group_by(QuestSubmission.quest_id).all()
+
+    completions = db.session.query(UserQuest.quest_id, UserQuest.completions).join(
+        Quest, Quest.id == UserQuest.quest_id
+    ).filter(UserQuest.user_id == user_id, Quest.game_id == game_id).all()
+
+    earned = db.session.query(user_badges.c.badge_id).filter(user_badges.c.user_id == user_id).all()
+
+    return {
+        'quest_posts': {str(quest_id): count for quest_id, count in posts},
+        'quest_completions': {str(quest_id): count for quest_id, count in completions},
+        'earned_badge_ids': sorted(badge_id for badge_id, in earned),
+    }
+
+
+def _buffered(chunks, size=STREAM_BUFFER_BYTES):
+    buffer, buffered = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield ''.join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_page(template_name, **context):
+    """
+    Render template_name as a streamed response.
+
+    The session cookie is written with the headers, before the body, so
+    anything the template would change in the session (consuming flashed
+    messages, creating the CSRF token) is done up front.
+    """
+    get_flashed_messages(with_categories=True)
+    generate_csrf()
+    response = Response(_buffered(stream_template(template_name, **context)), mimetype='text/html')
+    # Otherwise nginx collects the whole body before passing it on
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
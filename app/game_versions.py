@@ -0,0 +1,159 @@
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models import db, Game, Quest, Badge, Sponsor, QuestSubmission, UserQuest, GameVersion
+from app.compression import SUFFIXES
+
+from collections import OrderedDict
+
+import threading
+
+
+def _game_ids_query(game_ids=(), quest_ids=(), badge_ids=()):
+    """A query for the distinct ids of the games touched through any of the given rows."""
+    queries = []
+    if game_ids:
+        queries.append(db.select(Game.id.label('game_id')).where(Game.id.in_(game_ids)))
+    if quest_ids:
+        queries.append(db.select(Quest.game_id.label('game_id')).where(Quest.id.in_(quest_ids), Quest.game_id.isnot(None)))
+    if badge_ids:
+        queries.append(db.select(Quest.game_id.label('game_id')).where(Quest.badge_id.in_(badge_ids), Quest.game_id.isnot(None)))
+    if not queries:
+        return None
+    return db.union(*queries).subquery() if len(queries) > 1 else queries[0].subquery()
+
+
+def bump_statement(game_ids=(), quest_ids=(), badge_ids=()):
+    touched = _game_ids_query(game_ids, quest_ids, badge_ids)
+    if touched is None:
+        return None
+    statement = insert(GameVersion).from_select(
+        ['game_id', 'version', 'updated_at'],
+        # ON CONFLICT DO UPDATE may touch each row only once
+        db.select(touched.c.game_id, db.literal(1), db.func.now()).distinct(),
+    )
+    return statement.on_conflict_do_update(
+        index_elements=['game_id'],
+        set_={'version': GameVersion.version + 1, 'updated_at': db.func.now()},
+    )
+
+
+def bump_game_versions(game_ids=(), quest_ids=(), badge_ids=()):
+    """
+    Bump the version of games changed by a bulk statement the ORM does not
+    see (Query.delete(), Core updates). Runs in the caller's transaction.
+    """
+    statement = bump_statement(set(game_ids), set(quest_ids), set(badge_ids))
+    if statement is not None:
+        db.session.execute(statement)
+        _forget_versions()
+
+
+def game_version(game_id):
+    """The current version of game_id, read once per request."""
+    versions = g.setdefault('_game_versions', {}) if has_app_context() else {}
+    if game_id not in versions:
+        versions[game_id] = db.session.execute(
+            db.select(GameVersion.version).where(GameVersion.game_id == game_id)
+        ).scalar() or 0
+    return versions[game_id]
+
+
+def _forget_versions():
+    if has_app_context():
+        g.pop('_game_versions', None)
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_after_flush(session, flush_context):
+    game_ids, quest_ids, badge_ids = set(), set(), set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+            continue
+        if isinstance(obj, Game):
+            game_ids.add(obj.id)
+        elif isinstance(obj, (Quest, Sponsor)):
+            if obj.game_id is not None:
+                game_ids.add(obj.game_id)
+        elif isinstance(obj, (QuestSubmission, UserQuest)):
+            quest_ids.add(obj.quest_id)
+        elif isinstance(obj, Badge):
+            badge_ids.add(obj.id)
+
+    statement = bump_statement(game_ids, quest_ids, badge_ids)
+    if statement is not None:
+        # The connection, not the session, so the flush is not re-entered
+        session.connection().execute(statement)
+        _forget_versions()
+
+
+class VersionedCache:
+    """
+    A small in-process LRU for content derived from a game, such as rendered
+    page fragments. Keys include the game's version, so a write to the game
+    makes old entries unreachable and they age out of the LRU; nothing has
+    to be invalidated explicitly, and every worker process agrees on what
+    is current because the version lives in the database.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_entries = int(app.config['main'].get('GAME_CACHE_ENTRIES', self.max_entries))
+        app.extensions['game_cache'] = self
+
+    def get_or_build(self, name, game_id, build, *extra):
+        key = (name, game_id, game_version(game_id)) + extra
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        value = build()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+game_cache = VersionedCache()
+
+
+def version_etag(name, game_id, *extra):
+    """A strong ETag for content derived from game_id, valid until the game's next write."""
+    return '-'.join(str(part) for part in (name, game_id, game_version(game_id)) + extra)
+
+
+def etag_matches(etag):
+    # Compressed responses carry the encoding appended to the ETag
+    candidates = [etag] + [f"{etag}-{encoding}" for encoding in SUFFIXES]
+    return any(request.if_none_match.contains(candidate) for candidate in candidates)
+
+
+def cached_json(name, game_id, build, *extra):
+    """The serialized JSON of build(), built once per game version."""
+    return game_cache.get_or_build(name, game_id, lambda: current_app.json.dumps(build()), *extra)
+
+
+def conditional_response(etag, body, mimetype='application/json', private=False):
+    """
+    Answer a GET with 304 when the browser already has etag, and otherwise
+    with body(). Responses must be revalidated on every use, so polling
+    clients get a 304 until the game changes.
+    """
+    if etag_matches(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(body(), mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache' if private else 'no-cache'
+    return response
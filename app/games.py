@@ -1,14 +1,18 @@
-from flask import Blueprint, jsonify, render_template, request, redirect, url_for, flash, current_app, make_response
+from flask import Blueprint, jsonify, render_template, request, redirect, url_for, flash, current_app, make_response, send_file
 from flask_login import login_required, current_user
 from app.models import db, Game, Quest, UserQuest, user_games
 from app.forms import GameForm
-from app.utils import save_leaderboard_image, generate_smoggy_images, allowed_file
-from io import BytesIO
+from app.utils import save_leaderboard_image, generate_smoggy_images, allowed_file, clear_tutorial_game_cache
+from app.deletions import start_deletion_job
+from app.workers import PoolBusyError
+from app.derivatives import get_smog_variant, get_qr_code, send_derivative, SMOG_PREWARM_WIDTH
+from app.storage import storage, storage_key
+from app.assets import stored_static_url
+from app.game_versions import game_cache, version_etag, cached_json, conditional_response
 
 import bleach
+import math
 import os
-import qrcode
-import base64
 
 games_bp = Blueprint('games', __name__)
 
@@ -94,8 +98,7 @@ def create_game():
         try:
             db.session.commit()
             if game.leaderboard_image:
-                image_path = os.path.join(current_app.root_path, 'static', game.leaderboard_image)
-                generate_smoggy_images(image_path, game.id)
+                generate_smoggy_images(game.leaderboard_image, game.id)
             flash('Game created successfully!', 'success')
             return redirect(url_for('admin.admin_dashboard'))
         except Exception as e:
@@ -139,8 +142,7 @@ def update_game(game_id):
                     filename = save_leaderboard_image(image_file)
                     game.leaderboard_image = filename
 
-                    image_path = os.path.join(current_app.root_path, 'static', game.leaderboard_image)
-                    generate_smoggy_images(image_path, game.id)
+                    generate_smoggy_images(game.leaderboard_image, game.id)
                 except ValueError as e:
                     flash(f'Error saving leaderboard image: {e}', 'error')
                     return render_template('update_game.html', form=form, game_id=game_id, leaderboard_image=game.leaderboard_image)
@@ -182,10 +184,10 @@ def delete_game(game_id):
 
     game = Game.query.get_or_404(game_id)
     try:
-        # Assuming quests are properly cascaded in model definitions
-        db.session.delete(game)
-        db.session.commit()
-        flash('Game deleted successfully!', 'success')
+        if game.is_tutorial:
+            clear_tutorial_game_cache()
+        start_deletion_job('game', game.id, target_name=game.title, requested_by=current_user.id)
+        flash('Game deletion started. Its quests and submissions are being removed in the background.', 'success')
     except Exception as e:
         db.session.rollback()
         flash(f'An error occurred while deleting the game: {e}', 'error')
@@ -205,7 +207,13 @@ def game_info(game_id):
 
     # If the request is for a modal version, render the modal template
     if request.args.get('modal'):
-        return render_template('modals/game_info_modal.html', game=game_details, game_id=game_id)
+        return conditional_response(
+            version_etag('game-info', game_id),
+            lambda: game_cache.get_or_build(
+                'game_info', game_id,
+                lambda: render_template('modals/game_info_modal.html', game=game_details, game_id=game_id)),
+            mimetype='text/html',
+        )
 
     # Otherwise, render the full game info page
     return render_template('game_info.html', game=game_details, game_id=game_id)
@@ -213,6 +221,33 @@ def game_info(game_id):
 
 
 
+@games_bp.route('/smog/<int:game_id>')
+def smog_image(game_id):
+    game = Game.query.get_or_404(game_id)
+    if not game.leaderboard_image:
+        return jsonify({'error': 'Game has no leaderboard image'}), 404
+
+    percent = request.args.get('level', 0, type=float)
+    # float() accepts nan and inf, which cannot be snapped to a smog level
+    if not math.isfinite(percent):
+        return jsonify({'error': 'Invalid level'}), 400
+    width = request.args.get('width', SMOG_PREWARM_WIDTH, type=int)
+    if width <= 0:
+        return jsonify({'error': 'Invalid width'}), 400
+
+    image_key = storage_key(game.leaderboard_image)
+    if storage.source_stat(image_key) is None:
+        return jsonify({'error': 'File not found'}), 404
+
+    try:
+        derivative = get_smog_variant(image_key, percent, width)
+    except PoolBusyError:
+        response = jsonify({'error': 'Server busy, please retry'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    return send_derivative(derivative)
+
+
 @games_bp.route('/get_game_points/<int:game_id>', methods=['GET'])
 @login_required
 def get_game_points(game_id):
@@ -279,19 +314,7 @@ def join_custom_game():
 @login_required
 def generate_qr_for_game(game_id):
     game = Game.query.get_or_404(game_id)
-    login_url = url_for('auth.login', game_id=game_id, _external=True)  # Generate the login URL with the game_id
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(login_url)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="white", back_color="black")
-    img_buffer = BytesIO()
-    img.save(img_buffer, format="PNG")
-    img_data = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
+    qr_url = url_for('games.game_qr_image', game_id=game_id)
 
     html_content = f"""
     <!DOCTYPE html>
@@ -311,11 +334,11 @@ def generate_qr_for_game(game_id):
     </head>
     <body>
         <div class="qrcodeHeader">
-            <img src="{url_for('static', filename='images/welcomeQuestByCycle.webp')}" alt="Welcome">
+            <img src="{stored_static_url('images/welcomeQuestByCycle.webp')}" alt="Welcome">
         </div>
         <h1>Join the Game!</h1>
         <h2>Scan to login or register and automatically join '{game.title}'!</h2>
-        <img src="data:image/png;base64,{img_data}" alt="QR Code">
+        <img src="{qr_url}" alt="QR Code">
     </body>
     </html>
     """
@@ -325,10 +348,27 @@ def generate_qr_for_game(game_id):
     return response
 
 
+@games_bp.route('/qr/<int:game_id>.png')
+@login_required
+def game_qr_image(game_id):
+    Game.query.get_or_404(game_id)
+    login_url = url_for('auth.login', game_id=game_id, _external=True)  # Generate the login URL with the game_id
+    try:
+        qr_path = get_qr_code(login_url)
+    except PoolBusyError:
+        response = jsonify({'error': 'Server busy, please retry'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    return send_file(qr_path, mimetype='image/png', max_age=86400)
+
+
 @games_bp.route('/get_game/<int:game_id>', methods=['GET'])
 @login_required
 def get_game(game_id):
     # Retrieve the game from the database or return a 404 error if not found
     game = Game.query.get_or_404(game_id)
     # Return a JSON object with the game name (you can include more details if needed)
-    return jsonify(name=game.title)
\ No newline at end of file
+    return conditional_response(
+        version_etag('game', game_id),
+        lambda: cached_json('game', game_id, lambda: {'name': game.title}),
+    )
\ No newline at end of file
@@ -0,0 +1,111 @@
+from sqlalchemy import column, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
+from app.models import db, User, UserIP
+
+import atexit
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class IPLogBuffer:
+    """
+    Collects (user, IP) sightings in memory and writes them in batches.
+
+    Logins only touch the in-memory buffer. A background task flushes it
+    every FLUSH_SECONDS (or as soon as MAX_BUFFER entries are waiting) with
+    a single INSERT ... ON CONFLICT DO UPDATE that bumps last_seen, so
+    repeated and concurrent logins never create duplicate rows.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.flush_seconds = 30
+        self.max_buffer = 500
+        self._pending = {}
+        self._worker_pid = None
+        self._wakeup = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        settings = app.config.get('main', {})
+        self.flush_seconds = int(settings.get('IP_LOG_FLUSH_SECONDS', self.flush_seconds))
+        self.max_buffer = int(settings.get('IP_LOG_MAX_BUFFER', self.max_buffer))
+        self.app = app
+        app.extensions['ip_log'] = self
+        atexit.register(self._flush_on_exit)
+
+    def record(self, user_id, ip_address):
+        if not ip_address:
+            return
+        self._pending[(user_id, ip_address)] = datetime.now()
+        self.ensure_worker()
+        if len(self._pending) >= self.max_buffer:
+            self._wakeup.set()
+
+    def ensure_worker(self):
+        from app import socketio
+
+        if self._worker_pid != os.getpid():
+            self._worker_pid = os.getpid()
+            self._pending = {}
+            self._wakeup = socketio.server.eio.create_event()
+            socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            with self.app.app_context():
+                self.flush()
+
+    def _flush_on_exit(self):
+        with self.app.app_context():
+            self.flush()
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of rows upserted."""
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+
+        sightings = values(
+            column('user_id', db.Integer), column('ip_address', db.String), column('seen', db.DateTime),
+            name='sightings'
+        ).data([(user_id, ip_address, seen) for (user_id, ip_address), seen in batch.items()])
+        # Users deleted since they were buffered are skipped rather than failing the batch
+        statement = insert(UserIP).from_select(
+            ['user_id', 'ip_address', 'timestamp', 'last_seen'],
+            db.select(sightings.c.user_id, sightings.c.ip_address, sightings.c.seen, sightings.c.seen).join(
+                User, User.id == sightings.c.user_id
+            )
+        )
+        statement = statement.on_conflict_do_update(
+            constraint='_user_ip_uc',
+            set_={'last_seen': statement.excluded.last_seen}
+        )
+        try:
+            result = db.session.execute(statement)
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            # Retrying would fail the same way, so the batch is dropped
+            logger.error(f"Dropped {len(batch)} IP log entries: {e}")
+            return 0
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to write {len(batch)} IP log entries: {e}")
+            # Keep the entries for the next flush unless newer sightings replaced them
+            for key, seen in batch.items():
+                self._pending.setdefault(key, seen)
+            return 0
+        finally:
+            db.session.remove()
+        return result.rowcount
+
+
+ip_log = IPLogBuffer()
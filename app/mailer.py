@@ -0,0 +1,248 @@
+from email.mime.text import MIMEText
+from datetime import datetime, timedelta
+from pytz import utc
+from sqlalchemy import event
+from app.models import db, OutboxEmail
+
+import logging
+import smtplib
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class Mailer:
+    """
+    Delivers queued OutboxEmail rows in the background.
+
+    Requests only insert a row; a single worker per process claims due rows
+    in batches and sends them over one SMTP connection that stays open while
+    there is mail to send. Claimed rows are marked 'sending' with a lease of
+    OUTBOX_LEASE_SECONDS and committed before anything is sent, so no row
+    lock or transaction is held across SMTP; rows of a worker that died
+    mid-batch are claimed again once their lease runs out. Gmail OAuth
+    credentials are kept in memory until they expire. Failed sends are
+    retried with exponential backoff until MAX_ATTEMPTS is reached.
+    OUTBOX_SEND_RATE caps messages per second so large announcements stay
+    under the provider's sending limits.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.server = 'smtp.gmail.com'
+        self.port = 587
+        self.use_tls = True
+        self.use_ssl = False
+        self.username = ''
+        self.password = ''
+        self.sender = ''
+        self.batch_size = 50
+        self.max_attempts = 5
+        self.retry_base = 30
+        self.poll_interval = 10
+        self.send_rate = 0
+        self.lease_seconds = 600
+        self._smtp = None
+        self._creds = None
+        self._worker_pid = None
+        self._wakeup = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        settings = app.config.get('mail', {})
+        self.server = settings.get('MAIL_SERVER', self.server)
+        self.port = int(settings.get('MAIL_PORT', self.port))
+        self.use_tls = settings.get('MAIL_USE_TLS', self.use_tls)
+        self.use_ssl = settings.get('MAIL_USE_SSL', self.use_ssl)
+        self.username = settings.get('MAIL_USERNAME', self.username)
+        self.password = settings.get('MAIL_PASSWORD', self.password)
+        self.sender = settings.get('MAIL_DEFAULT_SENDER', self.sender)
+        self.batch_size = int(settings.get('OUTBOX_BATCH_SIZE', self.batch_size))
+        self.max_attempts = int(settings.get('OUTBOX_MAX_ATTEMPTS', self.max_attempts))
+        self.retry_base = int(settings.get('OUTBOX_RETRY_SECONDS', self.retry_base))
+        self.poll_interval = int(settings.get('OUTBOX_POLL_SECONDS', self.poll_interval))
+        self.send_rate = float(settings.get('OUTBOX_SEND_RATE', self.send_rate))
+        self.lease_seconds = int(settings.get('OUTBOX_LEASE_SECONDS', self.lease_seconds))
+        self.app = app
+        app.extensions['mailer'] = self
+
+    def enqueue(self, to, subject, html_content, commit=True, announcement_id=None):
+        email = OutboxEmail(recipient=to, subject=subject, html=html_content, announcement_id=announcement_id)
+        db.session.add(email)
+        if commit:
+            db.session.commit()
+            self.wake()
+        else:
+            event.listen(db.session(), 'after_commit', lambda session: self.wake(), once=True)
+        return email
+
+    def wake(self):
+        self.ensure_worker()
+        self._wakeup.set()
+
+    def ensure_worker(self):
+        from app import socketio
+
+        # One delivery loop per process; a forked worker starts its own.
+        if self._worker_pid != os.getpid():
+            self._worker_pid = os.getpid()
+            # An event from the async backend, so waiting never blocks the gevent hub
+            self._wakeup = socketio.server.eio.create_event()
+            socketio.start_background_task(self._run)
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                try:
+                    delivered = self.deliver_batch()
+                except Exception as e:
+                    logger.error(f"Outbox delivery failed: {e}")
+                    db.session.rollback()
+                    delivered = 0
+                finally:
+                    db.session.remove()
+
+                if delivered < self.batch_size:
+                    self._disconnect()
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+
+    def claim_batch(self):
+        """Mark up to batch_size due emails as 'sending' under a lease and commit; returns them."""
+        now = datetime.now(utc)
+        # Every claim counts as an attempt, so a message that takes the worker down with it
+        # is not re-sent forever; once its lease runs out with no attempts left it is failed.
+        db.session.execute(
+            db.update(OutboxEmail).where(
+                OutboxEmail.status == 'sending',
+                OutboxEmail.next_attempt_at <= now,
+                OutboxEmail.attempts >= self.max_attempts
+            ).values(status='failed', last_error='Delivery was interrupted too many times')
+        )
+
+        # Transactional mail (verification, password reset) goes ahead of announcements.
+        # SKIP LOCKED lets several processes claim from the outbox without sending twice.
+        due = db.select(OutboxEmail.id).where(
+            OutboxEmail.status.in_(['pending', 'sending']),
+            OutboxEmail.next_attempt_at <= now
+        ).order_by(
+            OutboxEmail.announcement_id.isnot(None), OutboxEmail.id
+        ).limit(self.batch_size).with_for_update(skip_locked=True).scalar_subquery()
+
+        claimed_ids = db.session.scalars(
+            db.update(OutboxEmail).where(OutboxEmail.id.in_(due)).values(
+                status='sending', attempts=OutboxEmail.attempts + 1,
+                next_attempt_at=now + timedelta(seconds=self.lease_seconds)
+            ).returning(OutboxEmail.id)
+        ).all()
+        db.session.commit()
+        if not claimed_ids:
+            return []
+        return OutboxEmail.query.filter(OutboxEmail.id.in_(claimed_ids)).order_by(
+            OutboxEmail.announcement_id.isnot(None), OutboxEmail.id
+        ).all()
+
+    def deliver_batch(self):
+        """Send up to batch_size due emails; returns how many rows were processed."""
+        from app import socketio
+
+        emails = self.claim_batch()
+        for index, email in enumerate(emails):
+            if self.send_rate and index:
+                socketio.sleep(1.0 / self.send_rate)
+            try:
+                self._send(email)
+                email.status = 'sent'
+                email.sent_at = datetime.now(utc)
+                email.last_error = None
+            except smtplib.SMTPRecipientsRefused as e:
+                email.status = 'failed'
+                email.last_error = str(e)
+            except Exception as e:
+                self._disconnect()
+                email.last_error = str(e)
+                if email.attempts >= self.max_attempts:
+                    email.status = 'failed'
+                    logger.error(f"Giving up on email {email.id} to {email.recipient}: {e}")
+                else:
+                    delay = self.retry_base * (2 ** (email.attempts - 1))
+                    email.status = 'pending'
+                    email.next_attempt_at = datetime.now(utc) + timedelta(seconds=delay)
+                    logger.warning(f"Email {email.id} failed, retrying in {delay}s: {e}")
+            # Each result is saved as soon as it is known
+            db.session.commit()
+
+        return len(emails)
+
+    def _send(self, email):
+        msg = MIMEText(email.html, 'html')
+        msg['Subject'] = email.subject
+        msg['From'] = self.sender
+        msg['To'] = email.recipient
+
+        try:
+            self._connection().sendmail(self.sender, [email.recipient], msg.as_string())
+        except smtplib.SMTPServerDisconnected:
+            # The server dropped an idle connection; reconnect once and try again
+            self._disconnect()
+            self._connection().sendmail(self.sender, [email.recipient], msg.as_string())
+
+    def _connection(self):
+        if self._smtp is not None:
+            return self._smtp
+
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.server, self.port, timeout=30)
+        else:
+            smtp = smtplib.SMTP(self.server, self.port, timeout=30)
+        smtp.ehlo()
+        if self.use_tls and not self.use_ssl:
+            smtp.starttls()
+            smtp.ehlo()
+
+        try:
+            self._authenticate(smtp)
+        except Exception:
+            smtp.close()
+            raise
+        self._smtp = smtp
+        return smtp
+
+    def _authenticate(self, smtp):
+        from app.utils import generate_oauth2_string
+
+        access_token = self._access_token()
+        if access_token:
+            code, response = smtp.docmd('AUTH', 'XOAUTH2 ' + generate_oauth2_string(self.username, access_token))
+            if code != 235:
+                self._creds = None
+                raise smtplib.SMTPAuthenticationError(code, response)
+        elif self.username and self.password:
+            smtp.login(self.username, self.password)
+
+    def _access_token(self):
+        from app.utils import load_credentials, refresh_credentials
+
+        if self._creds is None:
+            self._creds = load_credentials()
+            if self._creds is None:
+                return None
+        if self._creds.expired:
+            self._creds = refresh_credentials(self._creds)
+        return self._creds.token if self._creds and self._creds.valid else None
+
+    def _disconnect(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+        self._smtp = None
+
+    def outbox_counts(self):
+        rows = db.session.query(OutboxEmail.status, db.func.count(OutboxEmail.id)).group_by(OutboxEmail.status).all()
+        return {status: count for status, count in rows}
+
+
+mailer = Mailer()
@@ -1,24 +1,30 @@
 from flask import Blueprint, jsonify, send_file, render_template, request, redirect, url_for, flash, current_app, Response
 from flask_login import current_user, login_required
 from app.utils import save_profile_picture, save_bicycle_picture
-from app.models import db, Game, User, Quest, Badge, UserQuest, QuestSubmission, QuestLike, ShoutBoardMessage, ShoutBoardLike, ProfileWallMessage, user_games
+from app.models import db, Game, User, Quest, Badge, UserQuest, QuestSubmission, QuestLike, ShoutBoardMessage, ShoutBoardLike, ProfileWallMessage, UploadSession, user_games, user_badges
+from app.workers import PoolBusyError
+from app.derivatives import get_resized, send_derivative
+from app.storage import storage, storage_key, is_stored_key
+from app.assets import assets
+from app.carousel import carousel
+from app.fragments import PageFragments, player_page_data, stream_page
+from app.chunked_uploads import create_upload_session, issue_direct_upload, write_chunk, UploadOffsetError, ChecksumMismatchError
 from app.forms import ProfileForm, ShoutBoardForm, ContactForm, BikeForm, LoginForm, RegistrationForm
-from app.utils import send_email, allowed_file, generate_tutorial_game, enhance_badges_with_task_info, get_game_badges
+from app.utils import send_email, allowed_file, get_tutorial_game_id
 from .config import load_config
 from werkzeug.utils import secure_filename
 from sqlalchemy import func
-from sqlalchemy.orm import aliased
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import aliased, contains_eager
 from datetime import datetime, timedelta, timezone
 from pytz import utc
 from flask_wtf.csrf import generate_csrf
-from PIL import Image, ExifTags
 from io import BytesIO
 from functools import lru_cache
 
 import bleach
 import os
 import logging
-import io
 main_bp = Blueprint('main', __name__)
 
 ALLOWED_TAGS = [
@@ -87,6 +93,28 @@ def get_datetime(activity):
         raise ValueError("Activity object does not contain valid timestamp information.")
 
 
+def mark_liked(activities):
+    """
+    Set liked_by_user on the shout board messages and completed quests in
+    activities, reading the current user's likes of just those items.
+    """
+    message_ids = {activity.id for activity in activities if isinstance(activity, ShoutBoardMessage)}
+    quests = [activity.quest for activity in activities if isinstance(activity, UserQuest)]
+    liked_message_ids = liked_quest_ids = set()
+    if current_user.is_authenticated and message_ids:
+        liked_message_ids = {message_id for message_id, in db.session.query(ShoutBoardLike.message_id).filter(
+            ShoutBoardLike.user_id == current_user.id, ShoutBoardLike.message_id.in_(message_ids))}
+    if current_user.is_authenticated and quests:
+        liked_quest_ids = {quest_id for quest_id, in db.session.query(QuestLike.quest_id).filter(
+            QuestLike.user_id == current_user.id, QuestLike.quest_id.in_({quest.id for quest in quests}))}
+
+    for activity in activities:
+        if isinstance(activity, ShoutBoardMessage):
+            activity.liked_by_user = activity.id in liked_message_ids
+    for quest in quests:
+        quest.liked_by_user = quest.id in liked_quest_ids
+
+
 @main_bp.route('/', defaults={'game_id': None, 'quest_id': None, 'user_id': None})
 @main_bp.route('/<int:game_id>', defaults={'quest_id': None, 'user_id': None})
 @main_bp.route('/<int:game_id>/<int:quest_id>', defaults={'user_id': None})
@@ -94,13 +122,10 @@ def get_datetime(activity):
 def index(game_id, quest_id, user_id):
     user_games_list = []
     profile = None
-    user_quests = []
     total_points = None
     start_onboarding = False
     login_form = LoginForm()
     register_form = RegistrationForm()
-    all_badges = []
-    earned_badges = []
 
     # Check if the user is authenticated and set the user_id
     if user_id is None and current_user.is_authenticated:
@@ -115,12 +140,10 @@ def index(game_id, quest_id, user_id):
             if joined_games:
                 game_id = joined_games[0].id
 
-    # If game_id is still None, default to the latest tutorial game
+    # If game_id is still None, default to the current tutorial game
     if game_id is None:
-        default_tutorial_game = Game.query.filter_by(is_tutorial=True).order_by(Game.start_date.desc()).first()
-        if default_tutorial_game:
-            game_id = default_tutorial_game.id
-        else:
+        game_id = get_tutorial_game_id()
+        if game_id is None:
             flash("No tutorial game available", "error")
             return redirect(url_for('some_error_route'))
 
@@ -138,157 +161,66 @@ def index(game_id, quest_id, user_id):
 
     # If the user is authenticated, load user-specific quests and data
     if current_user.is_authenticated:
-        user_quests = UserQuest.query.filter_by(user_id=current_user.id).all()
-        total_points = sum(ut.points_awarded for ut in user_quests if ut.quest.game_id == game_id)
+        total_points = db.session.query(func.coalesce(func.sum(UserQuest.points_awarded), 0)).join(
+            Quest, Quest.id == UserQuest.quest_id
+        ).filter(UserQuest.user_id == current_user.id, Quest.game_id == game_id).scalar()
 
-    quests = Quest.query.filter_by(game_id=game.id, enabled=True).all() if game else []
     # Prevent error by only accessing participated_games if the user is authenticated
     has_joined = game in (current_user.participated_games if current_user.is_authenticated else []) if game else False
     game_participation = {game.id: has_joined} if game else {}
 
-    # Load forms and messages for the Shout Board
+    # Load forms for the Shout Board; its messages are read while the page streams
     form = ShoutBoardForm()
-    pinned_messages = ShoutBoardMessage.query.filter_by(is_pinned=True, game_id=game_id).order_by(ShoutBoardMessage.timestamp.desc()).all()
-    unpinned_messages = ShoutBoardMessage.query.filter_by(is_pinned=False, game_id=game_id).order_by(ShoutBoardMessage.timestamp.desc()).all()
-    completed_quests = UserQuest.query.filter(UserQuest.completions > 0).order_by(UserQuest.completed_at.desc()).all()
 
-    if game:
-        pinned_activities = pinned_messages
-        unpinned_activities = unpinned_messages + [ut for ut in completed_quests if ut.quest.game_id == game_id]
-    else:
-        pinned_activities = []
-        unpinned_activities = []
-
-    unpinned_activities.sort(key=lambda x: get_datetime(x), reverse=True)
-    activities = pinned_activities + unpinned_activities
+    def load_activities():
+        if not game:
+            return []
+        pinned_activities = ShoutBoardMessage.query.filter_by(is_pinned=True, game_id=game_id).order_by(ShoutBoardMessage.timestamp.desc()).all()
+        unpinned_messages = ShoutBoardMessage.query.filter_by(is_pinned=False, game_id=game_id).order_by(ShoutBoardMessage.timestamp.desc()).all()
+        completed_quests = UserQuest.query.join(Quest, Quest.id == UserQuest.quest_id).filter(
+            Quest.game_id == game_id, UserQuest.completions > 0
+        ).options(contains_eager(UserQuest.quest)).order_by(UserQuest.completed_at.desc()).all()
+
+        unpinned_activities = unpinned_messages + completed_quests
+        unpinned_activities.sort(key=lambda x: get_datetime(x), reverse=True)
+        activities = pinned_activities + unpinned_activities
+        mark_liked(activities)
+        return activities
 
     selected_quest = Quest.query.get(quest_id) if quest_id else None
 
     if current_user.is_authenticated:
-        liked_message_ids = {like.message_id for like in ShoutBoardLike.query.filter_by(user_id=current_user.id)}
-        liked_quest_ids = {like.quest_id for like in QuestLike.query.filter_by(user_id=current_user.id)}
-        
         # Fetch games along with joined_at timestamps
         user_games_list = db.session.query(Game, user_games.c.joined_at).join(user_games, user_games.c.game_id == Game.id).filter(user_games.c.user_id == current_user.id).all()
         
         profile = User.query.get_or_404(user_id)
-        user_quests = UserQuest.query.filter_by(user_id=profile.id).all()
-        
-        if game_id:
-            all_badges = get_game_badges(game_id)  # Fetch game-specific badges using new function
-        else:
-            all_badges = Badge.query.all()  # Fallback to all badges if no game_id
-        earned_badges_set = set(profile.badges)  # keep as set for efficient check
-
-        # Enhance all_badges with task info - now game-aware
-        enhanced_all_badges = enhance_badges_with_task_info(all_badges, game_id)  # Use helper function
-        all_badges = enhanced_all_badges
-
-        # Enhance earned_badges with task info - now game-aware
-        enhanced_earned_badges = enhance_badges_with_task_info(list(earned_badges_set), game_id)  # Use helper function, convert set to list
-        earned_badges = enhanced_earned_badges
-
-        print(f"Index function: all_badges count: {len(all_badges)}, earned_badges count: {len(earned_badges)}")  # Log counts
         
         if not profile.display_name:
             profile.display_name = profile.username
 
-    now = datetime.now(utc)
-    period_start_map = {
-        'daily': timedelta(days=1),
-        'weekly': timedelta(weeks=1),
-        'monthly': timedelta(days=30)
-    }
-
-    for quest in quests:
-        quest.total_completions = db.session.query(QuestSubmission).filter(QuestSubmission.quest_id == quest.id).count()
-        quest.personal_completions = db.session.query(QuestSubmission).filter(QuestSubmission.quest_id == quest.id, QuestSubmission.user_id == user_id).count() if user_id else 0
-        quest.completions_within_period = 0
-        quest.can_verify = False
-        quest.last_completion = None
-        quest.first_completion_in_period = None
-        quest.next_eligible_time = None
-        quest.completion_timestamps = []
-
-        if user_id:
-            period_start = now - period_start_map.get(quest.frequency, timedelta(days=1))
-            submissions = QuestSubmission.query.filter(
-                QuestSubmission.user_id == user_id,
-                QuestSubmission.quest_id == quest.id,
-                QuestSubmission.timestamp >= period_start
-            ).all()
-
-            if submissions:
-                quest.completions_within_period = len(submissions)
-                quest.first_completion_in_period = min(submissions, key=lambda x: x.timestamp).timestamp
-                quest.completion_timestamps = [sub.timestamp for sub in submissions]
-
-            relevant_user_quests = [ut for ut in user_quests if ut.quest_id == quest.id]
-            quest.last_completion = max((ut.completed_at for ut in relevant_user_quests), default=None)
-
-            if quest.personal_completions < quest.completion_limit:
-                quest.can_verify = True
-            else:
-                last_completion = max(submissions, key=lambda x: x.timestamp, default=None)
-                if last_completion:
-                    increment_map = {
-                        'daily': timedelta(days=1),
-                        'weekly': timedelta(weeks=1),
-                        'monthly': timedelta(days=30)
-                    }
-                    quest.next_eligible_time = last_completion.timestamp + increment_map.get(quest.frequency, timedelta(days=1))
-
-    quests.sort(key=lambda x: (-x.is_sponsored, -x.personal_completions, -x.total_completions))
-
     custom_games = Game.query.filter(Game.custom_game_code.isnot(None), Game.is_public.is_(True)).all()
 
-    carousel_images = []
-    if current_user.is_authenticated and game_id:
-        quest_submissions = QuestSubmission.query.join(Quest).filter(Quest.game_id == game_id).all()
-        for submission in quest_submissions:
-            if submission.image_url:
-                # Ensure the image_url is relative to 'static/'
-                image_url = submission.image_url.lstrip('/').replace('static/', '')
-                
-                # Ensure the path includes 'images/' if missing
-                if not image_url.startswith('images/'):
-                    image_url = f'images/{image_url}'
-                
-                carousel_images.append({
-                    'small': image_url,
-                    'medium': image_url,
-                    'large': image_url,
-                    'quest_title': submission.quest.title,
-                    'comment': submission.comment
-                })
-
-    categories = sorted({quest.category for quest in quests if quest.category})
-
-    return render_template('index.html',
-                           form=form,
-                           badges=earned_badges,
-                           all_badges=all_badges,
-                           games=user_games_list,
-                           game=game,
-                           user_games=user_games_list,
-                           activities=activities,
-                           quests=quests,
-                           categories=categories,
-                           game_participation=game_participation,
-                           selected_quest=selected_quest,
-                           has_joined=has_joined,
-                           profile=profile,
-                           user_quests=user_quests,
-                           carousel_images=carousel_images,
-                           total_points=total_points,
-                           completions=completed_quests,
-                           custom_games=custom_games,
-                           selected_game_id=game_id or 0,
-                           selected_game=game,
-                           quest_id=quest_id,
-                           start_onboarding=start_onboarding,
-                           login_form=login_form,
-                           register_form=register_form)
+    return stream_page('index.html',
+                       form=form,
+                       fragments=PageFragments(game),
+                       player_data=lambda: player_page_data(profile.id, game_id),
+                       games=user_games_list,
+                       game=game,
+                       user_games=user_games_list,
+                       activities=load_activities,
+                       game_participation=game_participation,
+                       selected_quest=selected_quest,
+                       has_joined=has_joined,
+                       profile=profile,
+                       carousel_images=lambda: carousel.images(game_id),
+                       total_points=total_points,
+                       custom_games=custom_games,
+                       selected_game_id=game_id or 0,
+                       selected_game=game,
+                       quest_id=quest_id,
+                       start_onboarding=start_onboarding,
+                       login_form=login_form,
+                       register_form=register_form)
 
 
 @main_bp.route('/mark-onboarding-complete', methods=['POST'])
@@ -333,27 +265,37 @@ def shout_board(game_id):
         return redirect(url_for('main.index', game_id=game_id))
 
 
+def add_like(like_model, target, target_column):
+    """
+    Record the current user's like of target and bump its like_count in
+    the same transaction. A repeated like hits the unique constraint and
+    changes nothing, so concurrent clicks cannot count twice. Returns
+    (whether the like is new, the like count).
+    """
+    inserted = db.session.execute(
+        insert(like_model).values({target_column: target.id, 'user_id': current_user.id})
+        .on_conflict_do_nothing(index_elements=[target_column, 'user_id'])
+        .returning(like_model.id)
+    ).scalar()
+    if inserted is None:
+        return False, target.like_count
+
+    model = type(target)
+    like_count = db.session.execute(
+        db.update(model).where(model.id == target.id)
+        .values(like_count=model.like_count + 1)
+        .returning(model.like_count)
+    ).scalar()
+    db.session.commit()
+    return True, like_count
+
+
 @main_bp.route('/like-message/<int:message_id>', methods=['POST'])
 @login_required
 def like_message(message_id):
-    # Retrieve the message by ID
     message = ShoutBoardMessage.query.get_or_404(message_id)
-    # Check if the current user already liked this message
-    already_liked = ShoutBoardLike.query.filter_by(user_id=current_user.id, message_id=message.id).first() is not None
-
-    if not already_liked:
-        # User has not liked this message before, so create a new like
-        new_like = ShoutBoardLike(user_id=current_user.id, message_id=message.id)
-        db.session.add(new_like)
-        db.session.commit()
-        success = True
-    else:
-        # User already liked the message. Optionally, handle "unliking" here
-        success = False
-
-    # Fetch the new like count for the message
-    new_like_count = db.session.query(ShoutBoardLike).filter_by(message_id=message_id).count()
-    return jsonify(success=success, new_like_count=new_like_count, already_liked=already_liked)
+    success, new_like_count = add_like(ShoutBoardLike, message, 'message_id')
+    return jsonify(success=success, new_like_count=new_like_count, already_liked=not success)
 
 
 @main_bp.route('/leaderboard_partial')
@@ -401,39 +343,21 @@ def leaderboard_partial():
 @main_bp.route('/profile/<int:user_id>')
 @login_required
 def user_profile(user_id):
+    """
+    The profile header. Submissions, badges and the wall are paged
+    separately under /profile/<user_id>/..., and the riding preference
+    choices are served once from /profile/choices.
+    """
     user = User.query.get_or_404(user_id)
-    user_quests = UserQuest.query.filter(UserQuest.user_id == user.id, UserQuest.completions > 0).all()
-    badges = user.badges
-    participated_games = user.participated_games
-    quest_submissions = user.quest_submissions
-    profile_messages = ProfileWallMessage.query.filter_by(user_id=user_id).order_by(ProfileWallMessage.timestamp.desc()).all()
-
-    # Define riding preferences choices here
-    riding_preferences_choices = [
-        ('new_novice', 'New and novice rider'),
-        ('elementary_school', 'In elementary school or younger'),
-        ('middle_school', 'In Middle school'),
-        ('high_school', 'In High school'),
-        ('college', 'College student'),
-        ('families', 'Families who ride with their children'),
-        ('grandparents', 'Grandparents who ride with their grandchildren'),
-        ('seasoned', 'Seasoned riders who ride all over town for their transportation'),
-        ('adaptive', 'Adaptive bike users'),
-        ('occasional', 'Occasional rider'),
-        ('ebike', 'E-bike rider'),
-        ('long_distance', 'Long distance rider'),
-        ('no_car', 'Don’t own a car'),
-        ('commute', 'Commute by bike'),
-        ('seasonal', 'Seasonal riders: I don’t like riding in inclement weather'),
-        ('environmentally_conscious', 'Environmentally Conscious Riders'),
-        ('social', 'Social Riders'),
-        ('fitness_focused', 'Fitness-Focused Riders'),
-        ('tech_savvy', 'Tech-Savvy Riders'),
-        ('local_history', 'Local History or Culture Enthusiasts'),
-        ('advocacy_minded', 'Advocacy-Minded Riders'),
-        ('bike_collectors', 'Bike Collectors or Bike Equipment Geek'),
-        ('freakbike', 'Freakbike rider/maker')
-    ]
+    user_quests = db.session.query(UserQuest.quest_id, UserQuest.completions).filter(
+        UserQuest.user_id == user.id, UserQuest.completions > 0).all()
+    participated_games = db.session.query(Game).join(user_games, user_games.c.game_id == Game.id).filter(
+        user_games.c.user_id == user.id).all()
+    counts = db.session.query(
+        db.select(func.count()).where(user_badges.c.user_id == user.id).scalar_subquery(),
+        db.select(func.count()).where(QuestSubmission.user_id == user.id).scalar_subquery(),
+        db.select(func.count()).where(ProfileWallMessage.user_id == user.id).scalar_subquery(),
+    ).one()
 
     response_data = {
         'current_user_id': current_user.id,
@@ -451,35 +375,20 @@ def user_profile(user_id):
             'bike_description': user.bike_description,
             'upload_to_socials': user.upload_to_socials,
             'show_carbon_game': user.show_carbon_game,
-            'badges': [{'id': badge.id, 'name': badge.name, 'description': badge.description, 'category': badge.category, 'image': badge.image} for badge in badges]
+        },
+        'counts': {
+            'badges': counts[0],
+            'quest_submissions': counts[1],
+            'profile_messages': counts[2],
         },
         'user_quests': [
-            {'id': quest.id, 'completions': quest.completions}
-            for quest in user_quests
-        ],
-        'profile_messages': [
-            {
-                'id': message.id,
-                'content': message.content,
-                'timestamp': message.timestamp.strftime('%B %d, %Y %H:%M'),
-                'author_id': message.author_id,
-                'author': {
-                    'username': message.author.username,
-                    'display_name': message.author.display_name
-                },
-                'parent_id': message.parent_id
-            }
-            for message in profile_messages
+            {'id': quest_id, 'completions': completions}
+            for quest_id, completions in user_quests
         ],
         'participated_games': [
             {'id': game.id, 'title': game.title, 'description': game.description, 'start_date': game.start_date.strftime('%B %d, %Y'), 'end_date': game.end_date.strftime('%B %d, %Y')}
             for game in participated_games
         ],
-        'quest_submissions': [
-            {'id': submission.id, 'quest': {'title': submission.quest.title}, 'comment': submission.comment, 'timestamp': submission.timestamp.strftime('%B %d, %Y %H:%M'), 'image_url': submission.image_url, 'twitter_url': submission.twitter_url, 'fb_url': submission.fb_url, 'instagram_url': submission.instagram_url}
-            for submission in quest_submissions
-        ],
-        'riding_preferences_choices': riding_preferences_choices  # Use centralized preferences
     }
 
     return jsonify(response_data)
@@ -605,22 +514,8 @@ def update_profile():
 @login_required
 def like_quest(quest_id):
     quest = Quest.query.get_or_404(quest_id)
-    # Check if the current user already liked this quest
-    already_liked = QuestLike.query.filter_by(user_id=current_user.id, quest_id=quest.id).first() is not None
-
-    if not already_liked:
-        # User has not liked this quest before, so create a new like
-        new_like = QuestLike(user_id=current_user.id, quest_id=quest.id)
-        db.session.add(new_like)
-        db.session.commit()
-        success = True
-    else:
-        # User already liked the quest. Optionally, handle "unliking" here
-        success = False
-
-    # Fetch the new like count for the quest
-    new_like_count = QuestLike.query.filter_by(quest_id=quest.id).count()
-    return jsonify(success=success, new_like_count=new_like_count, already_liked=already_liked)
+    success, new_like_count = add_like(QuestLike, quest, 'quest_id')
+    return jsonify(success=success, new_like_count=new_like_count, already_liked=not success)
 
 
 @main_bp.route('/pin_message/<int:game_id>/<int:message_id>', methods=['POST'])
@@ -679,6 +574,14 @@ def contact():
     return redirect(url_for('main.index'))
 
 
+@main_bp.route('/sw.js')
+def service_worker():
+    # Served from the root so the worker's scope covers quest submissions, not just /static/
+    response = Response(assets.render_service_worker(), mimetype='application/javascript')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
 @main_bp.route('/refresh-csrf', methods=['GET'])
 def refresh_csrf():
     new_csrf_token = generate_csrf()
@@ -696,6 +599,90 @@ def refresh_csrf():
     return response
 
 
+# Upload kinds the browser may send straight to object storage
+DIRECT_UPLOAD_KINDS = {'verification'}
+
+
+@main_bp.route('/uploads/presign', methods=['POST'])
+@login_required
+def presign_upload():
+    data = request.get_json(silent=True) or {}
+    kind = data.get('kind')
+    filename = data.get('filename', '')
+    content_type = data.get('content_type', '')
+
+    if kind not in DIRECT_UPLOAD_KINDS or not allowed_file(filename) or not content_type.startswith('image/'):
+        return jsonify({'error': 'Invalid upload'}), 400
+
+    if storage.is_local:
+        # Local storage: post the file with the form as usual
+        return jsonify({'direct': False})
+
+    max_bytes = current_app.config.get('MAX_CONTENT_LENGTH') or 16 * 1024 * 1024
+    upload = issue_direct_upload(current_user.id, kind, filename, content_type, max_bytes)
+    presigned = storage.presigned_upload(upload.storage_key, content_type, max_bytes)
+    return jsonify({'direct': True, 'key': upload.storage_key, 'url': presigned['url'], 'fields': presigned['fields']})
+
+
+@main_bp.route('/uploads/chunked', methods=['POST'])
+@login_required
+def start_chunked_upload():
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename', '')
+    content_type = data.get('content_type', '')
+    if not allowed_file(filename) or not content_type.startswith('image/'):
+        return jsonify({'error': 'Invalid upload'}), 400
+
+    try:
+        upload = create_upload_session(
+            current_user.id, data.get('kind'), filename, content_type,
+            int(data.get('size') or 0), data.get('checksum')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    payload = upload.to_dict()
+    payload['chunk_size'] = current_app.config['UPLOAD_CHUNK_SIZE']
+    return jsonify(payload), 201
+
+
+@main_bp.route('/uploads/chunked/<upload_id>', methods=['GET'])
+@login_required
+def chunked_upload_status(upload_id):
+    upload = UploadSession.query.filter_by(id=upload_id, user_id=current_user.id).first()
+    if not upload:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(upload.to_dict())
+
+
+@main_bp.route('/uploads/chunked/<upload_id>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id):
+    # Locked so a retried chunk cannot race the original request
+    upload = UploadSession.query.filter_by(id=upload_id, user_id=current_user.id).with_for_update().first()
+    if not upload:
+        return jsonify({'error': 'Upload not found'}), 404
+
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None:
+        db.session.rollback()
+        return jsonify({'error': 'Missing Upload-Offset header'}), 400
+
+    try:
+        write_chunk(upload, offset, request.stream, request.headers.get('X-Chunk-SHA256'))
+    except UploadOffsetError as e:
+        db.session.rollback()
+        return jsonify({'error': 'Offset mismatch', 'received': e.received}), 409
+    except ChecksumMismatchError as e:
+        payload = {'error': str(e), 'received': upload.received}
+        db.session.rollback()
+        return jsonify(payload), 422
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    return jsonify(upload.to_dict())
+
+
 @main_bp.route('/resize_image')
 #@cache.cached(timeout=604800, query_string=True)  # Cache for 1 day
 def resize_image():
@@ -706,63 +693,27 @@ def resize_image():
         return jsonify({'error': "Invalid request: Missing 'path' or 'width'"}), 400
 
     try:
-        # Combine the static folder and the image path
-        full_image_path = os.path.abspath(os.path.join(current_app.static_folder, image_path))
-
-        # Ensure that the resolved path is within the static folder to prevent path traversal
-        if not full_image_path.startswith(os.path.abspath(current_app.static_folder)):
-            current_app.logger.error(f"Attempted path traversal detected: {image_path}")
-            return jsonify({'error': 'Invalid file path'}), 400
-
-        if not os.path.exists(full_image_path):
-            current_app.logger.error(f"File not found: {full_image_path}")
+        key = storage_key(image_path)
+        if not is_stored_key(key):
+            # Combine the static folder and the image path
+            full_image_path = os.path.abspath(os.path.join(current_app.static_folder, key))
+
+            # Ensure that the resolved path is within the static folder to prevent path traversal
+            if not full_image_path.startswith(os.path.abspath(current_app.static_folder)):
+                current_app.logger.error(f"Attempted path traversal detected: {image_path}")
+                return jsonify({'error': 'Invalid file path'}), 400
+
+        if storage.source_stat(key) is None:
+            current_app.logger.error(f"File not found: {image_path}")
             return jsonify({'error': 'File not found'}), 404
 
-        # Open the image
-        with Image.open(full_image_path) as img:
-            # Correct orientation based on EXIF data
-            try:
-                for orientation in ExifTags.TAGS.keys():
-                    if ExifTags.TAGS[orientation] == 'Orientation':
-                        break
-
-                exif = img._getexif()
-                if exif is not None:
-                    orientation_value = exif.get(orientation)
-
-                    if orientation_value == 3:
-                        img = img.rotate(180, expand=True)
-                    elif orientation_value == 6:
-                        img = img.rotate(-90, expand=True)
-                    elif orientation_value == 8:
-                        img = img.rotate(90, expand=True)
-            except (AttributeError, KeyError, IndexError):
-                # No EXIF orientation data, proceed without altering the image
-                pass
-
-            # Calculate the height to maintain aspect ratio
-            ratio = width / float(img.width)
-            height = int(img.height * ratio)
-
-            # Resize the image using LANCZOS resampling
-            img_resized = img.resize((width, height), Image.Resampling.LANCZOS)
-
-            img_io = io.BytesIO()
-
-            # Save the image with appropriate compression settings
-            if img_resized.mode in ('RGBA', 'LA') or (img_resized.mode == 'P' and 'transparency' in img_resized.info):
-                # For images with transparency, convert to RGBA
-                img_resized = img_resized.convert('RGBA')
-                img_resized.save(img_io, 'WEBP')
-            else:
-                # For images without transparency
-                img_resized = img_resized.convert('RGB')
-                img_resized.save(img_io, 'WEBP')
-
-            img_io.seek(0)
-
-            return send_file(img_io, mimetype='image/webp')
-        
+        # Rendered once per source and width, then served from the derivative store
+        return send_derivative(get_resized(key, width))
+
+    except PoolBusyError:
+        response = jsonify({'error': 'Server busy, please retry'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
     except Exception as e:
         current_app.logger.error(f"Exception occurred during image processing: {e}")
         return jsonify({'error': 'Internal server error'}), 500
\ No newline at end of file
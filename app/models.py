@@ -1,15 +1,16 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from flask import current_app
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 from time import time
 from pytz import utc
 from sqlalchemy.exc import IntegrityError
+from app.workers import process_pool, hash_password, verify_password
 
 import jwt
 import random
 import string
+import uuid
 
 db = SQLAlchemy()
 
@@ -80,6 +81,9 @@ class User(UserMixin, db.Model):
 
     selected_game_id = db.Column(db.Integer, db.ForeignKey('game.id'), nullable=True)
 
+    # Prefix index so registration can find the next free "name<N>" with LIKE 'name%'
+    __table_args__ = (db.Index('ix_user_username_prefix', 'username', postgresql_ops={'username': 'varchar_pattern_ops'}),)
+
     def generate_verification_token(self, expiration=320000):
         return jwt.encode(
             {'verify_email': self.id, 'exp': time() + expiration},
@@ -109,10 +113,11 @@ class User(UserMixin, db.Model):
         return User.query.get(id)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        # Hashing is deliberately slow, so keep it off the gevent hub
+        self.password_hash = process_pool.run(hash_password, password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return process_pool.run(verify_password, self.password_hash, password)
 
     def is_already_liking(self, quest):
         return QuestLike.query.filter_by(user_id=self.id, quest_id=quest.id).count() > 0
@@ -120,34 +125,6 @@ class User(UserMixin, db.Model):
     def get_participated_games(self):
         return [{'id': game.id, 'title': game.title} for game in self.participated_games]
         
-    def delete_user(self):
-        # Delete ProfileWallMessages where the user is the author or recipient
-        ProfileWallMessage.query.filter_by(author_id=self.id).delete(synchronize_session=False)
-        ProfileWallMessage.query.filter_by(user_id=self.id).delete(synchronize_session=False)
-
-        # Delete related UserQuests
-        for user_quest in self.user_quests:
-            db.session.delete(user_quest)
-
-        # Delete related QuestLikes
-        for quest_like in self.quest_likes:
-            db.session.delete(quest_like)
-
-        # Delete related ShoutBoardMessages
-        for message in self.shoutboard_messages:
-            db.session.delete(message)
-
-        # Delete related QuestSubmissions
-        for submission in self.quest_submissions:
-            db.session.delete(submission)
-
-        # Remove user from games
-        self.participated_games.clear()
-
-        # Delete the user
-        db.session.delete(self)
-        db.session.commit()
-
     def get_score_for_game(self, game_id):
         """
         Retrieve the user's total score for a specific game.
@@ -169,10 +146,13 @@ class UserIP(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     ip_address = db.Column(db.String(45), nullable=False)  # IPv4 and IPv6 support
-    timestamp = db.Column(db.DateTime, default=datetime.now)
+    timestamp = db.Column(db.DateTime, default=datetime.now)  # First seen
+    last_seen = db.Column(db.DateTime, default=datetime.now, nullable=True)
 
     user = db.relationship('User', backref='ip_addresses')
 
+    __table_args__ = (db.UniqueConstraint('user_id', 'ip_address', name='_user_ip_uc'),)
+
 class Quest(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(140))
@@ -195,6 +175,8 @@ class Quest(db.Model):
     badge_id = db.Column(db.Integer, db.ForeignKey('badge.id'), nullable=True)
     submissions = db.relationship('QuestSubmission', back_populates='quest', cascade='all, delete-orphan')
     likes = db.relationship('QuestLike', backref='quest', cascade="all, delete-orphan")
+    # Kept in step with quest_likes by like_quest
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     badge_awarded = db.Column(db.Integer, default=1)
 
     def __repr__(self):
@@ -301,6 +283,8 @@ class ShoutBoardMessage(db.Model):
     timestamp = db.Column(db.DateTime, index=True, default=lambda: datetime.now(utc))
     is_pinned = db.Column(db.Boolean, default=False)
     likes = db.relationship('ShoutBoardLike', backref='message', cascade="all, delete-orphan")
+    # Kept in step with shout_board_like by like_message
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
 
 class ShoutBoardLike(db.Model):
@@ -320,10 +304,19 @@ class QuestSubmission(db.Model):
     twitter_url = db.Column(db.String(1024), nullable=True)
     fb_url = db.Column(db.String(1024), nullable=True)
     instagram_url = db.Column(db.String(1024), nullable=True)
+    # Set by the offline queue so a replayed submission is only recorded once
+    client_id = db.Column(db.String(36), nullable=True)
 
     quest = db.relationship('Quest', back_populates='submissions')
     user = db.relationship('User', back_populates='quest_submissions', overlaps="submitter")
 
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'client_id', name='_user_client_uc'),
+        # Newest-first pages of a quest's or a user's submissions
+        db.Index('ix_quest_submission_quest_timestamp', 'quest_id', 'timestamp', 'id'),
+        db.Index('ix_quest_submission_user_timestamp', 'user_id', 'timestamp', 'id'),
+    )
+
 class Sponsor(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
@@ -347,3 +340,177 @@ class ProfileWallMessage(db.Model):
     author = db.relationship('User', foreign_keys=[author_id], backref=db.backref('profile_messages_sent', cascade="all, delete-orphan"))
     replies = db.relationship('ProfileWallMessage', backref=db.backref('parent', remote_side=[id]), cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Newest-first pages of a wall's top-level posts, and the replies of each post
+        db.Index('ix_profile_wall_message_user_timestamp', 'user_id', 'timestamp', 'id'),
+        db.Index('ix_profile_wall_message_parent_id', 'parent_id'),
+    )
+
+
+
+class AIGenerationJob(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    kind = db.Column(db.String(20), nullable=False)  # 'quest' or 'badge'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id', ondelete='CASCADE'), nullable=True)
+    prompt = db.Column(db.Text, nullable=False)
+    prompt_key = db.Column(db.String(64), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, done, failed
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(utc), index=True)
+    finished_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+class QuestDraftBatch(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done
+    total = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(utc))
+    finished_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    drafts = db.relationship('QuestDraft', backref='batch', cascade='all, delete-orphan', order_by='QuestDraft.position')
+
+    def to_dict(self):
+        return {
+            'batch_id': self.id,
+            'game_id': self.game_id,
+            'status': self.status,
+            'total': self.total,
+            'completed': self.completed,
+            'failed': self.failed,
+            'drafts': [draft.to_dict() for draft in self.drafts],
+        }
+
+
+class QuestDraft(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey('quest_draft_batch.id', ondelete='CASCADE'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False, default=0)
+    description = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, ready, failed, imported
+    details = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    quest_id = db.Column(db.Integer, db.ForeignKey('quest.id', ondelete='SET NULL'), nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'description': self.description,
+            'status': self.status,
+            'details': self.details,
+            'error': self.error,
+            'quest_id': self.quest_id,
+        }
+
+
+class OutboxEmail(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    html = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    next_attempt_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(utc))
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(utc))
+    sent_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    announcement_id = db.Column(db.Integer, db.ForeignKey('announcement.id', ondelete='CASCADE'), nullable=True, index=True)
+
+    __table_args__ = (db.Index('ix_outbox_email_status_next_attempt', 'status', 'next_attempt_at'),)
+
+
+class Announcement(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id', ondelete='CASCADE'), nullable=False, index=True)
+    author_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, rendering, done, failed
+    total_recipients = db.Column(db.Integer, nullable=False, default=0)
+    queued_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(utc))
+    finished_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    game = db.relationship('Game')
+    author = db.relationship('User')
+
+    def delivery_counts(self):
+        rows = db.session.query(OutboxEmail.status, db.func.count(OutboxEmail.id)).filter(
+            OutboxEmail.announcement_id == self.id
+        ).group_by(OutboxEmail.status).all()
+        return {status: count for status, count in rows}
+
+
+class DeletionJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'user' or 'game'
+    target_id = db.Column(db.Integer, nullable=False)
+    target_name = db.Column(db.String(255), nullable=True)
+    requested_by = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, done, failed
+    step = db.Column(db.String(50), nullable=True)
+    deleted_rows = db.Column(db.Integer, nullable=False, default=0)
+    deleted_files = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(utc))
+    finished_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'target_id': self.target_id,
+            'target_name': self.target_name,
+            'status': self.status,
+            'step': self.step,
+            'deleted_rows': self.deleted_rows,
+            'deleted_files': self.deleted_files,
+            'error': self.error,
+        }
+
+
+class UploadSession(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'verification'
+    filename = db.Column(db.String(255), nullable=False)
+    content_type = db.Column(db.String(100), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    received = db.Column(db.BigInteger, nullable=False, default=0)
+    checksum = db.Column(db.String(64), nullable=False)  # sha256 hex of the whole file
+    status = db.Column(db.String(20), nullable=False, default='uploading')  # uploading, complete, used
+    storage_key = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(utc))
+    expires_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
+
+    def to_dict(self):
+        return {
+            'upload_id': self.id,
+            'size': self.size,
+            'received': self.received,
+            'status': self.status,
+        }
+
+
+class GameVersion(db.Model):
+    # Bumped in the same transaction as every change to a game's quests, badges,
+    # sponsors, submissions or settings; see app/game_versions.py
+    game_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(utc))
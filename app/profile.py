@@ -1,7 +1,9 @@
 from flask import Blueprint, jsonify, request
 from flask_login import current_user, login_required
-from .models import db, ProfileWallMessage, User
+from .models import db, ProfileWallMessage, User, Badge, Quest, QuestSubmission, user_badges
 from .main import user_profile
+from .forms import RIDING_PREFERENCES_CHOICES
+from .pagination import PageArgumentError, page_args, keyset_page
 from sqlalchemy.exc import IntegrityError
 
 import bleach
@@ -42,6 +44,153 @@ ALLOWED_ATTRIBUTES = {
     'font': ['color', 'face', 'size']
 }
 
+PROFILE_TIMESTAMP_FORMAT = '%B %d, %Y %H:%M'
+# Replies below a top-level post that the message board shows
+WALL_REPLY_DEPTH = 3
+# The choices only change with a deploy
+CHOICES_MAX_AGE = 24 * 60 * 60
+
+
+@profile_bp.route('/choices', methods=['GET'])
+def riding_preferences_choices():
+    response = jsonify(RIDING_PREFERENCES_CHOICES)
+    response.cache_control.public = True
+    response.cache_control.max_age = CHOICES_MAX_AGE
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@profile_bp.route('/<int:user_id>/submissions', methods=['GET'])
+@login_required
+def profile_submissions(user_id):
+    query = db.session.query(
+        QuestSubmission.timestamp, QuestSubmission.id, QuestSubmission.image_url, QuestSubmission.comment,
+        QuestSubmission.twitter_url, QuestSubmission.fb_url, QuestSubmission.instagram_url,
+        Quest.title.label('quest_title'),
+    ).join(Quest, Quest.id == QuestSubmission.quest_id).filter(QuestSubmission.user_id == user_id)
+    try:
+        limit, cursor = page_args()
+        rows, next_cursor = keyset_page(query, (QuestSubmission.timestamp, QuestSubmission.id), limit, cursor)
+    except PageArgumentError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'submissions': [{
+            'id': row.id,
+            'quest_title': row.quest_title,
+            'comment': row.comment,
+            'timestamp': row.timestamp.strftime(PROFILE_TIMESTAMP_FORMAT),
+            'image_url': row.image_url,
+            'twitter_url': row.twitter_url,
+            'fb_url': row.fb_url,
+            'instagram_url': row.instagram_url,
+        } for row in rows],
+        'next_cursor': next_cursor,
+    })
+
+
+@profile_bp.route('/<int:user_id>/badges', methods=['GET'])
+@login_required
+def profile_badges(user_id):
+    query = db.session.query(Badge.id, Badge.name, Badge.description, Badge.category, Badge.image).join(
+        user_badges, user_badges.c.badge_id == Badge.id
+    ).filter(user_badges.c.user_id == user_id)
+    try:
+        limit, cursor = page_args()
+        rows, next_cursor = keyset_page(query, (Badge.id,), limit, cursor)
+    except PageArgumentError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'badges': [{
+            'id': row.id,
+            'name': row.name,
+            'description': row.description,
+            'category': row.category,
+            'image': row.image,
+        } for row in rows],
+        'next_cursor': next_cursor,
+    })
+
+
+def wall_threads(top_level_ids, max_depth=WALL_REPLY_DEPTH):
+    """
+    The posts top_level_ids and their replies down to max_depth levels, in
+    one statement: a recursive CTE walks the threads, and each message
+    comes with its author's names and its number of direct replies, so the
+    board can show replies it was not sent.
+    """
+    thread = db.select(
+        ProfileWallMessage.id, db.literal(0).label('depth')
+    ).where(ProfileWallMessage.id.in_(top_level_ids)).cte('thread', recursive=True)
+    replies = db.aliased(ProfileWallMessage)
+    thread = thread.union_all(
+        db.select(replies.id, (thread.c.depth + 1).label('depth')).join(
+            thread, replies.parent_id == thread.c.id
+        ).where(thread.c.depth < max_depth)
+    )
+
+    reply_counts = db.select(
+        ProfileWallMessage.parent_id, db.func.count().label('reply_count')
+    ).where(ProfileWallMessage.parent_id.in_(db.select(thread.c.id))).group_by(ProfileWallMessage.parent_id).subquery()
+
+    statement = db.select(
+        ProfileWallMessage.timestamp, ProfileWallMessage.id, ProfileWallMessage.content,
+        ProfileWallMessage.user_id, ProfileWallMessage.author_id, ProfileWallMessage.parent_id,
+        User.username.label('author_username'), User.display_name.label('author_display_name'),
+        db.func.coalesce(reply_counts.c.reply_count, 0).label('reply_count'),
+    ).join(
+        thread, thread.c.id == ProfileWallMessage.id
+    ).join(
+        User, User.id == ProfileWallMessage.author_id
+    ).outerjoin(
+        reply_counts, reply_counts.c.parent_id == ProfileWallMessage.id
+    ).order_by(thread.c.depth, ProfileWallMessage.timestamp.desc(), ProfileWallMessage.id.desc())
+    return db.session.execute(statement).all()
+
+
+def wall_message_data(row):
+    return {
+        'id': row.id,
+        'content': row.content,
+        'timestamp': row.timestamp.strftime(PROFILE_TIMESTAMP_FORMAT),
+        'user_id': row.user_id,
+        'author_id': row.author_id,
+        'author': {
+            'username': row.author_username,
+            'display_name': row.author_display_name,
+        },
+        'parent_id': row.parent_id,
+        'reply_count': row.reply_count,
+    }
+
+
+@profile_bp.route('/<int:user_id>/wall', methods=['GET'])
+@login_required
+def profile_wall(user_id):
+    """
+    A page of the top-level posts on a user's wall, newest first, with
+    their replies as deep as the message board shows them. A page is two
+    queries however many posts and replies it holds: the keyset page of
+    top-level ids, then wall_threads for those threads.
+    """
+    top_level = db.session.query(ProfileWallMessage.timestamp, ProfileWallMessage.id).filter(
+        ProfileWallMessage.user_id == user_id, ProfileWallMessage.parent_id.is_(None)
+    )
+    try:
+        limit, cursor = page_args()
+        rows, next_cursor = keyset_page(top_level, (ProfileWallMessage.timestamp, ProfileWallMessage.id), limit, cursor)
+    except PageArgumentError as e:
+        return jsonify({'error': str(e)}), 400
+
+    messages = wall_threads([row.id for row in rows]) if rows else []
+
+    return jsonify({
+        'messages': [wall_message_data(row) for row in messages],
+        'next_cursor': next_cursor,
+    })
+
+
 @profile_bp.route('/<int:user_id>/messages', methods=['POST'])
 @login_required
 def post_profile_message(user_id):
@@ -84,14 +233,18 @@ def delete_message(user_id, message_id):
 @profile_bp.route('/<int:user_id>/messages/<int:message_id>/reply', methods=['POST'])
 @login_required
 def post_reply(user_id, message_id):
-    user = User.query.get_or_404(user_id)
-    message = ProfileWallMessage.query.get_or_404(message_id)
+    User.query.get_or_404(user_id)
+    # The parent's author is read with the message for the permission check
+    parent = db.aliased(ProfileWallMessage)
+    message, parent_author_id = db.session.query(ProfileWallMessage, parent.author_id).outerjoin(
+        parent, parent.id == ProfileWallMessage.parent_id
+    ).filter(ProfileWallMessage.id == message_id).first_or_404()
 
     if not (
-        current_user.id == user.id or
+        current_user.id == user_id or
         current_user.id == message.author_id or
         current_user.id == message.user_id or
-        (message.parent_id and current_user.id == ProfileWallMessage.query.get(message.parent_id).author_id)
+        current_user.id == parent_author_id
     ):
         return jsonify({'error': 'You are not authorized to reply to messages on this profile.'}), 403
 
@@ -109,7 +262,7 @@ def post_reply(user_id, message_id):
         'content': reply.content,
         'timestamp': reply.timestamp,
         'author_id': reply.author_id,
-        'author': {'username': reply.author.username},
+        'author': {'username': current_user.username},
         'parent_id': reply.parent_id
     }}), 201
 
@@ -1,23 +1,53 @@
-from flask import Blueprint, make_response, jsonify, render_template, request, flash, redirect, url_for, current_app
+from flask import Blueprint, make_response, jsonify, render_template, request, flash, redirect, url_for, current_app, send_file
 from flask_login import login_required, current_user
-from app.utils import update_user_score, getLastRelevantCompletionTime, check_and_award_badges, check_and_revoke_badges, save_badge_image, save_submission_image, can_complete_quest
+from app.utils import update_user_score, getLastRelevantCompletionTime, quest_eligibility, check_and_award_badges, check_and_revoke_badges, save_badge_image, save_submission_image, can_complete_quest, remove_upload
 from app.forms import QuestForm, PhotoForm
 from app.social import post_to_social_media
+from app.workers import process_pool, render_qr_sheet_pdf, PoolBusyError
+from app.derivatives import get_qr_code
+from app.storage import storage, upload_key
+from app.assets import stored_static_url
+from app.chunked_uploads import completed_upload, direct_upload
+from app.game_versions import game_cache, bump_game_versions, version_etag, cached_json, conditional_response
+from app.pagination import PageArgumentError, is_paged_request, page_args, requested_fields, keyset_page
 from .models import db, Game, Quest, Badge, UserQuest, QuestSubmission, User
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager
 from datetime import datetime, timezone, timedelta
 from io import BytesIO
 from flask_socketio import emit
 
-import base64
 import csv
+import hashlib
+import json
 import os
-import qrcode
 import bleach
 
 quests_bp = Blueprint('quests', __name__, template_folder='templates')
 
+OFFLINE_BATCH_MAX_ITEMS = 20
+# Phone clocks may run a little ahead of the server
+OFFLINE_CLOCK_SKEW = timedelta(minutes=5)
+
+# What the paged submission endpoints can return through fields=
+SUBMISSION_COLUMNS = {
+    'id': QuestSubmission.id,
+    'quest_id': QuestSubmission.quest_id,
+    'user_id': QuestSubmission.user_id,
+    'image_url': QuestSubmission.image_url,
+    'comment': QuestSubmission.comment,
+    'timestamp': QuestSubmission.timestamp,
+    'twitter_url': QuestSubmission.twitter_url,
+    'fb_url': QuestSubmission.fb_url,
+    'instagram_url': QuestSubmission.instagram_url,
+    'user_display_name': db.func.coalesce(User.display_name, User.username).label('user_display_name'),
+    'user_username': User.username.label('user_username'),
+}
+SUBMISSION_USER_FIELDS = {'user_display_name', 'user_username'}
+SUBMISSION_SORT = (QuestSubmission.timestamp, QuestSubmission.id)
+
 ALLOWED_TAGS = [
     'a', 'b', 'i', 'u', 'em', 'strong', 'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
     'blockquote', 'code', 'pre', 'br', 'div', 'span', 'ul', 'ol', 'li', 'hr',
@@ -153,15 +183,20 @@ def submit_quest(quest_id):
 
     verification_type = quest.verification_type
     image_file = request.files.get('image')
+    # Set instead of image when the browser uploaded straight to object storage
+    direct = direct_upload(request.form.get('image_key'), current_user.id, 'verification')
+    # Set when the photo arrived through the resumable chunked upload
+    upload = completed_upload(request.form.get('upload_id'), current_user.id, 'verification') or direct
+    has_image = bool(upload or (image_file and image_file.filename))
     comment = sanitize_html(request.form.get('verificationComment', ''))
 
     if verification_type == 'qr_code':
         return jsonify({'success': True, 'message': 'QR Code verification does not require any submission'}), 200
-    if verification_type == 'photo' and (not image_file or image_file.filename == ''):
+    if verification_type == 'photo' and not has_image:
         return jsonify({'success': False, 'message': 'No file selected for photo verification'}), 400
     if verification_type == 'comment' and not comment:
         return jsonify({'success': False, 'message': 'Comment required for verification'}), 400
-    if verification_type == 'photo_comment' and (not image_file or image_file.filename == ''):
+    if verification_type == 'photo_comment' and not has_image:
         return jsonify({'success': False, 'message': 'Both photo and comment are required for verification'}), 400
     if quest.verification_type == 'Pause':
         return jsonify({'success': False, 'message': 'This quest is currently paused'}), 403
@@ -170,10 +205,12 @@ def submit_quest(quest_id):
 
     try:
         image_url = None
-        if image_file and image_file.filename:
+        if upload:
+            image_url = upload.storage_key
+            upload.status = 'used'
+        elif not image_url and image_file and image_file.filename:
             emit_status('Saving submission image...', sid)
             image_url = save_submission_image(image_file)
-            image_path = os.path.join(current_app.static_folder, image_url)
 
         display_name = current_user.display_name or current_user.username
         status = f"{display_name} completed '{quest.title}'! #QuestByCycle"
@@ -181,13 +218,15 @@ def submit_quest(quest_id):
         twitter_url, fb_url, instagram_url = None, None, None
         if image_url and current_user.upload_to_socials:
             emit_status('Posting to social media...', sid)
-            twitter_url, fb_url, instagram_url = post_to_social_media(image_url, image_path, status, game, sid)
+            # Twitter and Facebook need a local file even when uploads live in object storage
+            with storage.local_copy(image_url) as image_path:
+                twitter_url, fb_url, instagram_url = post_to_social_media(image_url, image_path, status, game, sid)
 
         emit_status('Saving submission details...', sid)
         new_submission = QuestSubmission(
             quest_id=quest_id,
             user_id=current_user.id,
-            image_url=url_for('static', filename=image_url) if image_url else url_for('static', filename='images/commentPlaceholder.png'),
+            image_url=url_for('static', filename=image_url) if image_url else stored_static_url('images/commentPlaceholder.png'),
             comment=comment,
             twitter_url=twitter_url,
             fb_url=fb_url,
@@ -241,6 +280,160 @@ def submit_quest(quest_id):
         return jsonify({'success': False, 'message': str(e)})
 
 
+def parse_captured_at(value):
+    """Parse an ISO 8601 capture time into naive server time, like the other submission timestamps."""
+    captured_at = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if captured_at.tzinfo is not None:
+        captured_at = captured_at.astimezone().replace(tzinfo=None)
+    return captured_at
+
+
+def record_offline_submission(item, files):
+    """
+    Validate and store one submission replayed from the offline queue.
+
+    Eligibility is checked against the time the rider captured it, not the
+    time it reached us. Returns the item's result: "created", "duplicate"
+    (already recorded under this client_id) or "rejected" (will never be
+    accepted, so the client should drop it).
+    """
+    client_id = str(item.get('client_id') or '')[:36]
+    result = {'client_id': client_id}
+
+    def rejected(message):
+        return dict(result, status='rejected', message=message)
+
+    if not client_id:
+        return rejected('Missing client_id')
+
+    existing = QuestSubmission.query.filter_by(user_id=current_user.id, client_id=client_id).first()
+    if existing:
+        return dict(result, status='duplicate', submission_id=existing.id)
+
+    try:
+        quest = db.session.get(Quest, int(item.get('quest_id')))
+        captured_at = parse_captured_at(item.get('captured_at'))
+    except (TypeError, ValueError):
+        return rejected('Invalid quest_id or captured_at')
+    if not quest or not quest.enabled:
+        return rejected('This quest is not enabled.')
+
+    now = datetime.now()
+    max_age = timedelta(seconds=current_app.config['OFFLINE_SUBMISSION_MAX_AGE'])
+    if not (now - max_age <= captured_at <= now + OFFLINE_CLOCK_SKEW):
+        return rejected('The capture time is too far from the current time')
+    captured_at = min(captured_at, now)
+
+    game = quest.game
+    if not (game.start_date <= captured_at <= game.end_date):
+        return rejected('This quest cannot be completed outside of the game dates')
+
+    can_verify, next_eligible_time = can_complete_quest(current_user.id, quest.id, at=captured_at)
+    if not can_verify:
+        return rejected(f'You cannot submit this quest again until {next_eligible_time}')
+
+    image_file = files.get(f'photo-{client_id}')
+    upload = completed_upload(item.get('upload_id'), current_user.id, 'verification')
+    has_image = bool(upload or (image_file and image_file.filename))
+    comment = sanitize_html(str(item.get('comment') or ''))
+
+    if quest.verification_type == 'qr_code':
+        return rejected('QR Code quests are verified by scanning the code')
+    if quest.verification_type == 'Pause':
+        return rejected('This quest is currently paused')
+    if quest.verification_type in ('photo', 'photo_comment') and not has_image:
+        return rejected('No file selected for photo verification')
+    if quest.verification_type == 'comment' and not comment:
+        return rejected('Comment required for verification')
+
+    image_url = None
+    if upload:
+        image_url = upload.storage_key
+        upload.status = 'used'
+    elif has_image:
+        image_url = save_submission_image(image_file)
+
+    submission = QuestSubmission(
+        quest_id=quest.id,
+        user_id=current_user.id,
+        image_url=url_for('static', filename=image_url) if image_url else stored_static_url('images/commentPlaceholder.png'),
+        comment=comment,
+        timestamp=captured_at,
+        client_id=client_id,
+    )
+    db.session.add(submission)
+
+    user_quest = UserQuest.query.filter_by(user_id=current_user.id, quest_id=quest.id).first()
+    if not user_quest:
+        user_quest = UserQuest(user_id=current_user.id, quest_id=quest.id, completions=0, points_awarded=0)
+        db.session.add(user_quest)
+    user_quest.completions = (user_quest.completions or 0) + 1
+    user_quest.points_awarded = (user_quest.points_awarded or 0) + quest.points
+    # completed_at is the latest completion, which a late replay may not be
+    latest = user_quest.completed_at
+    if latest and latest.tzinfo is not None:
+        latest = latest.astimezone().replace(tzinfo=None)
+    if not latest or latest < captured_at:
+        user_quest.completed_at = captured_at
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # The same item arrived twice at once; the other request recorded it
+        db.session.rollback()
+        if image_url and not upload:
+            remove_upload(image_url)
+        existing = QuestSubmission.query.filter_by(user_id=current_user.id, client_id=client_id).first()
+        return dict(result, status='duplicate', submission_id=existing.id if existing else None)
+
+    return dict(result, status='created', submission_id=submission.id, quest_id=quest.id, game_id=quest.game_id)
+
+
+@quests_bp.route('/submissions/batch', methods=['POST'])
+@login_required
+def submit_quest_batch():
+    """
+    Record submissions that the service worker queued while the rider was offline.
+
+    The multipart body carries a "manifest" JSON list of items (client_id,
+    quest_id, captured_at, comment) and a "photo-<client_id>" file for each
+    item with a photo. Each item is committed on its own, and replaying an
+    item that was already recorded is harmless.
+    """
+    try:
+        items = json.loads(request.form.get('manifest', ''))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid manifest'}), 400
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'message': 'The manifest must be a non-empty list'}), 400
+    if len(items) > OFFLINE_BATCH_MAX_ITEMS:
+        return jsonify({'success': False, 'message': f'At most {OFFLINE_BATCH_MAX_ITEMS} submissions per batch'}), 400
+
+    results = []
+    awarded = set()
+    for item in items:
+        if not isinstance(item, dict):
+            results.append({'status': 'rejected', 'message': 'Invalid item'})
+            continue
+        try:
+            result = record_offline_submission(item, request.files)
+        except Exception as e:
+            # Left in the client's queue and retried with the next batch
+            db.session.rollback()
+            result = {'client_id': item.get('client_id'), 'status': 'error', 'message': str(e)}
+        if result['status'] == 'created':
+            awarded.add((result.pop('quest_id'), result.pop('game_id')))
+        results.append(result)
+
+    if awarded:
+        update_user_score(current_user.id)
+        for quest_id, game_id in awarded:
+            check_and_award_badges(current_user.id, quest_id, game_id)
+
+    total_points = sum(ut.points_awarded for ut in UserQuest.query.filter_by(user_id=current_user.id))
+    return jsonify({'success': True, 'results': results, 'total_points': total_points})
+
+
 @quests_bp.route('/quest/<int:quest_id>/update', methods=['POST'])
 @login_required
 def update_quest(quest_id):
@@ -300,27 +493,33 @@ def delete_quest(quest_id):
 
 @quests_bp.route('/game/<int:game_id>/quests', methods=['GET'])
 def get_quests_for_game(game_id):
-    quests = Quest.query.filter_by(game_id=game_id).all()
-    quests_data = [
-        {
-            'id': quest.id,
-            'title': quest.title,
-            'description': quest.description,
-            'tips': quest.tips,
-            'points': quest.points,
-            'completion_limit': quest.completion_limit,
-            'enabled': quest.enabled,
-            'is_sponsored': quest.is_sponsored,
-            'verification_type': quest.verification_type,
-            'badge_name': quest.badge.name if quest.badge else 'None',
-            'badge_description': quest.badge.description if quest.badge else '',
-            'badge_awarded': quest.badge_awarded if quest.badge_id else '',
-            'frequency': quest.frequency,  # Handling Frequency Enum
-            'category': quest.category if quest.category else 'Not Set',  # Handling potentially undefined Category
-        }
-        for quest in quests
-    ]
-    return jsonify(quests=quests_data)
+    def build():
+        quests = Quest.query.filter_by(game_id=game_id).all()
+        quests_data = [
+            {
+                'id': quest.id,
+                'title': quest.title,
+                'description': quest.description,
+                'tips': quest.tips,
+                'points': quest.points,
+                'completion_limit': quest.completion_limit,
+                'enabled': quest.enabled,
+                'is_sponsored': quest.is_sponsored,
+                'verification_type': quest.verification_type,
+                'badge_name': quest.badge.name if quest.badge else 'None',
+                'badge_description': quest.badge.description if quest.badge else '',
+                'badge_awarded': quest.badge_awarded if quest.badge_id else '',
+                'frequency': quest.frequency,  # Handling Frequency Enum
+                'category': quest.category if quest.category else 'Not Set',  # Handling potentially undefined Category
+            }
+            for quest in quests
+        ]
+        return {'quests': quests_data}
+
+    return conditional_response(
+        version_etag('quests', game_id),
+        lambda: cached_json('quests', game_id, build),
+    )
 
 
 @quests_bp.route('/game/<int:game_id>/import_quests', methods=['POST'])
@@ -379,18 +578,33 @@ def import_quests(game_id):
 
 @quests_bp.route('/quest/<int:quest_id>/submissions')
 def get_quest_submissions(quest_id):
-    submissions = QuestSubmission.query.filter_by(quest_id=quest_id).all()
-    submissions_data = [{
-        'id': sub.id,
-        'image_url': sub.image_url,
-        'comment': sub.comment,
-        'timestamp': sub.timestamp.strftime('%Y-%m-%d %H:%M'),
-        'user_id': sub.user_id,
-        'twitter_url': sub.twitter_url,
-        'fb_url': sub.fb_url,
-        'instagram_url': sub.instagram_url
-    } for sub in submissions]
-    return jsonify(submissions_data)
+    def build():
+        submissions = QuestSubmission.query.filter_by(quest_id=quest_id).all()
+        return [{
+            'id': sub.id,
+            'image_url': sub.image_url,
+            'comment': sub.comment,
+            'timestamp': sub.timestamp.strftime('%Y-%m-%d %H:%M'),
+            'user_id': sub.user_id,
+            'twitter_url': sub.twitter_url,
+            'fb_url': sub.fb_url,
+            'instagram_url': sub.instagram_url
+        } for sub in submissions]
+
+    game_id = db.session.scalar(db.select(Quest.game_id).where(Quest.id == quest_id))
+    if is_paged_request():
+        query = QuestSubmission.query.filter(QuestSubmission.quest_id == quest_id)
+        count = (lambda: game_cache.get_or_build('submission_count', game_id, query.count, quest_id)) if game_id else query.count
+        try:
+            return jsonify(submission_page(query, QUEST_SUBMISSION_FIELDS, minute_timestamp, count))
+        except PageArgumentError as e:
+            return jsonify({'error': str(e)}), 400
+    if game_id is None:
+        return jsonify(build())
+    return conditional_response(
+        version_etag('quest-submissions', game_id, quest_id),
+        lambda: cached_json('quest_submissions', game_id, build, quest_id),
+    )
 
 
 @quests_bp.route('/detail/<int:quest_id>/user_completion')
@@ -442,6 +656,82 @@ def quest_user_completion(quest_id):
     return jsonify(response_data)
 
 
+QUEST_DETAIL_PAGE_SIZE = 24
+
+
+def quest_detail_shared(quest):
+    """The part of the quest detail that is the same for every player: the quest, its badge and the first page of photos."""
+    badge = quest.badge
+    badge_info = {
+        'id': badge.id,
+        'name': badge.name,
+        'description': badge.description,
+        'image': badge.image
+    } if badge else {'name': 'Default', 'image': 'default_badge.png'}
+
+    query = QuestSubmission.query.filter(QuestSubmission.quest_id == quest.id)
+    return {
+        'quest': {
+            'id': quest.id,
+            'title': quest.title,
+            'description': quest.description,
+            'tips': quest.tips,
+            'points': quest.points,
+            'completion_limit': quest.completion_limit,
+            'badge_awarded': quest.badge_awarded,
+            'category': quest.category,
+            'frequency': quest.frequency,
+            'enabled': quest.enabled,
+            'is_sponsored': quest.is_sponsored,
+            'verification_type': quest.verification_type,
+            'badge': badge_info,
+        },
+        'submissions': read_submission_page(query, QUEST_SUBMISSION_FIELDS, minute_timestamp, query.count, QUEST_DETAIL_PAGE_SIZE),
+    }
+
+
+@quests_bp.route('/detail/<int:quest_id>')
+@login_required
+def quest_detail(quest_id):
+    """
+    Everything the quest detail modal shows, in one response: what
+    quest_user_completion and the first page of get_quest_submissions
+    return. The shared part is cached per game version, so a warm request
+    costs the quest lookup, the version and two small per-user queries.
+    """
+    quest = Quest.query.options(db.joinedload(Quest.badge)).get_or_404(quest_id)
+    if quest.game_id is None:
+        shared = quest_detail_shared(quest)
+    else:
+        shared = game_cache.get_or_build('quest_detail', quest.game_id, lambda: quest_detail_shared(quest), quest_id)
+
+    user_quest = db.session.query(UserQuest.completions, UserQuest.completed_at).filter_by(
+        user_id=current_user.id, quest_id=quest_id).first()
+    can_verify, next_eligible_time, last_relevant_completion_time = quest_eligibility(current_user.id, quest)
+    next_eligible = next_eligible_time.isoformat() if next_eligible_time else None
+
+    personal = {
+        'userCompletion': {
+            'completions': user_quest.completions if user_quest else 0,
+            'lastCompletionTimestamp': user_quest.completed_at.isoformat() if user_quest and user_quest.completed_at else None
+        },
+        'canVerify': can_verify,
+        'nextEligibleTime': next_eligible,
+        'lastRelevantCompletionTime': last_relevant_completion_time.isoformat() if last_relevant_completion_time else None
+    }
+    data = dict(shared, quest=dict(shared['quest'], nextEligibleTime=next_eligible), **personal)
+
+    if quest.game_id is None:
+        return jsonify(data)
+    # The per-user part is small, so it is hashed into the ETag rather than versioned
+    personal_digest = hashlib.sha1(json.dumps(personal, sort_keys=True).encode()).hexdigest()[:12]
+    return conditional_response(
+        version_etag('quest-detail', quest.game_id, quest_id, current_user.id, personal_digest),
+        lambda: current_app.json.dumps(data),
+        private=True,
+    )
+
+
 @quests_bp.route('/get_last_relevant_completion_time/<int:quest_id>/<int:user_id>')
 @login_required
 def get_last_relevant_completion_time(quest_id, user_id):
@@ -455,19 +745,7 @@ def get_last_relevant_completion_time(quest_id, user_id):
 @quests_bp.route('/generate_qr/<int:quest_id>')
 def generate_qr(quest_id):
     quest = Quest.query.get_or_404(quest_id)
-    url = url_for('quests.submit_photo', quest_id=quest_id, _external=True)
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(url)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="white", back_color="black")
-    img_buffer = BytesIO()
-    img.save(img_buffer, format="PNG")
-    img_data = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
+    qr_url = url_for('quests.quest_qr_image', quest_id=quest_id)
 
     html_content = f"""
     <!DOCTYPE html>
@@ -487,11 +765,11 @@ def generate_qr(quest_id):
     </head>
     <body>
         <div class="qrcodeHeader">
-            <img src="{url_for('static', filename='images/welcomeQuestByCycle.webp')}" alt="Welcome">
+            <img src="{stored_static_url('images/welcomeQuestByCycle.webp')}" alt="Welcome">
         </div>
         <h1>Congratulations!</h1>
         <h2>Scan to complete '{quest.title}' and gain {quest.points} points!</h2>
-        <img src="data:image/png;base64,{img_data}" alt="QR Code">
+        <img src="{qr_url}" alt="QR Code">
         <h2>Quest By Cycle is a free eco-adventure game where players pedal their way to sustainability, earn rewards, and transform communities—all while having fun!</h2>
     </body>
     </html>
@@ -502,6 +780,49 @@ def generate_qr(quest_id):
     return response
 
 
+@quests_bp.route('/qr/<int:quest_id>.png')
+def quest_qr_image(quest_id):
+    Quest.query.get_or_404(quest_id)
+    url = url_for('quests.submit_photo', quest_id=quest_id, _external=True)
+    try:
+        qr_path = get_qr_code(url)
+    except PoolBusyError:
+        response = jsonify({'error': 'Server busy, please retry'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    # send_file adds an ETag and answers If-None-Match with 304
+    return send_file(qr_path, mimetype='image/png', max_age=86400)
+
+
+@quests_bp.route('/game/<int:game_id>/qr_sheet')
+@login_required
+def quest_qr_sheet(game_id):
+    game = Game.query.get_or_404(game_id)
+    # The codes complete this game's quests, so only its admin (or a super admin) may print them
+    if not current_user.is_super_admin and game.admin_id != current_user.id:
+        flash('Access denied: Only the administrator of this game can print its quest QR codes.', 'danger')
+        return redirect(url_for('main.index', game_id=game_id))
+
+    quests = Quest.query.filter_by(game_id=game_id, enabled=True).order_by(Quest.category, Quest.title).all()
+
+    if request.args.get('format') != 'pdf':
+        return render_template('qr_sheet.html', game=game, quests=quests)
+
+    try:
+        entries = [{
+            'title': bleach.clean(quest.title or '', tags=[], strip=True),
+            'caption': f"Scan to complete and gain {quest.points} points!",
+            'qr_path': get_qr_code(url_for('quests.submit_photo', quest_id=quest.id, _external=True))
+        } for quest in quests]
+        pdf_bytes = process_pool.run(render_qr_sheet_pdf, entries)
+    except PoolBusyError:
+        flash('The server is busy, please try printing again in a moment.', 'warning')
+        return redirect(url_for('quests.manage_game_quests', game_id=game_id))
+
+    return send_file(BytesIO(pdf_bytes), mimetype='application/pdf', as_attachment=True,
+                     download_name=f"quest_qr_codes_game_{game_id}.pdf")
+
+
 @quests_bp.route('/submit_photo/<int:quest_id>', methods=['GET', 'POST'])
 @login_required
 def submit_photo(quest_id):
@@ -537,23 +858,28 @@ def submit_photo(quest_id):
         emit_status('Initializing submission process...', sid)
 
         photo = request.files.get('photo')
-        if photo:
-            emit_status('Saving submission image...', sid)
-            image_url = save_submission_image(photo)
-            image_path = os.path.join(current_app.static_folder, image_url)
+        upload = completed_upload(request.form.get('upload_id'), current_user.id, 'verification')
+        if photo or upload:
+            if upload:
+                image_url = upload.storage_key
+                upload.status = 'used'
+            else:
+                emit_status('Saving submission image...', sid)
+                image_url = save_submission_image(photo)
             display_name = current_user.display_name or current_user.username
             status = f"{display_name} completed '{quest.title}'! #QuestByCycle"
 
             twitter_url, fb_url, instagram_url = None, None, None
             if image_url and current_user.upload_to_socials:
                 emit_status('Posting to social media...', sid)
-                twitter_url, fb_url, instagram_url = post_to_social_media(image_url, image_path, status, game, sid)
+                with storage.local_copy(image_url) as image_path:
+                    twitter_url, fb_url, instagram_url = post_to_social_media(image_url, image_path, status, game, sid)
 
             emit_status('Saving submission details...', sid)
             new_submission = QuestSubmission(
                 quest_id=quest_id,
                 user_id=current_user.id,
-                image_url=url_for('static', filename=image_url) if image_url else url_for('static', filename='images/commentPlaceholder.png'),
+                image_url=url_for('static', filename=image_url) if image_url else stored_static_url('images/commentPlaceholder.png'),
                 twitter_url=twitter_url,
                 fb_url=fb_url,
                 instagram_url=instagram_url,
@@ -607,11 +933,60 @@ def handle_large_file_error(e):
     return "File too large", 413
 
 
+def minute_timestamp(timestamp):
+    return timestamp.strftime('%Y-%m-%d %H:%M')
+
+
+ALL_SUBMISSION_FIELDS = ['id', 'quest_id', 'user_id', 'user_display_name', 'user_username', 'image_url',
+                         'comment', 'timestamp', 'twitter_url', 'fb_url', 'instagram_url']
+QUEST_SUBMISSION_FIELDS = ['id', 'image_url', 'comment', 'timestamp', 'user_id', 'twitter_url', 'fb_url', 'instagram_url']
+USER_SUBMISSION_FIELDS = ['id', 'image_url', 'comment', 'user_id', 'quest_id', 'twitter_url', 'timestamp']
+
+
+def submission_page(query, default_fields, format_timestamp, count):
+    """The page of the submissions in query asked for by the limit, cursor and fields arguments."""
+    limit, cursor = page_args()
+    fields = requested_fields(SUBMISSION_COLUMNS, default_fields)
+    return read_submission_page(query, fields, format_timestamp, count, limit, cursor)
+
+
+def read_submission_page(query, fields, format_timestamp, count, limit, cursor=None):
+    """
+    A page of the submissions in query, newest first. Only the requested
+    columns are read, and User is joined only for user_* fields. count is
+    called for the first page only, so scrolling further costs no count
+    query.
+    """
+    if SUBMISSION_USER_FIELDS.intersection(fields):
+        query = query.join(User, User.id == QuestSubmission.user_id)
+    columns = [SUBMISSION_COLUMNS[field] for field in fields if field not in ('id', 'timestamp')]
+    rows, next_cursor = keyset_page(query.with_entities(*SUBMISSION_SORT, *columns), SUBMISSION_SORT, limit, cursor)
+
+    def value(row, field):
+        item = getattr(row, field)
+        return format_timestamp(item) if field == 'timestamp' and item is not None else item
+
+    page = {
+        'submissions': [{field: value(row, field) for field in fields} for row in rows],
+        'next_cursor': next_cursor,
+    }
+    if cursor is None:
+        page['total'] = count()
+    return page
+
+
 @quests_bp.route('/quest/my_submissions', methods=['GET'])
 def get_user_submissions():
     if not current_user.is_authenticated:
         return jsonify({'error': 'Unauthorized'}), 403
 
+    if is_paged_request():
+        query = QuestSubmission.query.filter(QuestSubmission.user_id == current_user.id)
+        try:
+            return jsonify(submission_page(query, USER_SUBMISSION_FIELDS, datetime.isoformat, query.count))
+        except PageArgumentError as e:
+            return jsonify({'error': str(e)}), 400
+
     try:
         submissions = QuestSubmission.query.filter_by(user_id=current_user.id).all()
         submissions_data = [{
@@ -660,9 +1035,15 @@ def delete_submission(submission_id):
         # Commit UserQuest changes
         db.session.commit()
 
-    # Now remove the submission
+    # Now remove the submission and, once that is committed, its image
+    image_key = upload_key(submission.image_url)
     db.session.delete(submission)
     db.session.commit()
+    if image_key:
+        try:
+            storage.delete(image_key)
+        except Exception as e:
+            current_app.logger.warning(f"Could not remove submission image {image_key}: {e}")
     return jsonify({'success': True})
 
 
@@ -672,12 +1053,24 @@ def get_all_submissions():
 
     if game_id is None:
         return jsonify({'error': 'Game ID is required'}), 400
-    
+
+    is_admin = current_user.is_authenticated and current_user.is_admin
+    if is_paged_request():
+        query = QuestSubmission.query.join(Quest, QuestSubmission.quest_id == Quest.id).filter(Quest.game_id == game_id)
+        try:
+            page = submission_page(query, ALL_SUBMISSION_FIELDS, minute_timestamp,
+                                   lambda: game_cache.get_or_build('submission_count', game_id, query.count))
+        except PageArgumentError as e:
+            return jsonify({'error': str(e)}), 400
+        page['is_admin'] = is_admin
+        return jsonify(page)
+
     # Join QuestSubmission with Quest and User to get necessary details
     submissions = (
         QuestSubmission.query
         .join(Quest, QuestSubmission.quest_id == Quest.id)
         .join(User, QuestSubmission.user_id == User.id)
+        .options(contains_eager(QuestSubmission.user))
         .filter(Quest.game_id == game_id)
         .all()
     )
@@ -704,7 +1097,7 @@ def get_all_submissions():
 
     return jsonify({
         'submissions': submissions_data,
-        'is_admin': current_user.is_admin
+        'is_admin': is_admin
     })
 
 
@@ -734,6 +1127,7 @@ def delete_all_quests(game_id):
     
     try:
         Quest.query.filter_by(game_id=game_id).delete(synchronize_session=False)
+        bump_game_versions(game_ids=[game_id])
         db.session.commit()
         return jsonify({"success": True, "message": "All quests deleted successfully."}), 200
     except Exception as e:
@@ -1,6 +1,7 @@
 from requests_oauthlib import OAuth1Session
 from flask import url_for
 from flask_socketio import SocketIO, emit
+from app.storage import storage
 
 import requests
 import json
@@ -48,7 +49,8 @@ def post_to_social_media(image_url, image_path, status, game, sid):
     emit_status('Posting to Instagram...', sid, progress=80)
     if game.instagram_user_id and game.instagram_access_token:
         try:
-            public_image_url = url_for('static', filename=image_url, _external=True)
+            # Instagram fetches the image itself, so this must be a public URL
+            public_image_url = storage.url(image_url, external=True)
             instagram_url, error = post_to_instagram(public_image_url, status, game.instagram_user_id, game.instagram_access_token)
             if error:
                 print(f"Failed to post image to Instagram: {error}")
@@ -1,17 +1,33 @@
+const SUBMISSIONS_PAGE_SIZE = 20;
+
 function showAllSubmissionsModal(gameId) {
-    fetch(`/quests/quest/all_submissions?game_id=${gameId}`)
-        .then(response => response.json())
-        .then(data => {
-            if (data.error) {
-                throw new Error(data.error);
-            }
-            displayAllSubmissions(data.submissions, data.is_admin);
-            openModal('allSubmissionsModal'); // Ensure this is the last modal opened if stacking
-        })
-        .catch(error => {
-            console.error('Error fetching all submissions:', error);
-            alert('Error fetching all submissions: ' + error.message);
-        });
+    const container = document.getElementById('allSubmissionsContainer');
+    if (!container) {
+        console.error('allSubmissionsContainer element not found.');
+        return;
+    }
+    container.innerHTML = ''; // Clear previous submissions
+
+    loadPagesOnScroll(container, cursor => {
+        const params = new URLSearchParams({ game_id: gameId, limit: SUBMISSIONS_PAGE_SIZE });
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        return fetch(`/quests/quest/all_submissions?${params}`)
+            .then(response => response.json())
+            .then(data => {
+                if (data.error) {
+                    throw new Error(data.error);
+                }
+                displayAllSubmissions(data.submissions, data.is_admin);
+                return data.next_cursor;
+            })
+            .catch(error => {
+                alert('Error fetching all submissions: ' + error.message);
+                throw error;
+            });
+    });
+    openModal('allSubmissionsModal'); // Ensure this is the last modal opened if stacking
 }
 
 function displayAllSubmissions(submissions, isAdmin) {
@@ -20,7 +36,7 @@ function displayAllSubmissions(submissions, isAdmin) {
         console.error('allSubmissionsContainer element not found.');
         return;  // Exit if the container element is not found
     }
-    container.innerHTML = ''; // Clear previous submissions
+    // Pages are appended as the user scrolls
     submissions.forEach(submission => {
         const card = document.createElement('div');
         card.className = 'submission-card';
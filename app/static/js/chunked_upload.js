@@ -0,0 +1,134 @@
+// Resumable photo uploads for flaky mobile connections.
+//
+// The file is sent in chunks to /uploads/chunked/<id>. Every acknowledged
+// chunk is remembered in localStorage, so a dropped connection (or a reload)
+// resumes from the last byte the server has instead of starting over.
+// Resolves with the upload id, which the submission form sends instead of
+// the file itself.
+
+const CHUNKED_UPLOAD_RETRIES = 5;
+
+function chunkedUploadCsrfToken() {
+    const meta = document.querySelector('meta[name="csrf-token"]');
+    return meta ? meta.getAttribute('content') : '';
+}
+
+function sha256Hex(buffer) {
+    return crypto.subtle.digest('SHA-256', buffer).then(hash =>
+        Array.from(new Uint8Array(hash)).map(byte => byte.toString(16).padStart(2, '0')).join('')
+    );
+}
+
+function chunkedUploadStateKey(file, kind) {
+    return `chunked-upload:${kind}:${file.name}:${file.size}:${file.lastModified}`;
+}
+
+function chunkedUploadRequest(url, options) {
+    return fetch(url, Object.assign({ credentials: 'same-origin' }, options, {
+        headers: Object.assign({ 'X-CSRF-Token': chunkedUploadCsrfToken() }, options.headers || {})
+    }));
+}
+
+function startChunkedUpload(file, kind, checksum) {
+    return chunkedUploadRequest('/uploads/chunked', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            kind: kind,
+            filename: file.name,
+            content_type: file.type,
+            size: file.size,
+            checksum: checksum
+        })
+    }).then(response => response.json().then(data => {
+        if (!response.ok) {
+            throw new Error(data.error || `Upload failed with status ${response.status}`);
+        }
+        return data;
+    }));
+}
+
+function resumeChunkedUpload(uploadId) {
+    return chunkedUploadRequest(`/uploads/chunked/${uploadId}`, { method: 'GET' })
+        .then(response => response.ok ? response.json() : null)
+        .catch(() => null);
+}
+
+function sendChunk(file, upload, chunkSize) {
+    const chunk = file.slice(upload.received, upload.received + chunkSize);
+    return chunk.arrayBuffer()
+        .then(sha256Hex)
+        .then(chunkChecksum => chunkedUploadRequest(`/uploads/chunked/${upload.upload_id}`, {
+            method: 'PUT',
+            headers: {
+                'Content-Type': 'application/octet-stream',
+                'Upload-Offset': String(upload.received),
+                'X-Chunk-SHA256': chunkChecksum
+            },
+            body: chunk
+        }))
+        .then(response => response.json().then(data => {
+            // 409 and 422 carry the offset to continue from
+            if (response.ok || response.status === 409 || response.status === 422) {
+                return Object.assign(upload, { received: data.received, status: data.status || upload.status });
+            }
+            throw new Error(data.error || `Upload failed with status ${response.status}`);
+        }));
+}
+
+function chunkedUpload(file, kind, onProgress) {
+    const stateKey = chunkedUploadStateKey(file, kind);
+    let chunkSize = 512 * 1024;
+
+    return file.arrayBuffer()
+        .then(sha256Hex)
+        .then(checksum => {
+            const saved = JSON.parse(localStorage.getItem(stateKey) || 'null');
+            const resumed = saved ? resumeChunkedUpload(saved.upload_id) : Promise.resolve(null);
+            return resumed.then(upload => {
+                if (upload && upload.status !== 'used') {
+                    chunkSize = saved.chunk_size || chunkSize;
+                    return upload;
+                }
+                return startChunkedUpload(file, kind, checksum).then(created => {
+                    chunkSize = created.chunk_size;
+                    localStorage.setItem(stateKey, JSON.stringify({ upload_id: created.upload_id, chunk_size: chunkSize }));
+                    return created;
+                });
+            });
+        })
+        .then(upload => {
+            let failures = 0;
+            const next = () => {
+                if (onProgress) {
+                    onProgress(upload.received, file.size);
+                }
+                if (upload.status === 'complete') {
+                    localStorage.removeItem(stateKey);
+                    return upload.upload_id;
+                }
+                return sendChunk(file, upload, chunkSize)
+                    .then(() => {
+                        failures = 0;
+                        return next();
+                    })
+                    .catch(error => {
+                        failures += 1;
+                        if (failures > CHUNKED_UPLOAD_RETRIES) {
+                            throw error;
+                        }
+                        // Back off, then ask the server where to continue from
+                        const delay = Math.min(1000 * 2 ** failures, 15000);
+                        return new Promise(resolve => setTimeout(resolve, delay))
+                            .then(() => resumeChunkedUpload(upload.upload_id))
+                            .then(status => {
+                                if (status) {
+                                    Object.assign(upload, status);
+                                }
+                                return next();
+                            });
+                    });
+            };
+            return next();
+        });
+}
@@ -14,6 +14,47 @@ $(document).ready(function() {
     });
 });
 
+// AI generation runs as a background job; resolve once the job is done,
+// listening for the Socket.IO push and polling the status URL as a fallback.
+function waitForAIJob(job) {
+    return new Promise((resolve, reject) => {
+        let poller = null;
+
+        function finish(data) {
+            if (data.job_id !== job.job_id || data.status === 'queued' || data.status === 'running') {
+                return false;
+            }
+            clearInterval(poller);
+            if (typeof socket !== 'undefined') {
+                socket.off('ai_job_update', finish);
+            }
+            if (data.status === 'done') {
+                resolve(data);
+            } else {
+                reject({ errorMessage: data.error || 'Generation failed' });
+            }
+            return true;
+        }
+
+        if (finish(job)) {
+            return;
+        }
+        if (typeof socket !== 'undefined') {
+            socket.on('ai_job_update', finish);
+        }
+        poller = setInterval(() => {
+            fetch(job.status_url)
+                .then(response => response.json())
+                .then(finish)
+                .catch(error => console.error('Job status error:', error));
+        }, 3000);
+    });
+}
+
+function aiSocketId() {
+    return (typeof socket !== 'undefined' && socket.connected) ? socket.id : null;
+}
+
 document.addEventListener("DOMContentLoaded", function() {
     const buttons = document.querySelectorAll('button[data-game-id]');
     
@@ -40,7 +81,7 @@ document.addEventListener("DOMContentLoaded", function() {
                         'Content-Type': 'application/json',
                         'X-CSRFToken': csrfToken
                     },
-                    body: JSON.stringify({ description: questDescription, game_id: gameId })
+                    body: JSON.stringify({ description: questDescription, game_id: gameId, sid: aiSocketId() })
                 })
                 .then(response => {
                     if (!response.ok) {
@@ -52,6 +93,16 @@ document.addEventListener("DOMContentLoaded", function() {
                     }
                     return response.json();
                 })
+                .then(job => {
+                    if (job.status !== 'done' && typeof showLoadingModal === 'function') {
+                        showLoadingModal();
+                    }
+                    return waitForAIJob(job).finally(() => {
+                        if (typeof hideLoadingModal === 'function') {
+                            hideLoadingModal();
+                        }
+                    });
+                })
                 .then(data => {
                     if (data.generated_quest_html) {
                         document.getElementById('generatedQuestContent').innerHTML = data.generated_quest_html;
@@ -115,24 +166,29 @@ document.addEventListener("DOMContentLoaded", function() {
                                     'Content-Type': 'application/json',
                                     'X-CSRFToken': document.querySelector('[name=csrf_token]').value
                                 },
-                                body: JSON.stringify({ badge_description: badgeDescription })
+                                body: JSON.stringify({ badge_description: badgeDescription, sid: aiSocketId() })
                             })
                             .then(response => response.json())
+                            .then(job => {
+                                if (job.error && !job.job_id) {
+                                    return Promise.reject({ errorMessage: job.error });
+                                }
+                                generateAIImageBtn.disabled = true;
+                                return waitForAIJob(job).finally(() => {
+                                    generateAIImageBtn.disabled = false;
+                                });
+                            })
                             .then(data => {
                                 console.log("Response data:", data);
-                                if (data.error) {
-                                    alert('Error generating badge image: ' + data.error);
-                                } else {
-                                    const imageFilename = `${data.filename}`;
-                                    const imageURL = `static/images/badge_images/${data.filename}`;
-                                    aiBadgeImage.src = imageURL;
-                                    aiBadgeImage.style.display = 'block';
-                                    aiBadgeFilenameInput.value = imageFilename;
-                                }
+                                const imageFilename = `${data.filename}`;
+                                const imageURL = `static/images/badge_images/${data.filename}`;
+                                aiBadgeImage.src = imageURL;
+                                aiBadgeImage.style.display = 'block';
+                                aiBadgeFilenameInput.value = imageFilename;
                             })
                             .catch(error => {
                                 console.error('Fetch error:', error);
-                                alert('Error: ' + error);
+                                alert('Error generating badge image: ' + (error.errorMessage || error));
                             });
                         });
                     }
@@ -104,8 +104,7 @@ function likeQuest(questId) {
     .then(data => {
         if (data.success) {
             likeButton.textContent = 'Liked';
-            let likeCount = parseInt(likeCountSpan.textContent) || 0;
-            likeCountSpan.textContent = likeCount + 1;
+            likeCountSpan.textContent = data.new_like_count;
             likeButton.classList.add('liked-button-style');
         } else {
             // Handle already liked status
@@ -149,7 +148,53 @@ function updateGameName() {
     }
 }
 
+// The quest table and badge bar are shared by every player of a game and
+// cached on the server; the page embeds the viewed player's own numbers as
+// JSON, which are filled in here.
+function fillPlayerPageData() {
+    const dataElement = document.getElementById('playerPageData');
+    if (!dataElement) return;
+    const data = JSON.parse(dataElement.textContent);
+
+    const questTableBody = document.getElementById('questTableBody');
+    if (questTableBody) {
+        const rows = Array.from(questTableBody.querySelectorAll('tr.quest-row'));
+        rows.forEach(row => {
+            const posts = data.quest_posts[row.dataset.questId] || 0;
+            row.dataset.posts = posts;
+            row.querySelector('.quest-posts').textContent = posts;
+        });
+        // Sponsored first, then the player's most posted, then the most posted overall
+        rows.sort((a, b) =>
+            (b.dataset.sponsored - a.dataset.sponsored) ||
+            (b.dataset.posts - a.dataset.posts) ||
+            (b.dataset.totalPosts - a.dataset.totalPosts)
+        );
+        rows.forEach(row => questTableBody.appendChild(row));
+    }
+
+    const badgeBar = document.querySelector('.badge-bar');
+    if (badgeBar) {
+        const earnedIds = new Set(data.earned_badge_ids.map(String));
+        const earned = [];
+        badgeBar.querySelectorAll('.badge-item').forEach(item => {
+            item.dataset.userCompletions = data.quest_completions[item.dataset.taskId] || 0;
+            if (earnedIds.has(item.dataset.badgeId)) {
+                const image = item.querySelector('.badge-img');
+                item.dataset.earned = 'true';
+                image.classList.replace('badge-not-earned', 'badge-earned');
+                image.removeAttribute('oncontextmenu');
+                earned.push(item);
+            }
+        });
+        // Earned badges lead, in their usual order
+        earned.reverse().forEach(item => badgeBar.prepend(item));
+    }
+}
+
 document.addEventListener("DOMContentLoaded", function() {
+    fillPlayerPageData();
+
     const leaderboardButton = document.getElementById('leaderboardButton');
     if (leaderboardButton) {
         leaderboardButton.addEventListener('click', function() {
@@ -155,8 +155,10 @@ function appendCompletionMeter(parentElement, data, selectedGameId) {
 
 function updateMeterBackground(percent, selectedGameId) {
     const completionMeter = document.getElementById('completionMeter');
-    const imageIndex = 9 - Math.min(Math.floor(percent / 10), 9); // Invert the index for the clearest image at 100%
-    completionMeter.style.backgroundImage = `url('/static/images/leaderboard/smoggy_skyline_${selectedGameId}_${imageIndex}.png')`;
+    // The server snaps smog to 5% steps; invert so the sky is clearest at 100%
+    const smogLevel = Math.round((100 - Math.min(Math.max(percent, 0), 100)) / 5) * 5;
+    const width = Math.ceil((completionMeter.offsetWidth || 768) * (window.devicePixelRatio || 1));
+    completionMeter.style.backgroundImage = `url('/games/smog/${selectedGameId}?level=${smogLevel}&width=${width}')`;
 }
 
 function closeLeaderboardModal() {
@@ -100,3 +100,47 @@ window.onclick = function(event) {
         closeAllModals(event.target.id);
     }
 };
+
+// Cursor-paged lists: fetchPage(cursor) resolves with the next cursor, or
+// null after the last page. A sentinel element at the end of container
+// asks for the next page when it scrolls into view, so long lists load
+// as the user scrolls instead of all at once.
+function loadPagesOnScroll(container, fetchPage) {
+    if (container.pageObserver) {
+        container.pageObserver.disconnect();
+    }
+    const sentinel = document.createElement('div');
+    sentinel.className = 'page-sentinel';
+    let cursor = null;
+    let loading = false;
+
+    const observer = new IntersectionObserver(entries => {
+        if (!entries.some(entry => entry.isIntersecting) || loading) return;
+        loading = true;
+        fetchPage(cursor)
+            .then(nextCursor => {
+                cursor = nextCursor;
+                if (!cursor) {
+                    observer.disconnect();
+                    sentinel.remove();
+                    return;
+                }
+                // Keep it after the rows just added; observing again reports
+                // it at once if a short page left it in view
+                container.appendChild(sentinel);
+                observer.unobserve(sentinel);
+                observer.observe(sentinel);
+            })
+            .catch(error => {
+                observer.disconnect();
+                console.error('Error loading page:', error);
+            })
+            .finally(() => {
+                loading = false;
+            });
+    }, { rootMargin: '200px' });
+
+    container.pageObserver = observer;
+    container.appendChild(sentinel);
+    observer.observe(sentinel);
+}
@@ -9,7 +9,8 @@ function openQuestDetailModal(questId) {
         modalFlashContainer.innerHTML = flashMessagesContainer.innerHTML;
     }
 
-    fetch(`/quests/detail/${questId}/user_completion`)
+    // Quest, eligibility and the first page of photos in one request
+    fetch(`/quests/detail/${questId}`)
         .then(response => response.json())
         .then(data => {
             const { quest, userCompletion, canVerify, nextEligibleTime } = data;
@@ -19,7 +20,7 @@ function openQuestDetailModal(questId) {
             }
             ensureDynamicElementsExistAndPopulate(data.quest, data.userCompletion.completions, data.nextEligibleTime, data.canVerify);
 
-            fetchSubmissions(questId);
+            fetchSubmissions(questId, data.submissions);
             //lazyLoadImages(); // Ensure lazy loading is initialized after populating the content
             openModal('questDetailModal');
         })
@@ -365,6 +366,51 @@ function setInstagramLink(url) {
     }
 }
 
+// When uploads live in object storage, send the photo straight to the bucket
+// and submit only its key. Otherwise send it with the resumable chunked
+// upload (when the browser can checksum it) and submit the upload id.
+function uploadDirect(formData, field, kind) {
+    const file = formData.get(field);
+    // Offline, the service worker queues the form with the file in it
+    if (!file || !file.name || !navigator.onLine) {
+        return Promise.resolve(formData);
+    }
+
+    return fetch('/uploads/presign', {
+        method: 'POST',
+        credentials: 'same-origin',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRF-Token': document.querySelector('meta[name="csrf-token"]').getAttribute('content')
+        },
+        body: JSON.stringify({ kind: kind, filename: file.name, content_type: file.type })
+    })
+    .then(response => response.ok ? response.json() : { direct: false }, () => ({ direct: false }))
+    .then(presigned => {
+        if (!presigned.direct) {
+            if (!(window.crypto && crypto.subtle && typeof chunkedUpload === 'function')) {
+                return formData;
+            }
+            return chunkedUpload(file, kind).then(uploadId => {
+                formData.delete(field);
+                formData.append('upload_id', uploadId);
+                return formData;
+            }).catch(() => formData);
+        }
+        const upload = new FormData();
+        Object.entries(presigned.fields).forEach(([name, value]) => upload.append(name, value));
+        upload.append('file', file);
+        return fetch(presigned.url, { method: 'POST', body: upload }).then(response => {
+            if (!response.ok) {
+                throw new Error(`Upload failed with status ${response.status}`);
+            }
+            formData.delete(field);
+            formData.append('image_key', presigned.key);
+            return formData;
+        });
+    });
+}
+
 // Handle Quest Submissions with streamlined logic
 let isSubmitting = false;
 
@@ -377,19 +423,21 @@ function submitQuestDetails(event, questId) {
     const formData = new FormData(form);
     formData.append('user_id', currentUserId); // Add user_id to form data
     formData.append('sid', socket.id); // Add sid to form data
+    formData.append('captured_at', new Date().toISOString()); // Kept if the submission is queued offline
 
     console.debug('Submitting form with data:', formData);
 
     showLoadingModal(); // Show the loading modal
 
-    fetch(`/quests/quest/${questId}/submit`, {
+    uploadDirect(formData, 'image', 'verification')
+    .then(body => fetch(`/quests/quest/${questId}/submit`, {
         method: 'POST',
-        body: formData,
+        body: body,
         credentials: 'same-origin',
         headers: {
             'X-CSRF-Token': document.querySelector('meta[name="csrf-token"]').getAttribute('content')
         }
-    })
+    }))
     .then(response => {
         hideLoadingModal(); // Hide the loading modal upon receiving the response
         if (!response.ok) {
@@ -412,6 +460,12 @@ function submitQuestDetails(event, questId) {
         if (!data.success) {
             throw new Error(data.message);
         }
+        if (data.queued) {
+            // Saved by the service worker; it is sent once the connection is back
+            alert(data.message);
+            form.reset();
+            return;
+        }
         if (data.total_points) {
             const totalPointsElement = document.getElementById('total-points');
             if (totalPointsElement) {
@@ -448,86 +502,108 @@ function submitQuestDetails(event, questId) {
     });
 }
 
-// Fetch and Display Submissions
-function fetchSubmissions(questId) {
-    fetch(`/quests/quest/${questId}/submissions`, {
-            method: 'GET',
-            headers: {
-                'Authorization': `Bearer ${userToken}`, // Assuming Bearer token is used
-                'Content-Type': 'application/json'
-            },
-            credentials: 'include' // For cookies, this might be necessary
-        })
-        .then(response => {
-            if (!response.ok) {
-                throw new Error(`Server responded with status ${response.status}`);
-            }
-            return response.json();
-        })
-        .then(submissions => {
-            console.debug('Fetched submissions:', submissions);
-
-            const twitterLink = document.getElementById('twitterLink');
-            const facebookLink = document.getElementById('facebookLink');
-            const instagramLink = document.getElementById('instagramLink');
-
-            if (submissions && submissions.length > 0) {
-                const submission = submissions[0];
-                const submissionImage = document.getElementById('submissionImage');
-                const submissionComment = document.getElementById('submissionComment');
-                const submissionUserLink = document.getElementById('submissionUserLink');
-                const downloadLink = document.getElementById('downloadLink');
-
-                submissionImage.src = submission.image_url || 'image/placeholdersubmission.png';
-                submissionComment.textContent = submission.comment || 'No comment provided.';
-                submissionUserLink.href = `/user/profile/${submission.user_id}`;
-                downloadLink.href = submission.image_url || '#';
-                downloadLink.download = `SubmissionImage-${submission.user_id}`;
-
-                if (submission.twitter_url && submission.twitter_url.trim() !== '') {
-                    twitterLink.href = submission.twitter_url;
-                    twitterLink.style.display = 'inline';
-                } else {
-                    twitterLink.style.display = 'none';
-                }
+const QUEST_SUBMISSIONS_PAGE_SIZE = 24;
+const QUEST_SUBMISSION_FIELDS = 'id,image_url,comment,user_id,twitter_url,fb_url,instagram_url';
 
-                if (submission.fb_url && submission.fb_url.trim() !== '') {
-                    facebookLink.href = submission.fb_url;
-                    facebookLink.style.display = 'inline';
-                } else {
-                    facebookLink.style.display = 'none';
-                }
+// Fetch and Display Submissions, newest first, a page at a time as the board scrolls.
+// firstPage, when given, is used instead of requesting the first page again.
+function fetchSubmissions(questId, firstPage) {
+    const board = document.getElementById('submissionBoard');
+    board.innerHTML = ''; // Clear existing content
 
-                if (submission.instagram_url && submission.instagram_url.trim() !== '') {
-                    instagramLink.href = submission.instagram_url;
-                    instagramLink.style.display = 'inline';
-                } else {
-                    instagramLink.style.display = 'none';
+    loadPagesOnScroll(board, cursor => {
+        if (!cursor && firstPage) {
+            return Promise.resolve(showSubmissionsPage(firstPage, true));
+        }
+        const params = new URLSearchParams({ limit: QUEST_SUBMISSIONS_PAGE_SIZE, fields: QUEST_SUBMISSION_FIELDS });
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        return fetch(`/quests/quest/${questId}/submissions?${params}`, {
+                method: 'GET',
+                headers: {
+                    'Authorization': `Bearer ${userToken}`, // Assuming Bearer token is used
+                    'Content-Type': 'application/json'
+                },
+                credentials: 'include' // For cookies, this might be necessary
+            })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`Server responded with status ${response.status}`);
                 }
+                return response.json();
+            })
+            .then(data => showSubmissionsPage(data, !cursor))
+            .catch(error => {
+                console.error('Failed to fetch submissions:', error.message);
+                alert('Could not load submissions. Please try again.');
+                throw error;
+            });
+    });
+}
 
-            } else {
-                twitterLink.style.display = 'none';
-                facebookLink.style.display = 'none';
-                instagramLink.style.display = 'none';
+// Add a page of submissions to the board and return the cursor of the next one
+function showSubmissionsPage(page, isFirst) {
+    console.debug('Fetched submissions:', page.submissions);
+    if (isFirst) {
+        showLatestSubmission(page.submissions[0]);
+    }
+    const images = page.submissions.map(submission => ({
+        url: submission.image_url,
+        alt: "Submission Image",
+        comment: submission.comment,
+        user_id: submission.user_id,
+        twitter_url: submission.twitter_url,
+        fb_url: submission.fb_url,
+        instagram_url: submission.instagram_url,
+    }));
+    distributeImages(images, true);
+    return page.next_cursor;
+}
 
-            }
+function showLatestSubmission(submission) {
+    const twitterLink = document.getElementById('twitterLink');
+    const facebookLink = document.getElementById('facebookLink');
+    const instagramLink = document.getElementById('instagramLink');
 
-            const images = submissions.reverse().map(submission => ({
-                url: submission.image_url,
-                alt: "Submission Image",
-                comment: submission.comment,
-                user_id: submission.user_id,
-                twitter_url: submission.twitter_url,
-                fb_url: submission.fb_url,
-                instagram_url: submission.instagram_url,
-
-            }));
-            distributeImages(images);
-        })
-        .catch(error => {
-            console.error('Failed to fetch submissions:', error.message);
-            alert('Could not load submissions. Please try again.');
-        });
+    if (!submission) {
+        twitterLink.style.display = 'none';
+        facebookLink.style.display = 'none';
+        instagramLink.style.display = 'none';
+        return;
+    }
+
+    const submissionImage = document.getElementById('submissionImage');
+    const submissionComment = document.getElementById('submissionComment');
+    const submissionUserLink = document.getElementById('submissionUserLink');
+    const downloadLink = document.getElementById('downloadLink');
+
+    submissionImage.src = submission.image_url || 'image/placeholdersubmission.png';
+    submissionComment.textContent = submission.comment || 'No comment provided.';
+    submissionUserLink.href = `/user/profile/${submission.user_id}`;
+    downloadLink.href = submission.image_url || '#';
+    downloadLink.download = `SubmissionImage-${submission.user_id}`;
+
+    if (submission.twitter_url && submission.twitter_url.trim() !== '') {
+        twitterLink.href = submission.twitter_url;
+        twitterLink.style.display = 'inline';
+    } else {
+        twitterLink.style.display = 'none';
+    }
+
+    if (submission.fb_url && submission.fb_url.trim() !== '') {
+        facebookLink.href = submission.fb_url;
+        facebookLink.style.display = 'inline';
+    } else {
+        facebookLink.style.display = 'none';
+    }
+
+    if (submission.instagram_url && submission.instagram_url.trim() !== '') {
+        instagramLink.href = submission.instagram_url;
+        instagramLink.style.display = 'inline';
+    } else {
+        instagramLink.style.display = 'none';
+    }
 }
 
 // Function to check if a URL is a valid image URL
@@ -556,9 +632,11 @@ function isValidImageUrl(url) {
     return false;
 }
 
-function distributeImages(images) {
+function distributeImages(images, append = false) {
     const board = document.getElementById('submissionBoard');
-    board.innerHTML = ''; // Clear existing content
+    if (!append) {
+        board.innerHTML = ''; // Clear existing content
+    }
 
     // Get and validate the fallback URL from the DOM
     let fallbackUrl = document.getElementById('questDetailModal').getAttribute('data-placeholder-url');
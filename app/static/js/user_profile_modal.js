@@ -54,14 +54,77 @@ function postMessage(form) {
         });
 }
 
+let ridingPreferencesChoices = null;
+
+function loadRidingPreferencesChoices() {
+    // The same for every profile, so fetched once per page
+    if (!ridingPreferencesChoices) {
+        ridingPreferencesChoices = fetch('/profile/choices')
+            .then(response => response.json())
+            .catch(error => {
+                ridingPreferencesChoices = null;
+                throw error;
+            });
+    }
+    return ridingPreferencesChoices;
+}
+
+function loadProfilePages(container, url, key, renderItem, emptyMessage) {
+    // Pages are fetched as the list scrolls into view, so a tab that is
+    // never opened is never loaded
+    loadPagesOnScroll(container, cursor => {
+        const params = new URLSearchParams({ limit: 12 });
+        if (cursor) params.set('cursor', cursor);
+        return fetch(`${url}?${params}`)
+            .then(response => response.json())
+            .then(page => {
+                if (page.error) throw new Error(page.error);
+                if (!cursor && page[key].length === 0 && emptyMessage) {
+                    container.insertAdjacentHTML('afterbegin', `<p class="text-muted">${emptyMessage}</p>`);
+                }
+                const sentinel = container.querySelector('.page-sentinel');
+                page[key].forEach(item => {
+                    const html = renderItem(item, page);
+                    if (sentinel) sentinel.insertAdjacentHTML('beforebegin', html);
+                    else container.insertAdjacentHTML('beforeend', html);
+                });
+                return page.next_cursor;
+            });
+    });
+}
+
+function renderProfileBadge(badge) {
+    return `
+        <div class="badge-item col-md-4 d-flex flex-column align-items-center text-center p-3 border rounded shadow-sm bg-white">
+            <img src="/static/images/badge_images/${badge.image}" alt="${badge.name}" class="badge-icon mb-2 rounded-circle shadow-sm" style="width: 100px; height: 100px; object-fit: cover;">
+            <h3 class="h5 mt-2">${badge.name}</h3>
+            <p class="text-muted">${badge.description}</p>
+            <p><strong>Category:</strong> ${badge.category}</p>
+        </div>`;
+}
+
+function renderProfileSubmission(submission, isCurrentUser, userId) {
+    return `
+        <div class="submission-item col-md-6 p-3 border rounded shadow-sm bg-white">
+            ${submission.image_url ? `<img src="${submission.image_url}" alt="Submission Image" class="img-fluid rounded mb-2" style="max-height: 200px; object-fit: cover;">` : ''}
+            <p><strong>Quest:</strong> ${submission.quest_title}</p>
+            <p class="text-muted">${submission.comment}</p>
+            <p><strong>Submitted At:</strong> ${submission.timestamp}</p>
+            <div class="d-flex justify-content-start gap-2">
+                ${submission.twitter_url ? `<a href="${submission.twitter_url}" target="_blank" class="btn btn-sm btn-twitter"><i class="bi bi-twitter"></i></a>` : ''}
+                ${submission.fb_url ? `<a href="${submission.fb_url}" target="_blank" class="btn btn-sm btn-facebook"><i class="bi bi-facebook"></i></a>` : ''}
+                ${submission.instagram_url ? `<a href="${submission.instagram_url}" target="_blank" class="btn btn-sm btn-instagram"><i class="bi bi-instagram"></i></a>` : ''}
+            </div>
+            ${isCurrentUser ? `<button class="btn btn-danger btn-sm mt-2" onclick="deleteSubmission(${submission.id}, 'profileSubmissions', ${userId})">Delete</button>` : ''}
+        </div>`;
+}
+
 function showUserProfileModal(userId) {
-    fetch(`/profile/${userId}`)
-        .then(response => response.json())
-        .then(data => {
-            if (!data.riding_preferences_choices) {
-                console.error('Riding preferences choices data is missing.');
-                return;
-            }
+    Promise.all([
+        fetch(`/profile/${userId}`).then(response => response.json()),
+        loadRidingPreferencesChoices(),
+    ])
+        .then(([data, choices]) => {
 
             const userProfileDetails = document.getElementById('userProfileDetails');
             if (!userProfileDetails) {
@@ -71,8 +134,6 @@ function showUserProfileModal(userId) {
 
             const isCurrentUser = data.current_user_id === data.user.id;
 
-            const messagesHtml = buildMessageTree(data.profile_messages, null, isCurrentUser, data.current_user_id, userId, 0);
-
             userProfileDetails.innerHTML = `
                 <header class="profile-header text-center py-5 mb-4 position-relative bg-gradient-primary">
                     ${data.user.profile_picture ? `
@@ -158,7 +219,7 @@ function showUserProfileModal(userId) {
                                             <div class="form-group mb-3">
                                                 <label for="ridingPreferences" class="form-label"><b>Please specify your riding preferences:</b></label>
                                                 <div id="ridingPreferences">
-                                                    ${data.riding_preferences_choices.map((choice, index) => `
+                                                    ${choices.map((choice, index) => `
                                                         <div class="form-check mb-2">
                                                             <input class="form-check-input" type="checkbox" id="ridingPref-${index}" name="riding_preferences" value="${choice[0]}" ${data.user.riding_preferences.includes(choice[0]) ? 'checked' : ''} style="width: 1.25rem; height: 1.25rem;">
                                                             <label class="form-check-label ms-2" for="ridingPref-${index}">${choice[1]}</label>
@@ -239,15 +300,7 @@ function showUserProfileModal(userId) {
                             <div class="tab-pane fade" id="badges-earned" role="tabpanel" aria-labelledby="badges-earned-tab">
                                 <section class="badges-earned mb-4">
                                     <h2 class="h2">Badges Earned</h2>
-                                    <div class="badges-container row g-3">
-                                        ${data.user.badges && data.user.badges.length > 0 ? data.user.badges.map(badge => `
-                                            <div class="badge-item col-md-4 d-flex flex-column align-items-center text-center p-3 border rounded shadow-sm bg-white">
-                                                <img src="/static/images/badge_images/${badge.image}" alt="${badge.name}" class="badge-icon mb-2 rounded-circle shadow-sm" style="width: 100px; height: 100px; object-fit: cover;">
-                                                <h3 class="h5 mt-2">${badge.name}</h3>
-                                                <p class="text-muted">${badge.description}</p>
-                                                <p><strong>Category:</strong> ${badge.category}</p>
-                                            </div>`).join('') : '<p class="text-muted">No badges earned yet.</p>'}
-                                    </div>
+                                    <div class="badges-container row g-3" id="profileBadges"></div>
                                 </section>
                             </div>
                             <div class="tab-pane fade" id="games-participated" role="tabpanel" aria-labelledby="games-participated-tab">
@@ -267,21 +320,7 @@ function showUserProfileModal(userId) {
                             <div class="tab-pane fade" id="quest-submissions" role="tabpanel" aria-labelledby="quest-submissions-tab">
                                 <section class="quest-submissions mb-4">
                                     <h2 class="h2">Quest Submissions</h2>
-                                    <div class="submissions-container row g-3">
-                                        ${data.quest_submissions && data.quest_submissions.length > 0 ? data.quest_submissions.map(submission => `
-                                            <div class="submission-item col-md-6 p-3 border rounded shadow-sm bg-white">
-                                                ${submission.image_url ? `<img src="${submission.image_url}" alt="Submission Image" class="img-fluid rounded mb-2" style="max-height: 200px; object-fit: cover;">` : ''}
-                                                <p><strong>Quest:</strong> ${submission.quest.title}</p>
-                                                <p class="text-muted">${submission.comment}</p>
-                                                <p><strong>Submitted At:</strong> ${submission.timestamp}</p>
-                                                <div class="d-flex justify-content-start gap-2">
-                                                    ${submission.twitter_url ? `<a href="${submission.twitter_url}" target="_blank" class="btn btn-sm btn-twitter"><i class="bi bi-twitter"></i></a>` : ''}
-                                                    ${submission.fb_url ? `<a href="${submission.fb_url}" target="_blank" class="btn btn-sm btn-facebook"><i class="bi bi-facebook"></i></a>` : ''}
-                                                    ${submission.instagram_url ? `<a href="${submission.instagram_url}" target="_blank" class="btn btn-sm btn-instagram"><i class="bi bi-instagram"></i></a>` : ''}
-                                                </div>
-                                                ${isCurrentUser ? `<button class="btn btn-danger btn-sm mt-2" onclick="deleteSubmission(${submission.id}, 'profileSubmissions', ${data.user.id})">Delete</button>` : ''}
-                                            </div>`).join('') : '<p class="text-muted">No quest submissions yet.</p>'}
-                                    </div>
+                                    <div class="submissions-container row g-3" id="profileSubmissions"></div>
                                 </section>
                             </div>
                         </div>
@@ -297,13 +336,21 @@ function showUserProfileModal(userId) {
                                 </div>
                                 <button type="submit" class="btn btn-primary w-100"><i class="bi bi-send-fill me-2"></i>Post</button>
                             </form>
-                            <ul class="list-group mt-3" id="messageBoard">
-                                ${messagesHtml}
-                            </ul>
+                            <ul class="list-group mt-3" id="messageBoard"></ul>
                         </section>
                     </div>
                 </div>
             `;
+            loadProfilePages(document.getElementById('profileBadges'), `/profile/${userId}/badges`, 'badges',
+                renderProfileBadge, 'No badges earned yet.');
+            loadProfilePages(document.getElementById('profileSubmissions'), `/profile/${userId}/submissions`, 'submissions',
+                submission => renderProfileSubmission(submission, isCurrentUser, data.user.id), 'No quest submissions yet.');
+            // Each page holds top-level posts with their replies, so it is a complete set of trees
+            loadProfilePages(document.getElementById('messageBoard'), `/profile/${userId}/wall`, 'messages',
+                (message, page) => message.parent_id === null
+                    ? buildMessageTree([message, ...page.messages.filter(m => m.parent_id !== null)], null, isCurrentUser, data.current_user_id, data.user.id, 0)
+                    : '',
+                null);
             initializeQuill();  // Initialize Quill for all profiles
             openModal('userProfileModal');
         })
@@ -476,6 +523,8 @@ function buildMessageTree(messages, parentId, isCurrentUser, currentUserId, prof
                 <ul class="list-group mt-2">
                     ${replies}
                 </ul>
+                ${!replies && message.reply_count > 0 ? `
+                    <small class="text-muted">${message.reply_count} more ${message.reply_count === 1 ? 'reply' : 'replies'}</small>` : ''}
             </li>
         `;
         }).join('');
@@ -0,0 +1,326 @@
+from flask import current_app, url_for, redirect
+from contextlib import contextmanager
+from io import BytesIO
+
+import logging
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Every upload is saved under a uuid4 name; anything else in static/ is a shipped asset
+UPLOAD_NAME = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\.\w+$')
+
+IMAGE_MIME_TYPES = {'PNG': 'image/png', 'JPEG': 'image/jpeg', 'WEBP': 'image/webp'}
+
+
+def upload_dirs():
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    return {
+        os.path.normpath(path) for path in (
+            upload_folder,
+            os.path.join(upload_folder, 'bicycle_pictures'),
+            os.path.join('images', 'verifications'),
+            os.path.join('images', 'leaderboard'),
+            os.path.join('images', 'sponsors'),
+            os.path.join('images', current_app.config['BADGE_IMAGE_DIR']),
+        )
+    }
+
+
+def badge_image_key(filename):
+    return f"images/{current_app.config['BADGE_IMAGE_DIR']}/{filename}"
+
+
+def storage_key(stored_value):
+    """Turn a stored image reference ('/static/images/x.png' or 'images/x.png') into a storage key."""
+    if not stored_value:
+        return None
+    key = stored_value.lstrip('/')
+    if key.startswith('static/'):
+        key = key[len('static/'):]
+    return os.path.normpath(key).replace(os.sep, '/')
+
+
+def is_stored_key(key):
+    """True for keys that live in the upload store rather than the shipped static folder."""
+    if not key or key.startswith('..'):
+        return False
+    directory = os.path.dirname(key)
+    # Badge images keep their uploaded names (CSV imports refer to them by name)
+    if directory.startswith(current_app.config['DERIVATIVE_CACHE_DIR']) or key == badge_image_key(os.path.basename(key)):
+        return True
+    return directory in upload_dirs() and bool(UPLOAD_NAME.match(os.path.basename(key)))
+
+
+def upload_key(stored_value):
+    """Map a stored image reference to its storage key, or None if it is not a user upload."""
+    key = storage_key(stored_value)
+    if key is None or not is_stored_key(key) or not UPLOAD_NAME.match(os.path.basename(key)):
+        return None
+    return key
+
+
+def new_upload_key(directory, filename):
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else 'bin'
+    return f"{directory}/{uuid.uuid4()}.{ext}"
+
+
+class LocalStorage:
+    """Keeps uploads under the app's static folder, served by Flask's static route."""
+
+    is_local = True
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def save(self, fileobj, key, content_type=None):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as out:
+            shutil.copyfileobj(fileobj, out)
+        os.replace(tmp_path, path)
+        return key
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def exists(self, key):
+        return os.path.isfile(self.path(key))
+
+    def stat(self, key):
+        """Return (size, mtime) or None if the object does not exist."""
+        try:
+            result = os.stat(self.path(key))
+        except FileNotFoundError:
+            return None
+        return result.st_size, result.st_mtime
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def list(self, prefix):
+        """Yield (key, size, mtime) for objects directly under prefix."""
+        directory = self.path(prefix)
+        if not os.path.isdir(directory):
+            return
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    yield f"{prefix}/{entry.name}", stat.st_size, stat.st_mtime
+
+    def url(self, key, external=False):
+        return url_for('static', filename=key, _external=external)
+
+    def presigned_upload(self, key, content_type, max_bytes):
+        # Browsers post to the app itself when files are on local disk
+        return None
+
+    @contextmanager
+    def local_copy(self, key):
+        yield self.path(key)
+
+
+class S3Storage:
+    """
+    Keeps uploads in an S3-compatible bucket (AWS S3, MinIO, Ceph, ...).
+
+    Objects are expected to be publicly readable under PUBLIC_URL (a bucket
+    policy or CDN in front of it), so pages and Instagram fetch them directly.
+    Requires boto3.
+    """
+
+    is_local = False
+
+    def __init__(self, endpoint_url, bucket, region=None, access_key=None, secret_key=None,
+                 public_url=None, presign_expires=600):
+        self.endpoint_url = endpoint_url or None
+        self.bucket = bucket
+        self.region = region or None
+        self.access_key = access_key or None
+        self.secret_key = secret_key or None
+        self.public_url = (public_url or f"{(endpoint_url or f'https://{bucket}.s3.amazonaws.com').rstrip('/')}/{bucket}").rstrip('/')
+        self.presign_expires = presign_expires
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            try:
+                import boto3
+                from botocore.config import Config
+            except ImportError:
+                raise RuntimeError("The s3 storage backend requires boto3 (poetry install --extras s3)")
+            self._client = boto3.client(
+                's3',
+                endpoint_url=self.endpoint_url,
+                region_name=self.region,
+                aws_access_key_id=self.access_key,
+                aws_secret_access_key=self.secret_key,
+                config=Config(signature_version='s3v4', s3={'addressing_style': 'path'}),
+            )
+        return self._client
+
+    def _missing(self, error):
+        return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    def save(self, fileobj, key, content_type=None):
+        content_type = content_type or mimetypes.guess_type(key)[0] or 'application/octet-stream'
+        # upload_fileobj streams in multipart chunks instead of buffering the whole file
+        self.client.upload_fileobj(fileobj, self.bucket, key, ExtraArgs={'ContentType': content_type})
+        return key
+
+    def open(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=key)['Body']
+
+    def exists(self, key):
+        return self.stat(key) is not None
+
+    def stat(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if self._missing(e):
+                return None
+            raise
+        return head['ContentLength'], head['LastModified'].timestamp()
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+        return True
+
+    def list(self, prefix):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{prefix}/", Delimiter='/'):
+            for item in page.get('Contents', []):
+                yield item['Key'], item['Size'], item['LastModified'].timestamp()
+
+    def url(self, key, external=False):
+        return f"{self.public_url}/{key}"
+
+    def presigned_upload(self, key, content_type, max_bytes):
+        return self.client.generate_presigned_post(
+            self.bucket, key,
+            Fields={'Content-Type': content_type},
+            Conditions=[{'Content-Type': content_type}, ['content-length-range', 1, max_bytes]],
+            ExpiresIn=self.presign_expires,
+        )
+
+    @contextmanager
+    def local_copy(self, key):
+        # Image processing and social uploads need a real file; fetch a temporary one
+        suffix = os.path.splitext(key)[1]
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp_file:
+            self.client.download_fileobj(self.bucket, key, tmp_file)
+        try:
+            yield tmp_file.name
+        finally:
+            os.remove(tmp_file.name)
+
+
+class Storage:
+    """
+    Where uploaded images and their derivatives live.
+
+    Keys are paths relative to the static folder ('images/verifications/<uuid>.jpg'),
+    which is also what the database stores, so switching backends only means
+    copying the files. [storage] BACKEND selects "local" (the default) or "s3".
+    With a remote backend, requests for uploads under /static/ are redirected
+    to the object's public URL so existing links keep working.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        settings = app.config.get('storage', {})
+        backend = settings.get('BACKEND', 'local')
+        if backend == 's3':
+            self.backend = S3Storage(
+                endpoint_url=settings.get('S3_ENDPOINT_URL'),
+                bucket=settings['S3_BUCKET'],
+                region=settings.get('S3_REGION'),
+                access_key=settings.get('S3_ACCESS_KEY'),
+                secret_key=settings.get('S3_SECRET_KEY'),
+                public_url=settings.get('S3_PUBLIC_URL'),
+                presign_expires=int(settings.get('PRESIGN_EXPIRES', 600)),
+            )
+            self._redirect_static_uploads(app)
+        elif backend == 'local':
+            self.backend = LocalStorage(app.static_folder)
+        else:
+            raise ValueError(f"Unknown storage backend: {backend}")
+        app.extensions['storage'] = self
+        app.jinja_env.globals['upload_url'] = self.upload_url
+
+    def _redirect_static_uploads(self, app):
+        static_view = app.view_functions['static']
+
+        def static_or_storage(filename):
+            if is_stored_key(storage_key(filename)):
+                response = redirect(self.backend.url(storage_key(filename)))
+                response.headers['Cache-Control'] = 'public, max-age=86400'
+                return response
+            return static_view(filename=filename)
+
+        app.view_functions['static'] = static_or_storage
+
+    def __getattr__(self, name):
+        backend = self.__dict__.get('backend')
+        if backend is None:
+            raise AttributeError(name)
+        return getattr(backend, name)
+
+    def save_image(self, image, key, format='PNG'):
+        """Store a PIL image."""
+        buffer = BytesIO()
+        image.save(buffer, format=format)
+        buffer.seek(0)
+        return self.backend.save(buffer, key, content_type=IMAGE_MIME_TYPES.get(format, 'application/octet-stream'))
+
+    def upload_url(self, stored_value, external=False):
+        """Public URL for a stored image reference, for templates and API payloads."""
+        key = storage_key(stored_value)
+        if key and is_stored_key(key):
+            return self.backend.url(key, external=external)
+        return url_for('static', filename=key, _external=external)
+
+    @contextmanager
+    def source_file(self, key):
+        """A local path for key, whether it is an upload or a shipped static file."""
+        if is_stored_key(key):
+            with self.backend.local_copy(key) as path:
+                yield path
+        else:
+            yield os.path.join(current_app.static_folder, key)
+
+    def source_stat(self, key):
+        if is_stored_key(key):
+            return self.backend.stat(key)
+        try:
+            result = os.stat(os.path.join(current_app.static_folder, key))
+        except FileNotFoundError:
+            return None
+        return result.st_size, result.st_mtime
+
+storage = Storage()
@@ -0,0 +1,260 @@
+// Rendered by main.service_worker from the asset manifest (app/assets.py).
+// VERSION changes whenever a precached file does, which replaces the cache.
+const VERSION = {{ version|tojson }};
+const CACHE_NAME = `questbycycle-${VERSION}`;
+const OFFLINE_URL = {{ offline_url|tojson }};
+
+// The home page plus the static files the templates link to, with hashed names
+const APP_STATIC_RESOURCES = ["/"].concat({{ precache|tojson }});
+
+// Install event
+self.addEventListener("install", (event) => {
+  event.waitUntil(
+    (async () => {
+      const cache = await caches.open(CACHE_NAME);
+      // Cache what we can; one missing file should not leave the cache empty
+      const results = await Promise.allSettled(APP_STATIC_RESOURCES.map((resource) => cache.add(resource)));
+      const failed = results.filter((result) => result.status === "rejected").length;
+      if (failed) {
+        console.error(`Failed to cache ${failed} resources`);
+      } else {
+        console.log("Resources cached successfully!");
+      }
+    })()
+  );
+});
+
+// Activate event
+self.addEventListener("activate", (event) => {
+  event.waitUntil(
+    (async () => {
+      const cacheKeys = await caches.keys();
+      await Promise.all(
+        cacheKeys.map((key) => {
+          if (key !== CACHE_NAME) {
+            console.log(`Deleting old cache: ${key}`);
+            return caches.delete(key);
+          }
+        })
+      );
+      await clients.claim();
+      notifyClientsAboutUpdate();
+      replaySubmissions().catch((error) => console.error("Replaying queued submissions failed:", error));
+    })()
+  );
+});
+
+// Notify clients about the update
+function notifyClientsAboutUpdate() {
+  self.clients.matchAll().then((clients) => {
+    clients.forEach((client) => {
+      client.postMessage({ type: "UPDATE_AVAILABLE" });
+    });
+  });
+}
+
+// Offline submission queue
+//
+// A quest submission that cannot reach the server is kept in IndexedDB with
+// its photo, comment and capture time, and the page is told it was queued.
+// The queue is sent to /quests/submissions/batch when the connection comes
+// back (background sync, a page load or the browser's online event). Every
+// item carries a client_id, so a batch that is sent twice is recorded once.
+const QUEUE_DB = "questbycycle-offline";
+const QUEUE_STORE = "submissions";
+const SYNC_TAG = "replay-submissions";
+const REPLAY_BATCH_SIZE = 10;
+const SUBMIT_PATH = /^\/quests\/(?:quest\/(\d+)\/submit|submit_photo\/(\d+))$/;
+
+function openQueue() {
+  return new Promise((resolve, reject) => {
+    const request = indexedDB.open(QUEUE_DB, 1);
+    request.onupgradeneeded = () => request.result.createObjectStore(QUEUE_STORE, { keyPath: "client_id" });
+    request.onsuccess = () => resolve(request.result);
+    request.onerror = () => reject(request.error);
+  });
+}
+
+function withQueue(mode, work) {
+  return openQueue().then((db) => new Promise((resolve, reject) => {
+    const transaction = db.transaction(QUEUE_STORE, mode);
+    const request = work(transaction.objectStore(QUEUE_STORE));
+    transaction.oncomplete = () => {
+      db.close();
+      resolve(request ? request.result : undefined);
+    };
+    transaction.onerror = () => {
+      db.close();
+      reject(transaction.error);
+    };
+  }));
+}
+
+async function queueSubmission(request, match) {
+  const formData = await request.formData();
+  const photo = formData.get("image") || formData.get("photo");
+  const item = {
+    client_id: crypto.randomUUID(),
+    quest_id: Number(match[1] || match[2]),
+    captured_at: formData.get("captured_at") || new Date().toISOString(),
+    comment: formData.get("verificationComment") || "",
+    upload_id: formData.get("upload_id") || null,
+    photo: photo && photo.size ? photo : null,
+  };
+  await withQueue("readwrite", (store) => store.put(item));
+
+  if (self.registration.sync) {
+    try {
+      await self.registration.sync.register(SYNC_TAG);
+    } catch (error) {
+      // Without background sync the pages trigger the replay when they come online
+    }
+  }
+
+  return new Response(JSON.stringify({
+    success: true,
+    queued: true,
+    message: "You are offline. Your submission was saved and will be sent when you are back online.",
+    redirect_url: "/",
+  }), { headers: { "Content-Type": "application/json" } });
+}
+
+async function submitOrQueue(request, match) {
+  const copy = request.clone();
+  try {
+    return await fetch(request);
+  } catch (error) {
+    return queueSubmission(copy, match);
+  }
+}
+
+async function sendQueuedBatch(batch, csrfToken) {
+  const body = new FormData();
+  body.append("manifest", JSON.stringify(batch.map(({ photo, ...item }) => item)));
+  batch.forEach((item) => {
+    if (item.photo) {
+      body.append(`photo-${item.client_id}`, item.photo, item.photo.name || "photo.jpg");
+    }
+  });
+
+  const response = await fetch("/quests/submissions/batch", {
+    method: "POST",
+    body: body,
+    credentials: "same-origin",
+    headers: { "X-CSRF-Token": csrfToken },
+  });
+  // A redirect means the session expired; keep the queue until the rider logs in again
+  if (!response.ok || response.redirected) {
+    throw new Error(`Batch submit failed with status ${response.status}`);
+  }
+  const data = await response.json();
+
+  // Errors are retried with the next replay; everything else is settled
+  const settled = data.results.filter((result) => result.status !== "error").map((result) => result.client_id);
+  await withQueue("readwrite", (store) => {
+    settled.forEach((clientId) => store.delete(clientId));
+  });
+  return data;
+}
+
+let replaying = null;
+
+function replaySubmissions() {
+  if (!replaying) {
+    replaying = (async () => {
+      const items = await withQueue("readonly", (store) => store.getAll());
+      if (!items.length) {
+        return;
+      }
+      const tokenResponse = await fetch("/refresh-csrf", { credentials: "same-origin" });
+      const { csrf_token: csrfToken } = await tokenResponse.json();
+
+      for (let start = 0; start < items.length; start += REPLAY_BATCH_SIZE) {
+        const data = await sendQueuedBatch(items.slice(start, start + REPLAY_BATCH_SIZE), csrfToken);
+        const clientList = await self.clients.matchAll();
+        clientList.forEach((client) => {
+          client.postMessage({ type: "SUBMISSIONS_REPLAYED", results: data.results, total_points: data.total_points });
+        });
+      }
+    })().finally(() => {
+      replaying = null;
+    });
+  }
+  return replaying;
+}
+
+self.addEventListener("sync", (event) => {
+  if (event.tag === SYNC_TAG) {
+    event.waitUntil(replaySubmissions());
+  }
+});
+
+// Fetch event with offline fallback
+self.addEventListener("fetch", (event) => {
+  const url = new URL(event.request.url);
+  const sameOrigin = url.origin === self.location.origin;
+
+  if (event.request.method === "POST") {
+    const match = sameOrigin && url.pathname.match(SUBMIT_PATH);
+    if (match) {
+      event.respondWith(submitOrQueue(event.request, match));
+    }
+    return;
+  }
+  if (event.request.method !== "GET") {
+    return;
+  }
+
+  if (event.request.mode === "navigate") {
+    // Network first so pages stay current; the cached copy is for offline use
+    event.respondWith(
+      (async () => {
+        try {
+          const networkResponse = await fetch(event.request);
+          if (sameOrigin && networkResponse.ok && url.pathname === "/") {
+            const cache = await caches.open(CACHE_NAME);
+            cache.put(event.request, networkResponse.clone());
+          }
+          return networkResponse;
+        } catch (error) {
+          return (await caches.match(event.request)) || caches.match(OFFLINE_URL);
+        }
+      })()
+    );
+    return;
+  }
+
+  // Only static files are cached; API responses always come from the network
+  if (!sameOrigin || !url.pathname.startsWith("/static/")) {
+    return;
+  }
+
+  event.respondWith(
+    (async () => {
+      try {
+        const cache = await caches.open(CACHE_NAME);
+        const cachedResponse = await cache.match(event.request);
+        if (cachedResponse) {
+          return cachedResponse;
+        }
+        const networkResponse = await fetch(event.request);
+        if (networkResponse.ok) {
+          cache.put(event.request, networkResponse.clone());
+        }
+        return networkResponse;
+      } catch (error) {
+        console.error("Fetch failed; returning offline page instead.", error);
+        return caches.match(OFFLINE_URL);
+      }
+    })()
+  );
+});
+
+// Handle messages from clients
+self.addEventListener("message", (event) => {
+  if (event.data.type === "SKIP_WAITING") {
+    self.skipWaiting();
+  } else if (event.data.type === "REPLAY_SUBMISSIONS") {
+    event.waitUntil(replaySubmissions().catch((error) => console.error("Replaying queued submissions failed:", error)));
+  }
+});
@@ -0,0 +1,100 @@
+from flask.cli import with_appcontext
+from app.models import db, User, Game, Badge, QuestSubmission, Sponsor
+from app.storage import storage, upload_dirs, UPLOAD_NAME
+
+import click
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+GC_BATCH_SIZE = 1000
+
+# Columns that store an uploaded file, either as a bare file name (badges)
+# or as a path relative to static/, sometimes with a /static/ prefix
+REFERENCE_COLUMNS = (
+    QuestSubmission.image_url,
+    User.profile_picture,
+    User.bike_picture,
+    Game.leaderboard_image,
+    Sponsor.logo,
+    Badge.image,
+)
+
+
+def referenced_names(names):
+    """Return the subset of names that some row still points at."""
+    found = set()
+    for column in REFERENCE_COLUMNS:
+        basename = db.func.regexp_replace(column, '^.*/', '')
+        rows = db.session.query(basename).filter(column.isnot(None), basename.in_(names)).distinct()
+        found.update(name for (name,) in rows)
+    return found
+
+
+def scan_uploads(grace_seconds):
+    """Yield (key, name, size) for uuid-named uploads older than the grace period."""
+    cutoff = time.time() - grace_seconds
+    for directory in sorted(upload_dirs()):
+        for key, size, mtime in storage.list(directory.replace(os.sep, '/')):
+            name = key.rsplit('/', 1)[-1]
+            # Uploads are written before the row referencing them is committed
+            if not UPLOAD_NAME.match(name) or mtime > cutoff:
+                continue
+            yield key, name, size
+
+
+def collect_orphaned_uploads(dry_run=True, grace_seconds=24 * 3600, batch_size=GC_BATCH_SIZE):
+    """
+    Remove uploads that no row references any more.
+
+    Files are streamed from the upload store and checked against the
+    database one batch at a time, so neither side is ever loaded whole.
+    Returns a dict with the number of files scanned and removed and the
+    bytes reclaimed.
+    """
+    stats = {'scanned': 0, 'orphaned': 0, 'removed': 0, 'bytes': 0}
+
+    def sweep(batch):
+        in_use = referenced_names([name for _, name, _ in batch])
+        db.session.rollback()
+        for key, name, size in batch:
+            if name in in_use:
+                continue
+            stats['orphaned'] += 1
+            if dry_run:
+                stats['bytes'] += size
+                continue
+            try:
+                storage.delete(key)
+                stats['removed'] += 1
+                stats['bytes'] += size
+            except Exception as e:
+                logger.warning(f"Could not remove orphaned upload {key}: {e}")
+
+    batch = []
+    for item in scan_uploads(grace_seconds):
+        stats['scanned'] += 1
+        batch.append(item)
+        if len(batch) >= batch_size:
+            sweep(batch)
+            batch = []
+    if batch:
+        sweep(batch)
+    return stats
+
+
+@click.command('gc-uploads')
+@click.option('--dry-run/--delete', default=True, help='Only report orphaned files (default) or remove them.')
+@click.option('--grace-hours', default=24, type=float, show_default=True, help='Skip files modified more recently than this.')
+@click.option('--batch-size', default=GC_BATCH_SIZE, type=int, show_default=True, help='File names checked per database query.')
+@with_appcontext
+def gc_uploads_command(dry_run, grace_hours, batch_size):
+    """Find and remove uploaded images that no database row references."""
+    stats = collect_orphaned_uploads(dry_run=dry_run, grace_seconds=grace_hours * 3600, batch_size=batch_size)
+    megabytes = stats['bytes'] / (1024 * 1024)
+    if dry_run:
+        click.echo(f"Scanned {stats['scanned']} uploads: {stats['orphaned']} orphaned, {megabytes:.1f} MB reclaimable (dry run).")
+    else:
+        click.echo(f"Scanned {stats['scanned']} uploads: removed {stats['removed']} of {stats['orphaned']} orphaned, {megabytes:.1f} MB reclaimed.")
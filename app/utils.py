@@ -1,10 +1,10 @@
 from flask import flash, current_app, jsonify, request
-from .models import db, Quest, Badge, Game, UserQuest, User, ShoutBoardMessage, QuestSubmission, UserIP
+from .models import db, Quest, Badge, Game, UserQuest, User, ShoutBoardMessage, QuestSubmission, user_games
+from .derivatives import prewarm_smog_variants
+from .storage import storage, upload_key, badge_image_key
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
-from PIL import Image
 from pytz import utc
-from email.mime.text import MIMEText
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
 
@@ -14,7 +14,6 @@ import csv
 import bleach
 import json
 import base64
-import smtplib
 
 SCOPES = ['https://mail.google.com/']
 
@@ -73,36 +72,22 @@ def save_leaderboard_image(image_file):
         if ext not in ALLOWED_EXTENSIONS:
             raise ValueError("File extension not allowed.")
         filename = secure_filename(f"{uuid.uuid4()}.{ext}")
-        rel_path = os.path.join('images', 'leaderboard', filename)
-        abs_path = os.path.join(current_app.root_path, 'static', rel_path)
+        rel_path = f"images/leaderboard/{filename}"
 
-        leaderboard_images_dir = os.path.join(current_app.root_path, 'static/images/leaderboard')
-        if not os.path.exists(leaderboard_images_dir):
-            os.makedirs(leaderboard_images_dir)
-
-        print(f"Saving file to {abs_path}")
-        image_file.save(abs_path)
-        print(f"File saved successfully to {abs_path}")
+        print(f"Saving file to {rel_path}")
+        storage.save(image_file.stream, rel_path, image_file.mimetype)
+        print(f"File saved successfully to {rel_path}")
         return rel_path
 
     except Exception as e:
         print(f"Error saving leaderboard image: {e}")
         raise ValueError(f"Failed to save image: {str(e)}")
 
-def create_smog_effect(image, smog_level):
-    smog_overlay = Image.new('RGBA', image.size, (169, 169, 169, int(255 * smog_level)))
-    smog_image = Image.alpha_composite(image.convert('RGBA'), smog_overlay)
-    return smog_image
-
-def generate_smoggy_images(image_path, game_id):
+def generate_smoggy_images(image_key, game_id):
     try:
-        original_image = Image.open(image_path)
-
-        for i in range(10):
-            smog_level = i / 9.0
-            smoggy_image = create_smog_effect(original_image, smog_level)
-            smoggy_image.save(os.path.join(current_app.root_path, f'static/images/leaderboard/smoggy_skyline_{game_id}_{i}.png'))
-            print(f"Smoggy image saved: smoggy_skyline_{game_id}_{i}.png")
+        # Render every smog step from one decode so the leaderboard meter is warm on first view
+        keys = prewarm_smog_variants(image_key)
+        print(f"Generated {len(keys)} smog variants for game {game_id}")
     except Exception as e:
         print(f"Error generating smoggy images: {e}")
         raise ValueError(f"Failed to generate smoggy images: {str(e)}")
@@ -175,31 +160,34 @@ def revoke_badge(user_id):
         return False
 
 
+def remove_upload(stored_value):
+    key = upload_key(stored_value)
+    if key:
+        storage.delete(key)  # Remove the old file
+
+
 def save_profile_picture(profile_picture_file, old_filename=None):
     if old_filename:
-        old_path = os.path.join(current_app.root_path, 'static', old_filename)
-        if os.path.exists(old_path):
-            os.remove(old_path)  # Remove the old file
+        remove_upload(old_filename)
 
     ext = profile_picture_file.filename.rsplit('.', 1)[-1]
     filename = secure_filename(f"{uuid.uuid4()}.{ext}")
-    uploads_path = os.path.join(current_app.root_path, 'static', current_app.config['main']['UPLOAD_FOLDER'])
-    if not os.path.exists(uploads_path):
-        os.makedirs(uploads_path)
-    profile_picture_file.save(os.path.join(uploads_path, filename))
-    return os.path.join(current_app.config['main']['UPLOAD_FOLDER'], filename)
+    rel_path = f"{current_app.config['main']['UPLOAD_FOLDER']}/{filename}"
+    return storage.save(profile_picture_file.stream, rel_path, profile_picture_file.mimetype)
 
 
 def save_badge_image(image_file):
     try:
         # Generate a secure filename
         filename = secure_filename(f"{uuid.uuid4()}.png")
-        rel_path = os.path.join('images', 'badge_images', filename)  # No leading slashes
-        abs_path = os.path.join(current_app.root_path, current_app.static_folder, rel_path)
+        rel_path = badge_image_key(filename)  # No leading slashes
 
-        # Save the file
-        image_file.save(abs_path)
-        return filename  # Return the correct relative path from 'static' directory
+        # Save the file; AI badges arrive as PIL images, uploads as form files
+        if hasattr(image_file, 'stream'):
+            storage.save(image_file.stream, rel_path, image_file.mimetype)
+        else:
+            storage.save_image(image_file, rel_path)
+        return filename  # Badges store the bare file name
 
     except Exception as e:
         print(f"Error saving badge image: {e}")
@@ -211,35 +199,23 @@ def save_bicycle_picture(bicycle_picture_file, old_filename=None):
     Save the uploaded bicycle picture, replacing the old one if provided.
     """
     if old_filename:
-        old_path = os.path.join(current_app.root_path, 'static', old_filename)
-        if os.path.exists(old_path):
-            os.remove(old_path)  # Remove the old file
+        remove_upload(old_filename)
 
     ext = bicycle_picture_file.filename.rsplit('.', 1)[-1].lower()
     if ext not in ALLOWED_EXTENSIONS:
         raise ValueError("File extension not allowed.")
     
     filename = secure_filename(f"{uuid.uuid4()}.{ext}")
-    uploads_path = os.path.join(current_app.root_path, 'static', current_app.config['main']['UPLOAD_FOLDER'], 'bicycle_pictures')
-    if not os.path.exists(uploads_path):
-        os.makedirs(uploads_path)
-
-    bicycle_picture_file.save(os.path.join(uploads_path, filename))
-    return os.path.join(current_app.config['main']['UPLOAD_FOLDER'], 'bicycle_pictures', filename)
+    rel_path = f"{current_app.config['main']['UPLOAD_FOLDER']}/bicycle_pictures/{filename}"
+    return storage.save(bicycle_picture_file.stream, rel_path, bicycle_picture_file.mimetype)
 
 
 def save_submission_image(submission_image_file):
     try:
         ext = submission_image_file.filename.rsplit('.', 1)[-1]
         filename = secure_filename(f"{uuid.uuid4()}.{ext}")
-        uploads_dir = os.path.join(current_app.static_folder, 'images', 'verifications')
-        
-        # Ensure the upload directory exists
-        os.makedirs(uploads_dir, exist_ok=True)
-        
-        full_path = os.path.join(uploads_dir, filename)
-        submission_image_file.save(full_path)
-        return os.path.join('images', 'verifications', filename)
+        # Streamed to the upload store without buffering the whole file
+        return storage.save(submission_image_file.stream, f"images/verifications/{filename}", submission_image_file.mimetype)
     except Exception as e:
         current_app.logger.error(f"Failed to save image: {e}")
         raise
@@ -251,39 +227,31 @@ def save_sponsor_logo(image_file, old_filename=None):
         # Secure the filename and generate a unique identifier to avoid collisions
         ext = image_file.filename.rsplit('.', 1)[-1].lower()
         filename = secure_filename(f"{uuid.uuid4()}.{ext}")
-
-        # Define the upload path
-        upload_path = os.path.join(current_app.root_path, 'static/images/sponsors')
-
-        # Ensure the directory exists
-        if not os.path.exists(upload_path):
-            os.makedirs(upload_path)
+        rel_path = f"images/sponsors/{filename}"
 
         # Save the new file
-        file_path = os.path.join(upload_path, filename)
         try:
-            image_file.save(file_path)
+            storage.save(image_file.stream, rel_path, image_file.mimetype)
         except Exception as e:
             raise ValueError(f"Failed to save image: {str(e)}")
 
         # Remove the old file if provided
         if old_filename:
-            old_file_path = os.path.join(current_app.root_path, 'static', old_filename)
-            if os.path.exists(old_file_path):
-                try:
-                    os.remove(old_file_path)
-                except Exception as e:
-                    current_app.logger.error(f"Failed to remove old image: {str(e)}")
+            try:
+                remove_upload(old_filename)
+            except Exception as e:
+                current_app.logger.error(f"Failed to remove old image: {str(e)}")
 
         # Return the relative path to the saved file
-        return os.path.join('images', 'sponsors', filename)
+        return rel_path
 
     else:
         raise ValueError("Invalid file type or no file provided.")
 
 
-def can_complete_quest(user_id, quest_id):
-    now = datetime.now()
+def can_complete_quest(user_id, quest_id, at=None):
+    # at is the capture time for submissions replayed from the offline queue
+    now = at or datetime.now()
     quest = Quest.query.get(quest_id)
     
     if not quest:
@@ -299,40 +267,38 @@ def can_complete_quest(user_id, quest_id):
         'weekly': timedelta(weeks=1),
         'monthly': timedelta(days=30)  # Approximation for monthly
     }
-    period_start = now - period_start_map.get(quest.frequency, timedelta(days=1))
+    period = period_start_map.get(quest.frequency, timedelta(days=1))
+    period_start = now - period
     print(f"Period start calculated as: {period_start}")
 
-    # Count completions in the defined period
-    completions_within_period = QuestSubmission.query.filter(
+    # A replayed capture can land before completions made online after it, so every
+    # window of one period that contains it must stay within the limit, not just the one ending at it
+    timestamps = [timestamp for (timestamp,) in QuestSubmission.query.with_entities(QuestSubmission.timestamp).filter(
         QuestSubmission.user_id == user_id,
         QuestSubmission.quest_id == quest_id,
-        QuestSubmission.timestamp >= period_start
-    ).count()
+        QuestSubmission.timestamp >= period_start,
+        QuestSubmission.timestamp <= now + period
+    ).order_by(QuestSubmission.timestamp.asc())]
+
+    def window(start):
+        return [timestamp for timestamp in timestamps if start <= timestamp <= start + period]
+
+    # The busiest such window starts at one of those earlier completions or at the capture itself
+    window_starts = [timestamp for timestamp in timestamps if timestamp <= now] + [now]
+    busiest_window = max((window(start) for start in window_starts), key=len)
+    completions_within_period = len(busiest_window)
 
     print(f"Completions within period for user {user_id} on quest {quest_id}: {completions_within_period}")
 
     # Check if the user can verify the quest again
     can_verify = completions_within_period < quest.completion_limit
     next_eligible_time = None
-    if not can_verify:
-        first_completion_in_period = QuestSubmission.query.filter(
-            QuestSubmission.user_id == user_id,
-            QuestSubmission.quest_id == quest_id,
-            QuestSubmission.timestamp >= period_start
-        ).order_by(QuestSubmission.timestamp.asc()).first()
-
-        if first_completion_in_period:
-            print(f"First Completion in the period found at: {first_completion_in_period.timestamp}")
-            # Calculate when the user is eligible next, based on the first completion time
-            increment_map = {
-                'daily': timedelta(days=1),
-                'weekly': timedelta(weeks=1),
-                'monthly': timedelta(days=30)
-            }
-            next_eligible_time = first_completion_in_period.timestamp + increment_map.get(quest.frequency, timedelta(days=1))
-            print(f"Next eligible time calculated as: {next_eligible_time}")
-        else:
-            print("No completions found within the period.")
+    if not can_verify and busiest_window:
+        first_completion_in_period = busiest_window[0]
+        print(f"First Completion in the period found at: {first_completion_in_period}")
+        # Calculate when the user is eligible next, based on the first completion time
+        next_eligible_time = first_completion_in_period + period
+        print(f"Next eligible time calculated as: {next_eligible_time}")
     else:
         print("User can currently verify the quest.")
 
@@ -367,6 +333,40 @@ def getLastRelevantCompletionTime(user_id, quest_id):
     return last_relevant_completion.timestamp if last_relevant_completion else None
 
 
+def quest_eligibility(user_id, quest, now=None):
+    """
+    can_complete_quest() and getLastRelevantCompletionTime() in one query,
+    for a quest that is already loaded. Returns (can_verify,
+    next_eligible_time, last_relevant_completion_time).
+    """
+    now = now or datetime.now()
+    period = {
+        'daily': timedelta(days=1),
+        'weekly': timedelta(weeks=1),
+        'monthly': timedelta(days=30)
+    }
+    period_start = now - period.get(quest.frequency, timedelta(days=1))
+    # getLastRelevantCompletionTime only looks back for known frequencies
+    relevant_start = now - period[quest.frequency] if quest.frequency in period else now
+
+    in_period = QuestSubmission.timestamp >= period_start
+    completions_within_period, first_completion_in_period, last_relevant_completion = db.session.query(
+        db.func.count(QuestSubmission.id).filter(in_period),
+        db.func.min(QuestSubmission.timestamp).filter(in_period),
+        db.func.max(QuestSubmission.timestamp).filter(QuestSubmission.timestamp >= relevant_start),
+    ).filter(
+        QuestSubmission.user_id == user_id,
+        QuestSubmission.quest_id == quest.id,
+        QuestSubmission.timestamp >= min(period_start, relevant_start)
+    ).one()
+
+    can_verify = completions_within_period < quest.completion_limit
+    next_eligible_time = None
+    if not can_verify and first_completion_in_period:
+        next_eligible_time = first_completion_in_period + period.get(quest.frequency, timedelta(days=1))
+    return can_verify, next_eligible_time, last_relevant_completion
+
+
 def check_and_award_badges(user_id, quest_id, game_id):
     print(f"Checking and awarding badges for user_id={user_id}, quest_id={quest_id}")
     user = User.query.get(user_id)
@@ -488,55 +488,96 @@ def generate_oauth2_string(username, access_token):
     return base64.b64encode(auth_string.encode('utf-8')).decode('utf-8')
 
 
-def send_email(to, subject, html_content):
-    creds = load_credentials()
-    if not creds:
-        current_app.logger.error('Failed to load credentials.')
-        return False
+def send_email(to, subject, html_content, commit=True):
+    """
+    Queue an email in the outbox; the mailer delivers it in the background.
+    With commit=False the email is sent only if the caller's transaction commits.
+    """
+    from app.mailer import mailer
 
-    # Ensure credentials are valid and refresh them if necessary
-    creds = refresh_credentials(creds)
-    if not creds or not creds.valid:
-        current_app.logger.error('Invalid or expired credentials.')
-        return False
+    mailer.enqueue(to, subject, html_content, commit=commit)
+    return True
 
-    access_token = creds.token
-    auth_string = generate_oauth2_string(current_app.config['MAIL_USERNAME'], access_token)
 
-    # Create the email message
-    msg = MIMEText(html_content, 'html')
-    msg['Subject'] = subject
-    msg['From'] = current_app.config['MAIL_DEFAULT_SENDER']
-    msg['To'] = to
+# Current quarter's tutorial game id, so login and registration never look it up
+_tutorial_game_cache = {'id': None, 'expires': None}
+TUTORIAL_GAME_CACHE_SECONDS = 3600
+TUTORIAL_SCHEDULER_INTERVAL = 6 * 3600
+TUTORIAL_LOCK_KEY = 0x7475746f
 
-    try:
-        # Connect to Gmail SMTP server
-        smtp_server = smtplib.SMTP('smtp.gmail.com', 587)
-        smtp_server.ehlo()
-        smtp_server.starttls()
-        smtp_server.ehlo()
-
-        # Authenticate using OAuth2
-        smtp_server.docmd('AUTH', 'XOAUTH2 ' + auth_string)
-
-        # Send the email
-        smtp_server.sendmail(msg['From'], [to], msg.as_string())
-        smtp_server.quit()
-        current_app.logger.info('Email sent successfully.')
-        return True
-    except Exception as e:
-        current_app.logger.error(f'Failed to send email: {e}')
-        return False
+
+def get_tutorial_game_id():
+    now = datetime.now()
+    if _tutorial_game_cache['expires'] and now < _tutorial_game_cache['expires']:
+        return _tutorial_game_cache['id']
+
+    game = Game.query.filter(
+        Game.is_tutorial.is_(True), Game.start_date <= now, Game.end_date >= now
+    ).order_by(Game.start_date.desc()).first()
+
+    if game:
+        # Never cache past the end of the quarter so the next game takes over on time
+        expires = min(game.end_date, now + timedelta(seconds=TUTORIAL_GAME_CACHE_SECONDS))
+        _tutorial_game_cache.update(id=game.id, expires=expires)
+        return game.id
+
+    _tutorial_game_cache.update(id=None, expires=now + timedelta(seconds=60))
+    return None
+
+
+def clear_tutorial_game_cache():
+    _tutorial_game_cache.update(id=None, expires=None)
 
 
-def generate_tutorial_game():
-    current_quarter = (datetime.now().month - 1) // 3 + 1
-    year = datetime.now().year
+def join_tutorial_game(user):
+    """Add user to the current tutorial game without loading it; the caller commits."""
+    tutorial_game_id = get_tutorial_game_id()
+    if tutorial_game_id:
+        db.session.execute(user_games.insert().values(user_id=user.id, game_id=tutorial_game_id))
+    return tutorial_game_id
+
+
+def ensure_tutorial_games():
+    """Create this quarter's and next quarter's tutorial games if they are missing."""
+    today = datetime.now()
+    next_quarter_start = datetime(today.year + (today.month > 9), (((today.month - 1) // 3 + 1) % 4) * 3 + 1, 1)
+
+    # Several app processes start at once; only one of them should do the import.
+    # The lock lives on its own connection because generate_tutorial_game commits.
+    with db.engine.connect() as lock_conn:
+        lock_conn.execute(db.text('SELECT pg_advisory_lock(:key)'), {'key': TUTORIAL_LOCK_KEY})
+        try:
+            for when in (today, next_quarter_start):
+                generate_tutorial_game(when)
+        finally:
+            lock_conn.execute(db.text('SELECT pg_advisory_unlock(:key)'), {'key': TUTORIAL_LOCK_KEY})
+    clear_tutorial_game_cache()
+
+
+def schedule_tutorial_games(app):
+    from app import socketio
+
+    while True:
+        with app.app_context():
+            try:
+                ensure_tutorial_games()
+            except Exception as e:
+                current_app.logger.error(f'Failed to provision tutorial games: {e}')
+                db.session.rollback()
+            finally:
+                db.session.remove()
+        socketio.sleep(TUTORIAL_SCHEDULER_INTERVAL)
+
+
+def generate_tutorial_game(when=None):
+    when = when or datetime.now()
+    current_quarter = (when.month - 1) // 3 + 1
+    year = when.year
     title = f"Tutorial Game - Q{current_quarter} {year}"
 
     existing_game = Game.query.filter_by(is_tutorial=True, title=title).first()
     if existing_game:
-        return  # Just return, do nothing if the game already exists
+        return existing_game
 
     description = """
     Welcome to the newest Tutorial Game! Embark on a quest to create a more sustainable future while enjoying everyday activities, having fun, and fostering teamwork in the real-life battle against climate change.
@@ -650,11 +691,11 @@ def import_quests_and_badges_from_csv(game_id, csv_path):
                 else:
                     badge_image_filename = f"{badge_name.lower().replace(' ', '_')}.png"
                 
-                badge_image_path = os.path.join(current_app.static_folder, 'images', 'badge_images', badge_image_filename)
+                badge_image_path = badge_image_key(badge_image_filename)
 
                 print(f"Badge details - Name: {badge_name}, Description: {badge_description}, Image Path: {badge_image_path}")
 
-                if not os.path.exists(badge_image_path):
+                if storage.source_stat(badge_image_path) is None:
                     print(f"Badge image not found at {badge_image_path}, skipping badge creation")
                     continue
 
@@ -693,15 +734,10 @@ def import_quests_and_badges_from_csv(game_id, csv_path):
 
 
 def log_user_ip(user):
-    # Check if this IP address is already stored for this user
-    ip_address = request.remote_addr
-    existing_ip = UserIP.query.filter_by(user_id=user.id, ip_address=ip_address).first()
-
-    if not existing_ip:
-        # Only log the IP if it's not already stored
-        new_ip = UserIP(user_id=user.id, ip_address=ip_address)
-        db.session.add(new_ip)
-        db.session.commit()
+    # Buffered; the IP log writer upserts it in the background
+    from app.ip_log import ip_log
+
+    ip_log.record(user.id, request.remote_addr)
 
 
 def get_game_badges(game_id):
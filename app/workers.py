@@ -0,0 +1,303 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash
+from PIL import Image, ExifTags, ImageDraw, ImageFont
+from io import BytesIO
+
+import gzip
+import multiprocessing
+import threading
+import logging
+import time
+import os
+import qrcode
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class PoolBusyError(RuntimeError):
+    """Raised when the process pool already has its maximum number of pending jobs."""
+
+
+class ProcessPool:
+    """
+    Runs CPU-bound work (image resizing, QR rendering, password hashing) in
+    worker processes so the gevent hub keeps serving other connections.
+
+    Jobs are bounded by MAX_PENDING; once that many are queued or running,
+    new submissions are rejected with PoolBusyError instead of piling up.
+    A job that timed out still counts until its worker process finishes it.
+    Setting PROCESSES to 0 runs every job inline, which is handy for local
+    debugging.
+    """
+
+    def __init__(self, app=None):
+        self.max_workers = 2
+        self.max_pending = 16
+        self.timeout = 30
+        self.start_method = 'fork'
+        self._executor = None
+        self._owner_pid = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._metrics = self._empty_metrics()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        settings = app.config.get('workers', {})
+        self.max_workers = int(settings.get('PROCESSES', self.max_workers))
+        self.max_pending = int(settings.get('MAX_PENDING', self.max_pending))
+        self.timeout = float(settings.get('TIMEOUT', self.timeout))
+        self.start_method = settings.get('START_METHOD', self.start_method)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        app.extensions['process_pool'] = self
+
+    @staticmethod
+    def _empty_metrics():
+        return {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'timed_out': 0,
+            'rejected': 0,
+            'in_flight': 0,
+            'total_seconds': 0.0,
+            'max_seconds': 0.0,
+        }
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._metrics[key] += amount
+
+    def _get_executor(self):
+        # Executors do not survive a fork, so each gunicorn worker gets its own.
+        if self._executor is None or self._owner_pid != os.getpid():
+            context = multiprocessing.get_context(self.start_method)
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+            self._owner_pid = os.getpid()
+        return self._executor
+
+    def _reset_executor(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+    def run(self, fn, *args, timeout=None):
+        """Run fn(*args) in a worker process and return its result."""
+        if self.max_workers <= 0:
+            return fn(*args)
+
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            logger.warning(f"Process pool saturated, rejecting {fn.__name__}")
+            raise PoolBusyError(f"Too many pending jobs ({self.max_pending})")
+
+        self._count('submitted')
+        self._count('in_flight')
+        started = time.monotonic()
+        try:
+            try:
+                future = self._get_executor().submit(fn, *args)
+            except BaseException:
+                self._slots.release()
+                raise
+            # The slot is held until the job really ends: cancel() cannot stop a job that
+            # is already running, so a timed-out job keeps its worker busy until it returns.
+            future.add_done_callback(lambda finished: self._slots.release())
+            try:
+                result = future.result(timeout=timeout or self.timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                self._count('timed_out')
+                logger.error(f"Process pool job {fn.__name__} timed out")
+                raise
+            except BrokenProcessPool:
+                self._count('failed')
+                self._reset_executor()
+                raise
+            except Exception:
+                self._count('failed')
+                raise
+            self._count('completed')
+            return result
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._metrics['in_flight'] -= 1
+                self._metrics['total_seconds'] += elapsed
+                self._metrics['max_seconds'] = max(self._metrics['max_seconds'], elapsed)
+
+    def metrics(self):
+        with self._lock:
+            snapshot = dict(self._metrics)
+        finished = snapshot['completed'] + snapshot['failed'] + snapshot['timed_out']
+        snapshot['avg_seconds'] = snapshot['total_seconds'] / finished if finished else 0.0
+        snapshot['max_workers'] = self.max_workers
+        snapshot['max_pending'] = self.max_pending
+        return snapshot
+
+    def shutdown(self):
+        if self._executor is not None and self._owner_pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+
+process_pool = ProcessPool()
+
+
+# The functions below run inside the worker processes. They must stay at
+# module level (so they can be pickled) and must not touch the Flask app,
+# the database or the request context.
+
+def hash_password(password):
+    return generate_password_hash(password)
+
+
+def verify_password(password_hash, password):
+    return check_password_hash(password_hash, password)
+
+
+def render_qr_png(data):
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="white", back_color="black")
+    img_buffer = BytesIO()
+    img.save(img_buffer, format="PNG")
+    return img_buffer.getvalue()
+
+
+def _load_font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 only ships the fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def render_qr_sheet_pdf(entries, columns=2, rows=3):
+    """
+    Lay out QR codes on US Letter pages (150 dpi) and return the PDF bytes.
+
+    entries is a list of dicts with 'title', 'caption' and 'qr_path' keys.
+    """
+    page_width, page_height = 1275, 1650
+    margin = 75
+    cell_width = (page_width - 2 * margin) // columns
+    cell_height = (page_height - 2 * margin) // rows
+    qr_size = min(cell_width, cell_height) - 140
+    title_font = _load_font(28)
+    caption_font = _load_font(22)
+
+    pages = []
+    per_page = columns * rows
+    for page_start in range(0, max(len(entries), 1), per_page):
+        page = Image.new('RGB', (page_width, page_height), 'white')
+        draw = ImageDraw.Draw(page)
+        for index, entry in enumerate(entries[page_start:page_start + per_page]):
+            left = margin + (index % columns) * cell_width
+            top = margin + (index // columns) * cell_height
+            with Image.open(entry['qr_path']) as qr_img:
+                qr_img = qr_img.convert('RGB').resize((qr_size, qr_size), Image.Resampling.NEAREST)
+                page.paste(qr_img, (left + (cell_width - qr_size) // 2, top))
+            text_top = top + qr_size + 10
+            draw.text((left + cell_width // 2, text_top), entry['title'][:60], fill='black', font=title_font, anchor='ma')
+            draw.text((left + cell_width // 2, text_top + 40), entry['caption'][:70], fill='black', font=caption_font, anchor='ma')
+        pages.append(page)
+
+    pdf_io = BytesIO()
+    pages[0].save(pdf_io, 'PDF', resolution=150.0, save_all=True, append_images=pages[1:])
+    return pdf_io.getvalue()
+
+
+def _apply_exif_orientation(img):
+    try:
+        for orientation in ExifTags.TAGS.keys():
+            if ExifTags.TAGS[orientation] == 'Orientation':
+                break
+
+        exif = img._getexif()
+        if exif is not None:
+            orientation_value = exif.get(orientation)
+
+            if orientation_value == 3:
+                img = img.rotate(180, expand=True)
+            elif orientation_value == 6:
+                img = img.rotate(-90, expand=True)
+            elif orientation_value == 8:
+                img = img.rotate(90, expand=True)
+    except (AttributeError, KeyError, IndexError):
+        # No EXIF orientation data, proceed without altering the image
+        pass
+    return img
+
+
+def resize_to_webp(full_image_path, width):
+    with Image.open(full_image_path) as img:
+        img = _apply_exif_orientation(img)
+
+        # Calculate the height to maintain aspect ratio
+        ratio = width / float(img.width)
+        height = int(img.height * ratio)
+
+        img_resized = img.resize((width, height), Image.Resampling.LANCZOS)
+
+        if img_resized.mode in ('RGBA', 'LA') or (img_resized.mode == 'P' and 'transparency' in img_resized.info):
+            img_resized = img_resized.convert('RGBA')
+        else:
+            img_resized = img_resized.convert('RGB')
+
+        img_io = BytesIO()
+        img_resized.save(img_io, 'WEBP')
+        return img_io.getvalue()
+
+
+SMOG_COLOR = (169, 169, 169)
+
+
+def blend_smog_levels(image_path, levels, width=None):
+    """
+    Decode image_path once and return one WebP-encoded image per smog level.
+
+    Each level (0.0 - 1.0) is the alpha of a flat grey overlay composited over
+    the image, matching what Image.alpha_composite produced per level before.
+    """
+    with Image.open(image_path) as img:
+        img = img.convert('RGBA')
+        if width and width < img.width:
+            height = int(img.height * (width / float(img.width)))
+            img = img.resize((width, height), Image.Resampling.LANCZOS)
+        pixels = np.asarray(img, dtype=np.float32) / 255.0
+
+    rgb = pixels[..., :3]
+    alpha = pixels[..., 3:]
+    smog = np.array(SMOG_COLOR, dtype=np.float32) / 255.0
+
+    results = []
+    for level in levels:
+        level = min(max(float(level), 0.0), 1.0)
+        # Porter-Duff "over" with a uniform overlay alpha
+        out_alpha = level + alpha * (1.0 - level)
+        out_rgb = (smog * level + rgb * alpha * (1.0 - level)) / np.maximum(out_alpha, 1e-6)
+        blended = np.concatenate((out_rgb, out_alpha), axis=-1)
+        blended = np.clip(blended * 255.0 + 0.5, 0, 255).astype(np.uint8)
+
+        img_io = BytesIO()
+        Image.fromarray(blended, 'RGBA').save(img_io, 'WEBP', quality=80, method=4)
+        results.append(img_io.getvalue())
+    return results
+
+
+def compress_bytes(data, encoding, level):
+    """Compress a response body with gzip or brotli."""
+    if encoding == 'br':
+        import brotli
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
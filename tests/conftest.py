@@ -0,0 +1,37 @@
+import os
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.toml')
+
+
+@pytest.fixture(scope='session')
+def app():
+    if not os.path.exists(CONFIG_PATH):
+        pytest.skip('config.toml is required to build the app')
+
+    from app import create_app
+    from app.models import db
+
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        try:
+            db.session.execute(db.text('SELECT 1'))
+        except OperationalError:
+            pytest.skip('the configured database is not reachable')
+        finally:
+            db.session.rollback()
+    return app
+
+
+@pytest.fixture
+def app_context(app):
+    from app.models import db
+
+    with app.app_context():
+        yield
+        db.session.rollback()
+        db.session.remove()
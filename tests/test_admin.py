@@ -0,0 +1,76 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app.models import db, Announcement, Game, User
+
+
+@pytest.fixture
+def records(app_context):
+    """A game, its admin, an admin of nothing in particular and one announcement."""
+    tag = uuid.uuid4().hex[:8]
+    owner, stranger = [
+        User(username=f'admin-test-{tag}-{n}', email=f'admin-test-{tag}-{n}@example.com', license_agreed=True, is_admin=True)
+        for n in range(2)
+    ]
+    db.session.add_all([owner, stranger])
+    db.session.flush()
+    game = Game(title=f'Admin test {tag}', admin_id=owner.id)
+    db.session.add(game)
+    db.session.flush()
+    announcement = Announcement(game_id=game.id, author_id=owner.id, subject='Hello', body='Ride on')
+    db.session.add(announcement)
+    db.session.commit()
+
+    yield SimpleNamespace(owner=owner, stranger=stranger, game=game, announcement=announcement)
+
+    db.session.rollback()
+    Announcement.query.filter_by(game_id=game.id).delete(synchronize_session=False)
+    Game.query.filter_by(id=game.id).delete(synchronize_session=False)
+    User.query.filter(User.id.in_([owner.id, stranger.id])).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def client_for(app, user):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    return client
+
+
+def test_announcements_are_limited_to_the_games_admin(app, records):
+    client = client_for(app, records.stranger)
+
+    assert client.get(f'/admin/announcements/{records.game.id}').status_code == 403
+    response = client.post(f'/admin/announcements/{records.game.id}', data={'subject': 'Spam', 'body': 'Spam'})
+    assert response.status_code == 403
+    assert Announcement.query.filter_by(game_id=records.game.id).count() == 1
+    assert client.get(f'/admin/announcements/status/{records.announcement.id}').status_code == 403
+
+
+def test_games_admin_sees_announcements(app, records):
+    client = client_for(app, records.owner)
+
+    assert client.get(f'/admin/announcements/{records.game.id}').status_code == 200
+    response = client.get(f'/admin/announcements/status/{records.announcement.id}')
+    assert response.status_code == 200
+    assert response.get_json()['id'] == records.announcement.id
+
+
+def test_deletion_jobs_are_for_super_admins(app, records):
+    client = client_for(app, records.owner)
+
+    assert client.get('/admin/deletion_jobs').status_code == 302
+    assert client.get('/admin/deletion_jobs/1').status_code == 302
+
+
+def test_qr_sheet_is_limited_to_the_games_admin(app, records):
+    url = f'/quests/game/{records.game.id}/qr_sheet'
+
+    # Each request gets its own app context, so the logged-in user is not reused from g
+    with app.app_context():
+        assert client_for(app, records.stranger).get(url).status_code == 302
+    with app.app_context():
+        assert client_for(app, records.owner).get(url).status_code == 200
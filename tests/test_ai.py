@@ -0,0 +1,202 @@
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from flask_login import login_user
+from pytz import utc
+
+import app.ai as ai
+from app import socketio
+from app.models import db, AIGenerationJob, Game, QuestDraft, QuestDraftBatch, User
+
+QUEST_TEXT = """
+Category: Environment
+Title: Ride to the Farmers Market
+Description: Cycle to a local farmers market and buy something grown nearby.
+Tips: Bring a pannier.
+Points (num): 150
+Completion Limit (num): 9
+Frequency: Weekly
+Verification Type (choice): photo
+Badge Name: Market Rider
+Badge Description: A bicycle loaded with vegetables.
+"""
+
+
+class FakeOpenAI:
+    """Stands in for the OpenAI client and answers chat completions from a script."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.prompts = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages):
+        self.prompts.append(messages[-1]['content'])
+        message = SimpleNamespace(content=self.replies.pop(0))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@pytest.fixture
+def records(app_context):
+    """A user and two games to hang jobs on, removed with their jobs afterwards."""
+    tag = uuid.uuid4().hex[:8]
+    user = User(username=f'ai-test-{tag}', email=f'ai-test-{tag}@example.com', license_agreed=True)
+    db.session.add(user)
+    db.session.flush()
+    games = [Game(title=f'AI test {tag} {n}', admin_id=user.id) for n in range(2)]
+    db.session.add_all(games)
+    db.session.commit()
+
+    yield SimpleNamespace(user=user, games=games)
+
+    db.session.rollback()
+    AIGenerationJob.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+    QuestDraftBatch.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+    Game.query.filter(Game.id.in_([g.id for g in games])).delete(synchronize_session=False)
+    User.query.filter_by(id=user.id).delete(synchronize_session=False)
+    db.session.commit()
+
+
+@pytest.fixture
+def emitted(monkeypatch):
+    events = []
+    monkeypatch.setattr(socketio, 'emit', lambda event, data, room=None: events.append((event, data, room)))
+    return events
+
+
+def queue_job(records, prompt='a ride to the market'):
+    job = AIGenerationJob(
+        kind='quest', user_id=records.user.id, game_id=records.games[0].id,
+        prompt=prompt, prompt_key=ai.prompt_cache_key('quest', prompt)
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def test_run_ai_job_stores_the_generated_quest(app, records, emitted, monkeypatch):
+    client = FakeOpenAI(QUEST_TEXT, 'True.')
+    monkeypatch.setattr(ai, 'openai_client', lambda: client)
+    job_id = queue_job(records)
+
+    ai.run_ai_job(app, job_id, 'sid-1')
+
+    job = db.session.get(AIGenerationJob, job_id)
+    assert job.status == 'done'
+    assert job.progress == 100
+    assert job.finished_at is not None
+    assert job.result['Title'] == 'Ride to the Farmers Market'
+    assert job.result['Completion Limit'] == 1
+    assert 'a ride to the market' in client.prompts[0]
+
+    event, payload, room = emitted[-1]
+    assert (event, room) == ('ai_job_update', 'sid-1')
+    assert payload['status'] == 'done'
+    assert f'data-game-id="{records.games[0].id}"' in payload['generated_quest_html']
+
+
+def test_run_ai_job_fails_quests_that_are_not_about_cycling(app, records, emitted, monkeypatch):
+    monkeypatch.setattr(ai, 'openai_client', lambda: FakeOpenAI(QUEST_TEXT, 'False'))
+    job_id = queue_job(records)
+
+    ai.run_ai_job(app, job_id, None)
+
+    job = db.session.get(AIGenerationJob, job_id)
+    assert job.status == 'failed'
+    assert job.error == 'Generated quest is not bicycle-related.'
+    assert job.result is None
+    assert emitted == []
+
+
+def test_cached_quest_renders_for_the_requesting_game(app, records, emitted, monkeypatch):
+    monkeypatch.setattr(ai, 'openai_client', lambda: FakeOpenAI(QUEST_TEXT, 'True'))
+    job_id = queue_job(records)
+    ai.run_ai_job(app, job_id, None)
+    other_game_id = records.games[1].id
+
+    with app.test_request_context():
+        job = db.session.get(AIGenerationJob, job_id)
+        assert f'data-game-id="{records.games[0].id}"' in ai.job_payload(job)['generated_quest_html']
+
+        response, status = ai.start_ai_job('quest', '  A RIDE to the market ', game_id=other_game_id)
+
+    assert status == 200
+    payload = response.get_json()
+    assert payload['job_id'] == job_id
+    assert f'data-game-id="{other_game_id}"' in payload['generated_quest_html']
+
+
+def queue_batch(records, *descriptions, **fields):
+    batch = QuestDraftBatch(game_id=records.games[0].id, user_id=records.user.id, total=len(descriptions), **fields)
+    batch.drafts = [QuestDraft(position=n, description=d) for n, d in enumerate(descriptions)]
+    db.session.add(batch)
+    db.session.commit()
+    return batch.id
+
+
+def test_run_quest_batch_finishes_every_draft(app, records, emitted, monkeypatch):
+    monkeypatch.setitem(app.config, 'AI_BATCH_CONCURRENCY', 1)
+    client = FakeOpenAI(QUEST_TEXT, 'True', QUEST_TEXT, 'No')
+    monkeypatch.setattr(ai, 'openai_client', lambda: client)
+    batch_id = queue_batch(records, 'market ride', 'commute')
+
+    ai.run_quest_batch(app, batch_id, None)
+
+    batch = db.session.get(QuestDraftBatch, batch_id)
+    db.session.refresh(batch)
+    assert batch.status == 'done'
+    assert (batch.completed, batch.failed) == (1, 1)
+    assert sorted(draft.status for draft in batch.drafts) == ['failed', 'ready']
+
+
+def test_stale_running_batch_is_failed(app, records):
+    batch_id = queue_batch(records, 'market ride', status='running',
+                           created_at=datetime.now(utc) - timedelta(seconds=app.config['AI_JOB_TIMEOUT'] + 60))
+    batch = db.session.get(QuestDraftBatch, batch_id)
+
+    assert ai.expire_stale_batch(batch)
+    assert batch.status == 'done'
+    assert batch.failed == 1
+    assert batch.drafts[0].error == ai.INTERRUPTED_DRAFT_ERROR
+
+
+def test_recent_running_batch_is_left_alone(app, records):
+    batch = db.session.get(QuestDraftBatch, queue_batch(records, 'market ride', status='running'))
+
+    assert not ai.expire_stale_batch(batch)
+    assert batch.status == 'running'
+
+
+def test_parallel_requests_cannot_pass_the_job_cap(app, records, monkeypatch):
+    monkeypatch.setitem(app.config, 'AI_MAX_JOBS_PER_USER', 1)
+    monkeypatch.setattr(socketio, 'start_background_task', lambda *args: None)
+    count_jobs = ai.active_job_count
+
+    def slow_count(user_id):
+        # Widen the gap between counting and inserting
+        count = count_jobs(user_id)
+        time.sleep(0.3)
+        return count
+    monkeypatch.setattr(ai, 'active_job_count', slow_count)
+
+    user_id = records.user.id
+    statuses = []
+
+    def request_job(n):
+        with app.test_request_context():
+            login_user(db.session.get(User, user_id))
+            statuses.append(ai.start_ai_job('quest', f'parallel ride {uuid.uuid4().hex} {n}')[1])
+            db.session.remove()
+
+    threads = [threading.Thread(target=request_job, args=(n,)) for n in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(statuses) == [202, 429]
+    assert AIGenerationJob.query.filter_by(user_id=user_id).count() == 1
@@ -0,0 +1,64 @@
+import uuid
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app.models import db, User, user_games
+from app.workers import PoolBusyError, process_pool
+
+PASSWORD = 'correct horse battery'
+
+
+@pytest.fixture
+def user(app_context):
+    tag = uuid.uuid4().hex[:8]
+    user = User(username=f'auth-test-{tag}', email=f'auth-test-{tag}@example.com', license_agreed=True,
+                email_verified=True, password_hash=generate_password_hash(PASSWORD))
+    db.session.add(user)
+    db.session.commit()
+    yield user
+    db.session.rollback()
+    db.session.execute(user_games.delete().where(user_games.c.user_id == user.id))
+    User.query.filter_by(id=user.id).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def reject(fn, *args, **kwargs):
+    raise PoolBusyError('Too many pending jobs')
+
+
+@pytest.fixture
+def busy_pool(monkeypatch):
+    monkeypatch.setattr(process_pool, 'run', reject)
+
+
+def test_login_answers_503_when_hashing_pool_is_busy(app, user, busy_pool):
+    response = app.test_client().post('/auth/login', data={'email': user.email, 'password': PASSWORD})
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+
+def test_register_answers_503_when_hashing_pool_is_busy(app, app_context, busy_pool):
+    email = f'auth-test-{uuid.uuid4().hex[:8]}@example.com'
+    response = app.test_client().post('/auth/register', data={
+        'email': email, 'password': PASSWORD, 'confirm_password': PASSWORD, 'accept_license': 'y'
+    })
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert User.query.filter_by(email=email).first() is None
+
+
+def test_update_password_answers_503_when_hashing_pool_is_busy(app, user, monkeypatch):
+    monkeypatch.setattr(process_pool, 'run', lambda fn, *args, **kwargs: fn(*args, **kwargs))
+    client = app.test_client()
+    assert client.post('/auth/login', data={'email': user.email, 'password': PASSWORD}).status_code == 302
+
+    monkeypatch.setattr(process_pool, 'run', reject)
+    response = client.post('/auth/update_password', data={
+        'current_password': PASSWORD, 'new_password': 'another password', 'confirm_password': 'another password'
+    })
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
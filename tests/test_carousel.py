@@ -0,0 +1,44 @@
+import uuid
+
+import pytest
+
+from app.assets import stored_static_url
+from app.carousel import Carousel
+from app.models import db, Game, Quest, QuestSubmission, User
+
+
+@pytest.fixture
+def quest(app_context):
+    tag = uuid.uuid4().hex[:8]
+    user = User(username=f'carousel-test-{tag}', email=f'carousel-test-{tag}@example.com', license_agreed=True)
+    db.session.add(user)
+    db.session.flush()
+    game = Game(title=f'Carousel test {tag}', admin_id=user.id)
+    db.session.add(game)
+    db.session.flush()
+    quest = Quest(title='Photo ride', game_id=game.id, points=10, completion_limit=5, frequency='daily', enabled=True)
+    db.session.add(quest)
+    db.session.commit()
+
+    yield quest, user
+
+    db.session.rollback()
+    QuestSubmission.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+    Quest.query.filter_by(id=quest.id).delete(synchronize_session=False)
+    Game.query.filter_by(id=game.id).delete(synchronize_session=False)
+    User.query.filter_by(id=user.id).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def test_carousel_skips_comment_only_submissions(app, quest):
+    quest, user = quest
+    with app.test_request_context():
+        photo = QuestSubmission(quest_id=quest.id, user_id=user.id, image_url='/static/images/verifications/ride.jpg')
+        comment = QuestSubmission(quest_id=quest.id, user_id=user.id, comment='Rode in the rain',
+                                  image_url=stored_static_url('images/commentPlaceholder.png'))
+        db.session.add_all([photo, comment])
+        db.session.commit()
+
+        images = Carousel().images(quest.game_id)
+
+    assert [image['id'] for image in images] == [photo.id]
@@ -0,0 +1,31 @@
+import uuid
+
+import pytest
+
+from app.models import db, Game, User
+
+
+@pytest.fixture
+def game(app_context):
+    tag = uuid.uuid4().hex[:8]
+    user = User(username=f'games-test-{tag}', email=f'games-test-{tag}@example.com', license_agreed=True)
+    db.session.add(user)
+    db.session.flush()
+    game = Game(title=f'Games test {tag}', admin_id=user.id, leaderboard_image='images/leaderboard/missing.png')
+    db.session.add(game)
+    db.session.commit()
+
+    yield game
+
+    db.session.rollback()
+    Game.query.filter_by(id=game.id).delete(synchronize_session=False)
+    User.query.filter_by(id=user.id).delete(synchronize_session=False)
+    db.session.commit()
+
+
+@pytest.mark.parametrize('level', ['nan', 'inf', '-inf'])
+def test_smog_image_rejects_non_finite_levels(app, game, level):
+    response = app.test_client().get(f'/games/smog/{game.id}?level={level}')
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid level'}
@@ -0,0 +1,178 @@
+import socketserver
+import threading
+from datetime import datetime, timedelta
+
+import psycopg2
+import pytest
+from pytz import utc
+
+from app.mailer import Mailer
+from app.models import db, OutboxEmail
+
+SENDER = 'outbox-test@example.com'
+
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept messages and hand them to the server's callback."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.reply('220 sink ready')
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().rstrip('\r\n')
+            if not line:
+                return
+            command = line.split(' ', 1)[0].upper()
+            if command in ('EHLO', 'HELO'):
+                self.reply('250 sink')
+            elif command == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                recipients.append(line.split(':', 1)[1].strip(' <>'))
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline().rstrip(b'\r\n') != b'.':
+                    pass
+                self.server.on_message(recipients)
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SinkHandler)
+        self.received = []
+        self.hook = None
+
+    def on_message(self, recipients):
+        if self.hook:
+            self.hook(recipients)
+        self.received.extend(recipients)
+
+
+@pytest.fixture
+def sink():
+    server = SmtpSink()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def mailer(app, app_context, sink, monkeypatch):
+    mailer = Mailer()
+    mailer.init_app(app)
+    mailer.server, mailer.port = sink.server_address
+    mailer.use_tls = mailer.use_ssl = False
+    mailer.username = mailer.password = ''
+    mailer.sender = SENDER
+    mailer.send_rate = 0
+    monkeypatch.setattr(mailer, '_access_token', lambda: None)
+    yield mailer
+    mailer._disconnect()
+
+
+@pytest.fixture
+def outbox(app_context):
+    """Queues test emails and removes them afterwards."""
+    created = []
+
+    def queue(*recipients, **fields):
+        emails = [OutboxEmail(recipient=r, subject='Outbox test', html='<p>hi</p>', **fields) for r in recipients]
+        db.session.add_all(emails)
+        db.session.commit()
+        created.extend(e.id for e in emails)
+        return [e.id for e in emails]
+
+    yield queue
+    db.session.rollback()
+    OutboxEmail.query.filter(OutboxEmail.id.in_(created)).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def other_connection(url):
+    return psycopg2.connect(
+        dbname=url.database, user=url.username, password=url.password,
+        host=url.host or url.query.get('host'), port=url.port
+    )
+
+
+def test_deliver_batch_sends_due_emails(mailer, outbox, sink):
+    ids = outbox('a@example.com', 'b@example.com')
+
+    # Other due rows in the database may share the batch
+    mailer.batch_size = 1000
+    mailer.deliver_batch()
+
+    assert {'a@example.com', 'b@example.com'} <= set(sink.received)
+    rows = OutboxEmail.query.filter(OutboxEmail.id.in_(ids)).all()
+    assert {row.status for row in rows} == {'sent'}
+    assert all(row.sent_at is not None for row in rows)
+
+
+def test_rows_are_not_locked_while_sending(mailer, outbox, sink):
+    (email_id,) = outbox('locked@example.com')
+    url = db.engine.url
+    seen = {}
+
+    def check_row(recipients):
+        if 'locked@example.com' not in recipients:
+            return
+        conn = other_connection(url)
+        try:
+            with conn.cursor() as cur:
+                # NOWAIT fails straight away if the worker still holds the row lock
+                cur.execute('SELECT status FROM outbox_email WHERE id = %s FOR UPDATE NOWAIT', (email_id,))
+                seen['status'] = cur.fetchone()[0]
+            conn.rollback()
+        finally:
+            conn.close()
+
+    sink.hook = check_row
+    mailer.batch_size = 1000
+    mailer.deliver_batch()
+
+    assert seen['status'] == 'sending'
+    assert db.session.get(OutboxEmail, email_id).status == 'sent'
+
+
+def test_expired_lease_is_claimed_again(mailer, outbox, sink):
+    now = datetime.now(utc)
+    (stale_id,) = outbox('stale@example.com', status='sending', next_attempt_at=now - timedelta(seconds=1))
+    (leased_id,) = outbox('leased@example.com', status='sending', next_attempt_at=now + timedelta(minutes=5))
+
+    mailer.batch_size = 1000
+    mailer.deliver_batch()
+
+    assert 'stale@example.com' in sink.received
+    assert 'leased@example.com' not in sink.received
+    stale = db.session.get(OutboxEmail, stale_id)
+    assert (stale.status, stale.attempts) == ('sent', 1)
+    assert db.session.get(OutboxEmail, leased_id).status == 'sending'
+
+
+def test_expired_lease_without_attempts_left_is_failed(mailer, outbox, sink):
+    (email_id,) = outbox('crasher@example.com', status='sending', attempts=mailer.max_attempts,
+                         next_attempt_at=datetime.now(utc) - timedelta(seconds=1))
+
+    mailer.batch_size = 1000
+    mailer.deliver_batch()
+
+    assert 'crasher@example.com' not in sink.received
+    email = db.session.get(OutboxEmail, email_id)
+    assert email.status == 'failed'
+    assert email.attempts == mailer.max_attempts
@@ -0,0 +1,34 @@
+from datetime import datetime
+
+import pytest
+
+from app.models import QuestSubmission
+from app.pagination import PageArgumentError, cursor_fits, decode_cursor, encode_cursor
+
+SORT = (QuestSubmission.timestamp, QuestSubmission.id)
+
+
+def test_cursor_round_trips():
+    values = [datetime(2024, 5, 1, 12, 30), 42]
+    assert decode_cursor(encode_cursor(values)) == values
+
+
+def test_garbage_cursor_is_rejected():
+    with pytest.raises(PageArgumentError):
+        decode_cursor('not-a-cursor')
+
+
+def test_cursor_fits_its_sort_columns():
+    assert cursor_fits(decode_cursor(encode_cursor([datetime(2024, 5, 1), 42])), SORT)
+
+
+@pytest.mark.parametrize('values', [
+    ['x', 1],
+    [datetime(2024, 5, 1), '1'],
+    [datetime(2024, 5, 1), True],
+    [datetime(2024, 5, 1)],
+    [datetime(2024, 5, 1), 1, 2],
+    [None, 1],
+])
+def test_mistyped_cursor_does_not_fit(values):
+    assert not cursor_fits(decode_cursor(encode_cursor(values)), SORT)
@@ -0,0 +1,63 @@
+import os
+import uuid
+from io import BytesIO
+
+import pytest
+import requests
+
+from app.storage import S3Storage
+
+ENDPOINT_URL = os.environ.get('S3_TEST_ENDPOINT_URL')
+
+
+@pytest.fixture
+def s3():
+    """An S3Storage on the bucket of a local MinIO-style server; set S3_TEST_ENDPOINT_URL to run."""
+    if not ENDPOINT_URL:
+        pytest.skip('S3_TEST_ENDPOINT_URL is not set')
+    pytest.importorskip('boto3')
+
+    storage = S3Storage(
+        endpoint_url=ENDPOINT_URL,
+        bucket=os.environ.get('S3_TEST_BUCKET', 'qbc-test'),
+        region=os.environ.get('S3_TEST_REGION', 'us-east-1'),
+        access_key=os.environ.get('S3_TEST_ACCESS_KEY', 'minioadmin'),
+        secret_key=os.environ.get('S3_TEST_SECRET_KEY', 'minioadmin'),
+    )
+    existing = [bucket['Name'] for bucket in storage.client.list_buckets()['Buckets']]
+    if storage.bucket not in existing:
+        storage.client.create_bucket(Bucket=storage.bucket)
+
+    prefix = f"tests/{uuid.uuid4().hex}"
+    yield storage, prefix
+    for key, _, _ in list(storage.list(prefix)):
+        storage.delete(key)
+
+
+def test_save_stat_open_list_and_delete(s3):
+    storage, prefix = s3
+    key = f"{prefix}/photo.jpg"
+
+    assert storage.save(BytesIO(b'jpeg bytes'), key) == key
+    assert storage.exists(key)
+    assert storage.stat(key)[0] == len(b'jpeg bytes')
+    assert storage.open(key).read() == b'jpeg bytes'
+    assert [item[0] for item in storage.list(prefix)] == [key]
+    assert storage.url(key) == f"{ENDPOINT_URL.rstrip('/')}/{storage.bucket}/{key}"
+    with storage.local_copy(key) as path:
+        with open(path, 'rb') as local_file:
+            assert local_file.read() == b'jpeg bytes'
+
+    storage.delete(key)
+    assert not storage.exists(key)
+    assert storage.stat(key) is None
+
+
+def test_presigned_upload_lands_in_the_bucket(s3):
+    storage, prefix = s3
+    key = f"{prefix}/direct.jpg"
+    post = storage.presigned_upload(key, 'image/jpeg', 16)
+
+    response = requests.post(post['url'], data=post['fields'], files={'file': ('direct.jpg', b'x' * 8, 'image/jpeg')})
+    assert response.status_code in (200, 201, 204)
+    assert storage.stat(key)[0] == 8
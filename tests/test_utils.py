@@ -0,0 +1,64 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import db, Game, Quest, QuestSubmission, User
+from app.utils import can_complete_quest
+
+MONDAY_2300 = datetime(2024, 6, 3, 23, 0)
+TUESDAY_0100 = datetime(2024, 6, 4, 1, 0)
+
+
+@pytest.fixture
+def daily_quest(app_context):
+    """A quest that may be completed once a day, and a user to complete it."""
+    tag = uuid.uuid4().hex[:8]
+    user = User(username=f'utils-test-{tag}', email=f'utils-test-{tag}@example.com', license_agreed=True)
+    db.session.add(user)
+    db.session.flush()
+    game = Game(title=f'Utils test {tag}', admin_id=user.id)
+    db.session.add(game)
+    db.session.flush()
+    quest = Quest(title='Daily ride', game_id=game.id, points=10, completion_limit=1, frequency='daily')
+    db.session.add(quest)
+    db.session.commit()
+
+    yield user, quest
+
+    db.session.rollback()
+    QuestSubmission.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+    Quest.query.filter_by(id=quest.id).delete(synchronize_session=False)
+    Game.query.filter_by(id=game.id).delete(synchronize_session=False)
+    User.query.filter_by(id=user.id).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def complete(user, quest, timestamp):
+    db.session.add(QuestSubmission(user_id=user.id, quest_id=quest.id, timestamp=timestamp))
+    db.session.commit()
+
+
+def test_replay_before_a_later_completion_is_rejected(daily_quest):
+    user, quest = daily_quest
+    complete(user, quest, TUESDAY_0100)
+
+    can_verify, next_eligible_time = can_complete_quest(user.id, quest.id, at=MONDAY_2300)
+
+    assert not can_verify
+    assert next_eligible_time == TUESDAY_0100 + timedelta(days=1)
+
+
+def test_replay_more_than_a_period_before_is_accepted(daily_quest):
+    user, quest = daily_quest
+    complete(user, quest, TUESDAY_0100)
+
+    assert can_complete_quest(user.id, quest.id, at=TUESDAY_0100 - timedelta(days=1, minutes=1)) == (True, None)
+
+
+def test_completion_inside_the_period_blocks_the_next_one(daily_quest):
+    user, quest = daily_quest
+    complete(user, quest, MONDAY_2300)
+
+    assert can_complete_quest(user.id, quest.id, at=TUESDAY_0100) == (False, MONDAY_2300 + timedelta(days=1))
+    assert can_complete_quest(user.id, quest.id, at=MONDAY_2300 + timedelta(days=1, minutes=1)) == (True, None)
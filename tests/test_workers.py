@@ -0,0 +1,35 @@
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from types import SimpleNamespace
+
+import pytest
+
+from app.workers import PoolBusyError, ProcessPool
+
+
+@pytest.fixture
+def pool():
+    pool = ProcessPool()
+    pool.init_app(SimpleNamespace(config={'workers': {'PROCESSES': 1, 'MAX_PENDING': 1}}, extensions={}))
+    yield pool
+    pool.shutdown()
+
+
+def test_timed_out_job_keeps_its_slot_until_it_finishes(pool):
+    with pytest.raises(FutureTimeoutError):
+        pool.run(time.sleep, 1, timeout=0.1)
+
+    # The worker is still sleeping, so the pool is still full
+    with pytest.raises(PoolBusyError):
+        pool.run(abs, -1)
+
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        try:
+            assert pool.run(abs, -1) == 1
+            break
+        except PoolBusyError:
+            time.sleep(0.05)
+    else:
+        pytest.fail('the slot was never released')
+    assert pool.metrics()['timed_out'] == 1